@@ -1,4 +1,6 @@
 import os
+import sys
+from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -9,6 +11,12 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.answer_cache import AnswerCache
+from rag_core.chroma_sync import collection_version
+from rag_core.embedding_cache import CachedEmbeddings
+
 
 # =====================================================
 # 1️⃣ Load Environment
@@ -70,7 +78,7 @@ st.markdown('<div class="subtitle">Advanced Retrieval-Augmented Analysis using C
 # =====================================================
 @st.cache_resource
 def load_vectorstore():
-    embeddings = OpenAIEmbeddings()
+    embeddings = CachedEmbeddings(OpenAIEmbeddings())
     vectorstore = Chroma(
         persist_directory="./chroma_db",
         embedding_function=embeddings
@@ -80,6 +88,12 @@ def load_vectorstore():
 
 vectorstore = load_vectorstore()
 
+
+@st.cache_resource
+def answer_cache():
+    # Repeated or paraphrased questions are answered from .answer_cache/ without running the chain
+    return AnswerCache(embeddings=vectorstore.embeddings)
+
 retriever = vectorstore.as_retriever(
     search_type="similarity",
     search_kwargs={"k": 4}
@@ -161,8 +175,15 @@ retrieval_chain = create_retrieval_chain(
 question = st.text_area("Ask a technical or strategic question:")
 
 if question:
-    with st.spinner("Generating expert analysis..."):
-        response = retrieval_chain.invoke({"input": question})
+    # Keyed by the collection's content version, so re-indexed documents never serve old answers
+    stream, hit = answer_cache().stream(retrieval_chain, question, namespace=collection_version(vectorstore))
 
     st.markdown("### 📌 Expert Analysis")
-    st.markdown(f'<div class="answer-box">{response["answer"]}</div>', unsafe_allow_html=True)
+    # Tokens are shown as they arrive, then replaced by the styled box once the answer is complete
+    answer_box = st.empty()
+    with answer_box:
+        st.write_stream(stream)
+    answer_box.markdown(f'<div class="answer-box">{stream.text}</div>', unsafe_allow_html=True)
+    if hit is None:
+        st.caption(stream.summary())
+    st.caption(answer_cache().summary())
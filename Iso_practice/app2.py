@@ -1,18 +1,24 @@
 # app_modern_rag_word_final.py
 import streamlit as st
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
 # LangChain imports
 from langchain.document_loaders import UnstructuredWordDocumentLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
 from langchain.chat_models import ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.embedding_pipeline import stream_into_chroma
+
 # 0️⃣ Load .env
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -47,13 +53,14 @@ if uploaded_file:
     st.success(f"Split into {len(docs_split)} chunks for embeddings")
 
     # 4️⃣ Create embeddings + Chroma vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(
+    embeddings = CachedEmbeddings(OpenAIEmbeddings())
+    progress = st.progress(0.0, text="Embedding chunks...")
+    for vectorstore, done, total in stream_into_chroma(
         docs_split,
         embeddings,
         persist_directory="./chroma_db"
-    )
-    vectorstore.persist()
+    ):
+        progress.progress(done / total, text=f"Embedded {done}/{total} chunks")
     st.success("ChromaDB vectorstore created and persisted!")
 
     # 5️⃣ Build Retriever
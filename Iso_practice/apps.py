@@ -1,5 +1,6 @@
 import os
-import re
+import sys
+from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -13,6 +14,14 @@ from langchain.chains import create_retrieval_chain
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from docx import Document as WordDocument
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.faiss_store import FaissDiskCache
+from rag_core.index_cache import IndexRegistry, document_key
+from rag_core.quantized_index import reindex
+from rag_core.text_cleaning import CleaningRules, TextCleaner
+
 # ==========================================
 # Load API Key
 # ==========================================
@@ -34,32 +43,60 @@ uploaded_file = st.file_uploader("Upload ISO Word file (.docx)", type=["docx"])
 # ==========================================
 # Text Cleaning
 # ==========================================
-def clean_text(text: str) -> str:
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"[^\w\s\.,;:()\-/]", "", text)
-    return text.strip()
+# Word files have no page furniture, so only punctuation and whitespace rules apply
+text_cleaner = TextCleaner(CleaningRules(strip_page_numbers=False, strip_fractions=False))
 
 # ==========================================
 # Load Word File
 # ==========================================
 def load_and_clean_word(uploaded_file):
     doc = WordDocument(uploaded_file)
-    full_text = ""
-    for para in doc.paragraphs:
-        full_text += para.text + "\n"
-    return [Document(page_content=clean_text(full_text), metadata={"source": "Word"})]
+    full_text = "\n".join(para.text for para in doc.paragraphs)
+    return [Document(page_content=text_cleaner.clean(full_text), metadata={"source": "Word"})]
 
 # ==========================================
 # Build RAG System
 # ==========================================
-def build_rag(documents):
-    # Split documents into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    splits = splitter.split_documents(documents)
-
-    # Embeddings and Vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(splits, embeddings)
+SPLITTER_CONFIG = {"chunk_size": 1000, "chunk_overlap": 150}
+# flat | hnsw | ivf_flat | ivf_pq | auto (exact below 20k chunks)
+FAISS_INDEX_KIND = os.getenv("FAISS_INDEX_KIND", "auto")
+# "" (float32) | fp16 | sq8: compact search vectors, exact rescoring from memory-mapped float32
+FAISS_QUANTIZATION = os.getenv("FAISS_QUANTIZATION", "")
+# 0 = off; e.g. 256: first-stage search on 256-d Matryoshka prefixes, rerank on the full vectors
+MATRYOSHKA_DIMS = int(os.getenv("MATRYOSHKA_DIMS", "0"))
+# Prefix truncation only works for text-embedding-3 models; both stages come from one embedding call
+EMBEDDING_MODEL = "text-embedding-3-small" if MATRYOSHKA_DIMS else "text-embedding-ada-002"
+# Everything that changes the built index is part of the document key
+INDEX_CONFIG = {
+    **SPLITTER_CONFIG,
+    "embedding_model": EMBEDDING_MODEL,
+    "index_kind": FAISS_INDEX_KIND,
+    "quantization": FAISS_QUANTIZATION,
+    "matryoshka_dims": MATRYOSHKA_DIMS,
+}
+
+@st.cache_resource
+def index_registry():
+    # Built chains shared by all sessions, LRU-bounded to 8 documents
+    return IndexRegistry(max_entries=8)
+
+@st.cache_resource
+def faiss_cache():
+    # One saved, memory-mapped index per document key under .faiss_indexes/
+    return FaissDiskCache(max_indexes=32)
+
+def build_rag(doc_key, uploaded_file):
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+    vectorstore = faiss_cache().load(doc_key, embeddings)
+    if vectorstore is None:
+        # Split documents into chunks
+        splitter = RecursiveCharacterTextSplitter(**SPLITTER_CONFIG)
+        splits = splitter.split_documents(load_and_clean_word(uploaded_file))
+
+        # Embed, persist and re-open memory-mapped
+        vectorstore = FAISS.from_documents(splits, embeddings)
+        vectorstore = reindex(vectorstore, FAISS_INDEX_KIND, FAISS_QUANTIZATION, MATRYOSHKA_DIMS)
+        vectorstore = faiss_cache().save(doc_key, vectorstore)
     retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
     # LLM
@@ -99,10 +136,14 @@ Answer:
 # Process uploaded file
 # ==========================================
 if uploaded_file:
-    if "rag_chain" not in st.session_state:
+    # Content-hash key: switching files rebuilds, re-uploading a known file reuses its chain
+    doc_key = document_key(uploaded_file.getvalue(), INDEX_CONFIG)
+    if st.session_state.get("doc_key") != doc_key:
         with st.spinner("Processing document and building RAG system..."):
-            documents = load_and_clean_word(uploaded_file)
-            st.session_state.rag_chain = build_rag(documents)
+            st.session_state.rag_chain = index_registry().get_or_build(
+                doc_key, lambda: build_rag(doc_key, uploaded_file)
+            )
+            st.session_state.doc_key = doc_key
         st.success("✅ RAG system ready!")
 
     question = st.text_input("Ask a question about the ISO document:")
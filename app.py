@@ -1,18 +1,24 @@
 import os
-import re
 import streamlit as st
 from dotenv import load_dotenv
 
-from langchain.document_loaders import PyPDFLoader
-from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 
+from rag_core.answer_cache import AnswerCache
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.embedding_pipeline import AdaptiveConcurrency, stream_into_faiss
+from rag_core.faiss_store import FaissDiskCache
+from rag_core.index_cache import IndexRegistry, document_key
+from rag_core.pdf_ingest import RepeatedLineFilter, iter_chunk_windows, page_progress
+from rag_core.pdf_parallel import iter_pdf_pages_parallel
+from rag_core.quantized_index import reindex
+from rag_core.text_cleaning import CleaningRules, TextCleaner
+
 
 # ==========================================
 # Load API Key
@@ -36,50 +42,104 @@ st.write("Upload an ISO PDF document and ask questions.")
 # ==========================================
 # Cleaning Function
 # ==========================================
-def clean_text(text: str) -> str:
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"[^\w\s\.,;:()\-/]", "", text)
-    text = re.sub(r"Page\s*\d+", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\d+\s*/\s*\d+", "", text)
-    return text.strip()
+# Patterns are compiled once; a bare page number on the first or last line of a page
+# is stripped while line breaks still exist (numbers inside tables are kept)
+text_cleaner = TextCleaner(CleaningRules(strip_edge_numbers=True))
 
 
 def load_and_clean_pdf(uploaded_file):
-    with open("temp.pdf", "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    loader = PyPDFLoader("temp.pdf")
-    documents = loader.load()
-
-    cleaned_docs = []
-    for doc in documents:
-        cleaned_docs.append(
-            Document(
-                page_content=clean_text(doc.page_content),
-                metadata=doc.metadata
-            )
-        )
-
-    return cleaned_docs
+    # Generator: page ranges of the in-memory upload are parsed on a process pool, then
+    # stripped of lines repeated across pages (title, copyright footer) and cleaned in small batches
+    pages = iter_pdf_pages_parallel([uploaded_file.getvalue()], sources=[uploaded_file.name])
+    pages = RepeatedLineFilter().filter(pages)
+    return text_cleaner.clean_documents(pages)
 
 
 # ==========================================
 # Build RAG System
 # ==========================================
-def build_rag(documents):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=150
-    )
-
-    splits = splitter.split_documents(documents)
-
-    embeddings = OpenAIEmbeddings()
-
-    vectorstore = FAISS.from_documents(
-        documents=splits,
-        embedding=embeddings
-    )
+SPLITTER_CONFIG = {"chunk_size": 1000, "chunk_overlap": 150}
+# flat | hnsw | ivf_flat | ivf_pq | auto (exact below 20k chunks)
+FAISS_INDEX_KIND = os.getenv("FAISS_INDEX_KIND", "auto")
+# "" (float32) | fp16 | sq8: compact search vectors, exact rescoring from memory-mapped float32
+FAISS_QUANTIZATION = os.getenv("FAISS_QUANTIZATION", "")
+# 0 = off; e.g. 256: first-stage search on 256-d Matryoshka prefixes, rerank on the full vectors
+MATRYOSHKA_DIMS = int(os.getenv("MATRYOSHKA_DIMS", "0"))
+# Prefix truncation only works for text-embedding-3 models; both stages come from one embedding call
+EMBEDDING_MODEL = "text-embedding-3-small" if MATRYOSHKA_DIMS else "text-embedding-ada-002"
+# Concurrent embedding requests per document (halved on HTTP 429, regrown on success)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Everything that changes the built index is part of the document key
+INDEX_CONFIG = {
+    **SPLITTER_CONFIG,
+    "embedding_model": EMBEDDING_MODEL,
+    "index_kind": FAISS_INDEX_KIND,
+    "quantization": FAISS_QUANTIZATION,
+    "matryoshka_dims": MATRYOSHKA_DIMS,
+}
+
+
+@st.cache_resource
+def index_registry():
+    # One registry per server process, shared by every session; holds at most 8 built chains
+    return IndexRegistry(max_entries=8)
+
+
+@st.cache_resource
+def faiss_cache():
+    # Saved per document key under .faiss_indexes/; vectors are memory-mapped on load,
+    # so the index survives restarts and is shared between server processes
+    return FaissDiskCache(max_indexes=32)
+
+
+@st.cache_resource
+def answer_cache():
+    # Same embedding model as the index, so a missed question's embedding is reused by the retriever
+    return AnswerCache(embeddings=CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL)))
+
+
+@st.cache_resource
+def embedding_limiter():
+    # Shared by every upload in this process, so the concurrency learned from 429s
+    # carries over instead of restarting from EMBED_WORKERS for each document
+    return AdaptiveConcurrency(EMBED_WORKERS)
+
+
+def embed_pages(pages, embeddings):
+    splitter = RecursiveCharacterTextSplitter(**SPLITTER_CONFIG)
+
+    # One embedding stream over the whole document: chunks are split page by page and
+    # packed into token-budgeted batches as they arrive, with up to EMBED_WORKERS
+    # requests (AIMD-limited) in flight while later pages are still being parsed
+    latest = []
+
+    def chunks():
+        for window in iter_chunk_windows(pages, splitter, window_size=64):
+            latest[:] = window[-1:]
+            yield from window
+
+    progress = st.progress(0.0, text="Embedding chunks...")
+    vectorstore = None
+    for vectorstore, n_chunks, _ in stream_into_faiss(
+        chunks(), embeddings, max_workers=EMBED_WORKERS, limiter=embedding_limiter()
+    ):
+        progress.progress(page_progress(latest[0]) or 0.0, text=f"Embedded {n_chunks} chunks")
+    progress.empty()
+
+    if vectorstore is None:
+        st.error("No text could be extracted from this PDF.")
+        st.stop()
+    return vectorstore
+
+
+def build_rag(doc_key, uploaded_file):
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+
+    vectorstore = faiss_cache().load(doc_key, embeddings)
+    if vectorstore is None:
+        vectorstore = embed_pages(load_and_clean_pdf(uploaded_file), embeddings)
+        vectorstore = reindex(vectorstore, FAISS_INDEX_KIND, FAISS_QUANTIZATION, MATRYOSHKA_DIMS)
+        vectorstore = faiss_cache().save(doc_key, vectorstore)
 
     retriever = vectorstore.as_retriever(
         search_type="similarity",
@@ -125,18 +185,28 @@ uploaded_file = st.file_uploader("Upload ISO PDF", type=["pdf"])
 
 if uploaded_file:
 
-    if "rag_chain" not in st.session_state:
+    # Keyed by content + chunking config: a new upload never reuses the previous document's
+    # chain, and a document already built by any session is reused without re-embedding
+    doc_key = document_key(uploaded_file.getvalue(), INDEX_CONFIG)
+
+    if st.session_state.get("doc_key") != doc_key:
         with st.spinner("Processing document and building RAG system..."):
-            documents = load_and_clean_pdf(uploaded_file)
-            st.session_state.rag_chain = build_rag(documents)
+            st.session_state.rag_chain = index_registry().get_or_build(
+                doc_key, lambda: build_rag(doc_key, uploaded_file)
+            )
+            st.session_state.doc_key = doc_key
 
         st.success("RAG system ready!")
 
     question = st.text_input("Ask a question about the ISO document:")
 
     if question:
-        with st.spinner("Generating answer..."):
-            response = st.session_state.rag_chain.invoke({"input": question})
+        # Answers are cached per document key, so another document never serves them;
+        # on a miss, retrieval runs first and the answer is streamed as it is generated
+        stream, hit = answer_cache().stream(st.session_state.rag_chain, question, namespace=doc_key)
 
         st.markdown("### 📌 Answer")
-        st.write(response["answer"])
+        st.write_stream(stream)
+        if hit is None:
+            st.caption(stream.summary())
+        st.caption(answer_cache().summary())
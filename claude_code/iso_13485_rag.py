@@ -1,10 +1,18 @@
 import streamlit as st
 import os
-import json
+import sys
 from dotenv import load_dotenv
 from openai import OpenAI
-import re
-from typing import List, Dict, Tuple
+from pathlib import Path
+from typing import List, Dict, Union
+
+from procedure_index import ProcedureIndex
+
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.context_packer import pack_context
+from rag_core.dataset_loader import load_json
+from rag_core.streaming import TokenStream, openai_deltas
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +20,9 @@ load_dotenv()
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Prompt tokens available to retrieved procedures
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
 # Page configuration
 st.set_page_config(
     page_title="ISO 13485:2016 RAG Chatbot",
@@ -68,78 +79,21 @@ st.markdown("""
 # Load ISO 13485 procedures data
 @st.cache_resource
 def load_procedures_database():
-    """Load procedures from JSON file"""
+    """Load procedures from JSON file and build the lookup index once"""
     try:
-        with open('claude_code\iso_13485_procedures.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Read once, parsed with orjson when installed
+        database, load_stats = load_json('claude_code\iso_13485_procedures.json')
     except FileNotFoundError:
         st.error("Procedures database not found. Please ensure iso_13485_procedures.json is in the correct location.")
-        return None
+        return None, None, None
+    return database, ProcedureIndex(database), load_stats
 
 # Initialize database
-procedures_db = load_procedures_database()
+procedures_db, procedure_index, procedures_load_stats = load_procedures_database()
 
 if procedures_db is None:
     st.stop()
 
-def search_procedures_by_keyword(keyword: str, database: Dict) -> List[Dict]:
-    """Search procedures by keyword"""
-    results = []
-    keyword_lower = keyword.lower()
-    
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            for proc in section['procedures']:
-                # Search in title, keywords, description
-                if (keyword_lower in proc.get('title', '').lower() or
-                    keyword_lower in proc.get('description', '').lower() or
-                    any(keyword_lower in k.lower() for k in proc.get('keywords', []))):
-                    results.append(proc)
-        
-        # Search in subsections
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    for proc in subsection['procedures']:
-                        if (keyword_lower in proc.get('title', '').lower() or
-                            keyword_lower in proc.get('description', '').lower() or
-                            any(keyword_lower in k.lower() for k in proc.get('keywords', []))):
-                            results.append(proc)
-    
-    return results
-
-def search_procedures_by_id(proc_id: str, database: Dict) -> Dict :
-    """Search procedure by ID"""
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            for proc in section['procedures']:
-                if proc.get('proc_id') == proc_id:
-                    return proc
-        
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    for proc in subsection['procedures']:
-                        if proc.get('proc_id') == proc_id:
-                            return proc
-    
-    return None
-
-def get_all_procedures(database: Dict) -> List[Dict]:
-    """Get all procedures from database"""
-    all_procs = []
-    
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            all_procs.extend(section['procedures'])
-        
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    all_procs.extend(subsection['procedures'])
-    
-    return all_procs
-
 def format_procedure_for_display(proc: Dict) -> str:
     """Format procedure data for display"""
     formatted = f"""
@@ -174,17 +128,31 @@ def format_procedure_for_display(proc: Dict) -> str:
 """
     return formatted
 
-def query_openai_for_rag(user_query: str, retrieved_procedures: List[Dict]) -> str:
-    """Use OpenAI to generate answer based on retrieved procedures"""
-    
-    # Build context from retrieved procedures
-    context = "ISO 13485:2016 Procedures Context:\n\n"
-    for i, proc in enumerate(retrieved_procedures[:3], 1):
-        context += f"\n{i}. {proc.get('title', 'Unknown')}\n"
-        context += f"   ID: {proc.get('proc_id', 'N/A')}\n"
-        context += f"   Requirement: {proc.get('requirement', 'N/A')}\n"
-        context += f"   Description: {proc.get('description', 'N/A')}\n"
-        context += f"   Key Points: {', '.join(proc.get('key_requirements', [])[:3])}\n"
+def render_procedure_context(proc: Dict) -> str:
+    """Prompt block for one retrieved procedure"""
+    lines = [
+        proc.get('title', 'Unknown'),
+        f"   ID: {proc.get('proc_id', 'N/A')}",
+        f"   Requirement: {proc.get('requirement', 'N/A')}",
+        f"   Description: {proc.get('description', 'N/A')}",
+    ]
+    if proc.get('key_requirements'):
+        lines.append(f"   Key Points: {'; '.join(proc['key_requirements'])}")
+    if proc.get('implementation_steps'):
+        lines.append(f"   Implementation Steps: {' '.join(proc['implementation_steps'])}")
+    return "\n".join(lines)
+
+def query_openai_for_rag(user_query: str, retrieved_procedures: List[Dict], stream: bool = False) -> Union[str, TokenStream]:
+    """Use OpenAI to generate answer based on retrieved procedures (a TokenStream of the answer if stream=True)"""
+    
+    # Build context from retrieved procedures: packed in ranking order until the token budget is used
+    packed = pack_context(
+        [render_procedure_context(proc) for proc in retrieved_procedures],
+        budget=CONTEXT_TOKEN_BUDGET,
+        model="gpt-3.5-turbo",
+        label="{n}. ",
+    )
+    context = "ISO 13485:2016 Procedures Context:\n\n" + packed.text
     
     # Create message for OpenAI
     messages = [
@@ -207,6 +175,17 @@ Provide a clear, structured answer that references the specific procedures."""
         }
     ]
     
+    if stream:
+        # Tokens are yielded as they arrive; TTFT and tokens/sec are recorded on the stream
+        return TokenStream(openai_deltas(
+            client,
+            on_error=lambda e: f"Error calling OpenAI API: {str(e)}",
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000
+        ))
+
     try:
         response = client.chat.completions.create(
             model="gpt-3.5-turbo",
@@ -261,6 +240,7 @@ with st.sidebar:
         "Select Mode:",
         ["🔍 Search Procedures", "💬 Ask RAG Assistant", "📚 Browse All", "ℹ️ About"]
     )
+    st.caption(procedures_load_stats.summary())
 
 # Initialize session state
 if 'selected_procedure' not in st.session_state:
@@ -280,12 +260,12 @@ if page == "🔍 Search Procedures":
         )
         
         if search_term:
-            results = search_procedures_by_keyword(search_term, procedures_db)
+            results = procedure_index.search_keyword(search_term)
             display_procedure_list(results, f"Search Results for '{search_term}'")
             
             # Show selected procedure details
             if st.session_state.selected_procedure:
-                proc = search_procedures_by_id(st.session_state.selected_procedure, procedures_db)
+                proc = procedure_index.get(st.session_state.selected_procedure)
                 if proc:
                     st.markdown("---")
                     st.markdown(format_procedure_for_display(proc))
@@ -298,7 +278,7 @@ if page == "🔍 Search Procedures":
         )
         
         if proc_id:
-            proc = search_procedures_by_id(proc_id, procedures_db)
+            proc = procedure_index.get(proc_id)
             if proc:
                 st.markdown(format_procedure_for_display(proc))
             else:
@@ -323,19 +303,9 @@ elif page == "💬 Ask RAG Assistant":
                 
                 # Try multiple search strategies
                 keywords_in_query = [word for word in user_query.lower().split() if len(word) > 3]
-                all_results = []
-                
-                for keyword in keywords_in_query[:3]:  # Limit to top 3 keywords
-                    results = search_procedures_by_keyword(keyword, procedures_db)
-                    all_results.extend(results)
                 
-                # Remove duplicates
-                seen_ids = set()
-                unique_results = []
-                for proc in all_results:
-                    if proc.get('proc_id') not in seen_ids:
-                        unique_results.append(proc)
-                        seen_ids.add(proc.get('proc_id'))
+                # Limit to top 3 keywords; results come back deduplicated
+                unique_results = procedure_index.search_keywords(keywords_in_query[:3])
                 
                 if unique_results:
                     st.success(f"Found {len(unique_results)} relevant procedures")
@@ -347,10 +317,15 @@ elif page == "💬 Ask RAG Assistant":
                     
                     # Step 2: Generate answer using OpenAI
                     st.markdown("### 2️⃣ Generating Answer...")
-                    answer = query_openai_for_rag(user_query, unique_results)
+                    answer = query_openai_for_rag(user_query, unique_results, stream=True)
                     
                     st.markdown("### 📝 Answer")
-                    st.markdown(f'<div class="success-box">{answer}</div>', unsafe_allow_html=True)
+                    # Tokens are shown as they arrive, then replaced by the styled box
+                    answer_box = st.empty()
+                    with answer_box:
+                        st.write_stream(answer)
+                    answer_box.markdown(f'<div class="success-box">{answer.text}</div>', unsafe_allow_html=True)
+                    st.caption(answer.summary())
                     
                     # Step 3: Show detailed procedures
                     st.markdown("### 3️⃣ Detailed Procedures")
@@ -367,16 +342,13 @@ elif page == "💬 Ask RAG Assistant":
 elif page == "📚 Browse All":
     st.markdown("## Browse All Procedures")
     
-    all_procedures = get_all_procedures(procedures_db)
-    
     # Add filters
     col1, col2 = st.columns(2)
     
     with col1:
         section_filter = st.selectbox(
             "Filter by Section:",
-            ["All"] + list(set([proc.get('requirement', '').split('.')[0] 
-                               for proc in all_procedures if proc.get('requirement')]))
+            ["All"] + procedure_index.sections()
         )
     
     with col2:
@@ -387,17 +359,17 @@ elif page == "📚 Browse All":
     
     # Filter procedures
     if section_filter != "All":
-        filtered = [p for p in all_procedures if p.get('requirement', '').startswith(section_filter)]
+        filtered = procedure_index.procedures_in_section(section_filter)
     else:
-        filtered = all_procedures
+        filtered = procedure_index.all_procedures
     
-    # Sort
+    # Sort (sorted() copies, so the cached index lists are never reordered)
     if sort_by == "Title":
-        filtered.sort(key=lambda x: x.get('title', ''))
+        filtered = sorted(filtered, key=lambda x: x.get('title', ''))
     elif sort_by == "Requirement":
-        filtered.sort(key=lambda x: x.get('requirement', ''))
+        filtered = sorted(filtered, key=lambda x: x.get('requirement', ''))
     else:
-        filtered.sort(key=lambda x: x.get('proc_id', ''))
+        filtered = sorted(filtered, key=lambda x: x.get('proc_id', ''))
     
     st.markdown(f"**Total Procedures:** {len(filtered)}")
     st.markdown("---")
@@ -407,7 +379,7 @@ elif page == "📚 Browse All":
     
     # Show selected procedure
     if st.session_state.selected_procedure:
-        proc = search_procedures_by_id(st.session_state.selected_procedure, procedures_db)
+        proc = procedure_index.get(st.session_state.selected_procedure)
         if proc:
             st.markdown("---")
             st.markdown(format_procedure_for_display(proc))
@@ -451,9 +423,8 @@ elif page == "ℹ️ About":
         
         """)
         
-        all_procs = get_all_procedures(procedures_db)
         st.info(f"""
-        - **Total Procedures:** {len(all_procs)}
+        - **Total Procedures:** {len(procedure_index.all_procedures)}
         - **Sections:** {len(procedures_db.get('sections', []))}
         - **Database:** ISO 13485:2016 Complete
         """)
@@ -0,0 +1,149 @@
+"""
+In-memory lookup index for the ISO 13485 procedures database
+
+Built once from the loaded JSON and shared by the Streamlit app and the CLI demo:
+- proc_id -> procedure hash map
+- token -> posting list inverted index over title, description and keywords
+- character n-gram (1-3) -> vocabulary tokens, so substring lookups only
+  check tokens that share the term's n-grams instead of the whole vocabulary
+- clause prefix -> procedures map (e.g. '8', '8.2', '8.2.2')
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_GRAM = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for both indexing and querying"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def clause_key(clause: str) -> tuple:
+    """Sort key for dotted clause numbers in document order ('4.2' < '4.10' < '10')"""
+    return tuple(int(part) if part.isdigit() else 0 for part in clause.split('.'))
+
+
+def iter_procedures(database: Dict) -> Iterable[Dict]:
+    """Yield every procedure in database order (sections, then their subsections)"""
+    for section in database.get('sections', []):
+        yield from section.get('procedures', [])
+        for subsection in section.get('subsections', []):
+            yield from subsection.get('procedures', [])
+
+
+class ProcedureIndex:
+    """Hash map, inverted index and section map over the procedures database"""
+
+    def __init__(self, database: Dict):
+        self.all_procedures: List[Dict] = list(iter_procedures(database))
+        self.by_id: Dict[str, Dict] = {}
+        self.by_section: Dict[str, List[Dict]] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self._fields: List[tuple] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._substring_cache: Dict[str, frozenset] = {}
+
+        for pos, proc in enumerate(self.all_procedures):
+            proc_id = proc.get('proc_id')
+            if proc_id is not None:
+                self.by_id.setdefault(proc_id, proc)
+
+            # Every dotted prefix of the requirement, so '8' and '8.2' are both exact lookups
+            parts = proc.get('requirement', '').split('.')
+            if parts[0]:
+                for depth in range(1, len(parts) + 1):
+                    self.by_section.setdefault('.'.join(parts[:depth]), []).append(proc)
+
+            fields = (
+                proc.get('title', '').lower(),
+                proc.get('description', '').lower(),
+                *(k.lower() for k in proc.get('keywords', [])),
+            )
+            self._fields.append(fields)
+            for token in set(tokenize(' '.join(fields))):
+                self.postings.setdefault(token, []).append(pos)
+
+        for token in self.postings:
+            for n in range(1, MAX_GRAM + 1):
+                for start in range(len(token) - n + 1):
+                    self._grams.setdefault(token[start:start + n], set()).add(token)
+
+    def get(self, proc_id: str) -> Optional[Dict]:
+        """Return the procedure with this exact ID, or None"""
+        return self.by_id.get(proc_id)
+
+    def sections(self) -> List[str]:
+        """Top-level clause numbers that have at least one procedure"""
+        return sorted((key for key in self.by_section if '.' not in key), key=clause_key)
+
+    def procedures_in_section(self, section: str) -> List[Dict]:
+        """Procedures whose requirement falls under the given clause prefix"""
+        if section in self.by_section:
+            return self.by_section[section]
+        return [p for p in self.all_procedures if p.get('requirement', '').startswith(section)]
+
+    def _tokens_containing(self, term: str) -> Set[str]:
+        """Vocabulary tokens containing `term`: intersect its n-gram lists, then confirm"""
+        n = min(MAX_GRAM, len(term))
+        lists = sorted(
+            (self._grams.get(term[start:start + n], set()) for start in range(len(term) - n + 1)),
+            key=len,
+        )
+        candidates = lists[0].intersection(*lists[1:])
+        return {token for token in candidates if term in token}
+
+    def _positions_for_term(self, term: str) -> frozenset:
+        """Positions of procedures with a token containing `term` (substring semantics)"""
+        cached = self._substring_cache.get(term)
+        if cached is None:
+            positions = set()
+            for token in self._tokens_containing(term):
+                positions.update(self.postings[token])
+            cached = self._substring_cache[term] = frozenset(positions)
+        return cached
+
+    def search_keyword(self, keyword: str) -> List[Dict]:
+        """
+        Find procedures whose title, description or a keyword contains `keyword`
+
+        Args:
+            keyword: Search term, matched case-insensitively as a substring
+
+        Returns:
+            Matching procedures in database order
+        """
+        keyword_lower = keyword.lower()
+        terms = tokenize(keyword_lower)
+        if not terms:
+            # Punctuation-only input: nothing to look up in the index
+            candidates = range(len(self.all_procedures))
+        else:
+            candidates = self._positions_for_term(terms[0])
+            for term in terms[1:]:
+                candidates = candidates & self._positions_for_term(term)
+                if not candidates:
+                    return []
+
+        if len(terms) == 1 and terms[0] == keyword_lower:
+            return [self.all_procedures[pos] for pos in sorted(candidates)]
+
+        # Multi-word phrases: confirm the exact substring on the few remaining candidates
+        return [
+            self.all_procedures[pos]
+            for pos in sorted(candidates)
+            if any(keyword_lower in field for field in self._fields[pos])
+        ]
+
+    def search_keywords(self, keywords: Iterable[str]) -> List[Dict]:
+        """Union of keyword searches, deduplicated by proc_id in first-seen order"""
+        seen_ids = set()
+        results = []
+        for keyword in keywords:
+            for proc in self.search_keyword(keyword):
+                if proc.get('proc_id') not in seen_ids:
+                    seen_ids.add(proc.get('proc_id'))
+                    results.append(proc)
+        return results
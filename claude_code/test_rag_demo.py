@@ -1,8 +1,17 @@
-import json
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
-from typing import List, Dict
+from typing import List, Dict, Union
+
+from procedure_index import ProcedureIndex
+
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.context_packer import pack_context
+from rag_core.dataset_loader import load_json
+from rag_core.streaming import TokenStream, openai_deltas, print_stream
 
 # Load environment variables
 load_dotenv()
@@ -10,83 +19,46 @@ load_dotenv()
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Prompt tokens available to retrieved procedures
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
 # Load procedures database
 def load_database():
     """Load procedures from JSON file"""
     try:
-        with open('/home/claude/iso_13485_procedures.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Read once, parsed with orjson when installed
+        database, load_stats = load_json('/home/claude/iso_13485_procedures.json')
+        print(f"   {load_stats.summary()}")
+        return database
     except FileNotFoundError:
         print("❌ Error: iso_13485_procedures.json not found!")
         return None
 
-def search_procedures_by_keyword(keyword: str, database: Dict) -> List[Dict]:
-    """Search procedures by keyword"""
-    results = []
-    keyword_lower = keyword.lower()
-    
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            for proc in section['procedures']:
-                if (keyword_lower in proc.get('title', '').lower() or
-                    keyword_lower in proc.get('description', '').lower() or
-                    any(keyword_lower in k.lower() for k in proc.get('keywords', []))):
-                    results.append(proc)
-        
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    for proc in subsection['procedures']:
-                        if (keyword_lower in proc.get('title', '').lower() or
-                            keyword_lower in proc.get('description', '').lower() or
-                            any(keyword_lower in k.lower() for k in proc.get('keywords', []))):
-                            results.append(proc)
-    
-    return results
-
-def search_procedures_by_id(proc_id: str, database: Dict) -> Dict:
-    """Search procedure by ID"""
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            for proc in section['procedures']:
-                if proc.get('proc_id') == proc_id:
-                    return proc
-        
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    for proc in subsection['procedures']:
-                        if proc.get('proc_id') == proc_id:
-                            return proc
-    
-    return None
-
-def get_all_procedures(database: Dict) -> List[Dict]:
-    """Get all procedures from database"""
-    all_procs = []
-    
-    for section in database.get('sections', []):
-        if 'procedures' in section:
-            all_procs.extend(section['procedures'])
-        
-        if 'subsections' in section:
-            for subsection in section['subsections']:
-                if 'procedures' in subsection:
-                    all_procs.extend(subsection['procedures'])
-    
-    return all_procs
+def render_procedure_context(proc: Dict) -> str:
+    """Prompt block for one retrieved procedure"""
+    lines = [
+        proc.get('title', 'Unknown'),
+        f"   ID: {proc.get('proc_id', 'N/A')}",
+        f"   Requirement: {proc.get('requirement', 'N/A')}",
+        f"   Description: {proc.get('description', 'N/A')}",
+    ]
+    if proc.get('key_requirements'):
+        lines.append(f"   Key Points: {'; '.join(proc['key_requirements'])}")
+    if proc.get('implementation_steps'):
+        lines.append(f"   Implementation Steps: {' '.join(proc['implementation_steps'])}")
+    return "\n".join(lines)
 
-def query_openai_for_rag(user_query: str, retrieved_procedures: List[Dict]) -> str:
-    """Use OpenAI to generate answer based on retrieved procedures"""
+def query_openai_for_rag(user_query: str, retrieved_procedures: List[Dict], stream: bool = False) -> Union[str, TokenStream]:
+    """Use OpenAI to generate answer based on retrieved procedures (a TokenStream of the answer if stream=True)"""
     
-    # Build context from retrieved procedures
-    context = "ISO 13485:2016 Procedures Context:\n\n"
-    for i, proc in enumerate(retrieved_procedures[:3], 1):
-        context += f"\n{i}. {proc.get('title', 'Unknown')}\n"
-        context += f"   ID: {proc.get('proc_id', 'N/A')}\n"
-        context += f"   Requirement: {proc.get('requirement', 'N/A')}\n"
-        context += f"   Description: {proc.get('description', 'N/A')}\n"
-        context += f"   Key Points: {', '.join(proc.get('key_requirements', [])[:3])}\n"
+    # Build context from retrieved procedures: packed in ranking order until the token budget is used
+    packed = pack_context(
+        [render_procedure_context(proc) for proc in retrieved_procedures],
+        budget=CONTEXT_TOKEN_BUDGET,
+        model="gpt-3.5-turbo",
+        label="{n}. ",
+    )
+    context = "ISO 13485:2016 Procedures Context:\n\n" + packed.text
     
     # Create message for OpenAI
     messages = [
@@ -109,6 +81,17 @@ Provide a clear, structured answer that references the specific procedures."""
         }
     ]
     
+    if stream:
+        # Tokens are yielded as they arrive; TTFT and tokens/sec are recorded on the stream
+        return TokenStream(openai_deltas(
+            client,
+            on_error=lambda e: f"Error calling OpenAI API: {str(e)}",
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000
+        ))
+
     try:
         response = client.chat.completions.create(
             model="gpt-3.5-turbo",
@@ -169,7 +152,7 @@ def display_summary_list(procedures: List[Dict], title: str):
         print(f"   Description: {proc.get('description', 'N/A')[:80]}...")
         print()
 
-def interactive_mode(database: Dict):
+def interactive_mode(index: ProcedureIndex):
     """Interactive command-line interface"""
     print("\n" + "="*80)
     print("🤖 ISO 13485:2016 RAG Chatbot - Interactive Mode")
@@ -217,7 +200,7 @@ def interactive_mode(database: Dict):
                     continue
                 
                 print(f"\n🔍 Searching for: '{arg}'...")
-                results = search_procedures_by_keyword(arg, database)
+                results = index.search_keyword(arg)
                 
                 if results:
                     display_summary_list(results, f"Search Results for '{arg}'")
@@ -225,7 +208,7 @@ def interactive_mode(database: Dict):
                     # Ask if user wants details
                     view = input("📖 View full details of a procedure? Enter ID (or 'no'): ").strip()
                     if view.lower() != 'no' and view:
-                        proc = search_procedures_by_id(view, database)
+                        proc = index.get(view)
                         if proc:
                             display_procedure(proc)
                         else:
@@ -239,7 +222,7 @@ def interactive_mode(database: Dict):
                     continue
                 
                 print(f"\n🔍 Finding procedure: {arg}...")
-                proc = search_procedures_by_id(arg, database)
+                proc = index.get(arg)
                 
                 if proc:
                     display_procedure(proc)
@@ -256,19 +239,7 @@ def interactive_mode(database: Dict):
                 
                 # Search for relevant procedures
                 keywords = [word for word in arg.lower().split() if len(word) > 3]
-                all_results = []
-                
-                for keyword in keywords[:3]:
-                    results = search_procedures_by_keyword(keyword, database)
-                    all_results.extend(results)
-                
-                # Remove duplicates
-                seen_ids = set()
-                unique_results = []
-                for proc in all_results:
-                    if proc.get('proc_id') not in seen_ids:
-                        unique_results.append(proc)
-                        seen_ids.add(proc.get('proc_id'))
+                unique_results = index.search_keywords(keywords[:3])
                 
                 if unique_results:
                     print(f"\n✅ Found {len(unique_results)} relevant procedures:")
@@ -276,12 +247,15 @@ def interactive_mode(database: Dict):
                         print(f"   • {proc.get('proc_id')}: {proc.get('title')}")
                     
                     print("\n⏳ Generating answer from OpenAI...")
-                    answer = query_openai_for_rag(arg, unique_results)
+                    answer = query_openai_for_rag(arg, unique_results, stream=True)
                     
                     print("\n" + "="*80)
                     print("📝 ANSWER:")
                     print("="*80)
-                    print(f"\n{answer}\n")
+                    print()
+                    # Tokens are printed as they arrive
+                    print_stream(answer)
+                    print(f"\n⏱️  {answer.summary()}\n")
                     
                     # Show detailed procedures
                     view = input("📖 View detailed procedures? (yes/no): ").strip().lower()
@@ -292,13 +266,12 @@ def interactive_mode(database: Dict):
                     print(f"❌ No relevant procedures found for your question")
             
             elif command == 'browse':
-                all_procs = get_all_procedures(database)
-                display_summary_list(all_procs, "All Procedures")
+                display_summary_list(index.all_procedures, "All Procedures")
                 
                 # Option to view specific procedure
                 proc_id = input("📖 View full details? Enter procedure ID (or 'no'): ").strip()
                 if proc_id.lower() != 'no' and proc_id:
-                    proc = search_procedures_by_id(proc_id, database)
+                    proc = index.get(proc_id)
                     if proc:
                         display_procedure(proc)
                     else:
@@ -309,8 +282,7 @@ def interactive_mode(database: Dict):
                     print("❌ Please provide a section number (e.g., '8')")
                     continue
                 
-                all_procs = get_all_procedures(database)
-                section_procs = [p for p in all_procs if p.get('requirement', '').startswith(arg)]
+                section_procs = index.procedures_in_section(arg)
                 
                 if section_procs:
                     display_summary_list(section_procs, f"Procedures in Section {arg}")
@@ -342,7 +314,7 @@ def interactive_mode(database: Dict):
             print(f"❌ Error: {str(e)}")
             continue
 
-def demo_mode(database: Dict):
+def demo_mode(index: ProcedureIndex):
     """Automated demo showing RAG capabilities"""
     print("\n" + "="*80)
     print("🚀 ISO 13485:2016 RAG Chatbot - Demo Mode")
@@ -360,36 +332,28 @@ def demo_mode(database: Dict):
         print(f"{'─'*80}")
         
         if cmd_type == "search":
-            results = search_procedures_by_keyword(query, database)
+            results = index.search_keyword(query)
             if results:
                 print(f"✅ Found {len(results)} procedures:")
                 display_summary_list(results, f"Search Results")
         
         elif cmd_type == "find":
-            proc = search_procedures_by_id(query, database)
+            proc = index.get(query)
             if proc:
                 display_procedure(proc)
         
         elif cmd_type == "ask":
             print(f"💬 Question: {query}")
             keywords = [word for word in query.lower().split() if len(word) > 3]
-            all_results = []
-            for keyword in keywords[:3]:
-                results = search_procedures_by_keyword(keyword, database)
-                all_results.extend(results)
-            
-            seen_ids = set()
-            unique_results = []
-            for proc in all_results:
-                if proc.get('proc_id') not in seen_ids:
-                    unique_results.append(proc)
-                    seen_ids.add(proc.get('proc_id'))
+            unique_results = index.search_keywords(keywords[:3])
             
             if unique_results:
                 print(f"✅ Found {len(unique_results)} relevant procedures")
                 print("\n⏳ Calling OpenAI API...")
-                answer = query_openai_for_rag(query, unique_results)
-                print(f"\n📝 Answer:\n{answer}")
+                answer = query_openai_for_rag(query, unique_results, stream=True)
+                print("\n📝 Answer:")
+                print_stream(answer)
+                print(f"⏱️  {answer.summary()}")
     
     print(f"\n{'='*80}")
     print("✨ Demo Complete!")
@@ -408,8 +372,8 @@ def main():
     if not database:
         return
     
-    all_procs = get_all_procedures(database)
-    print(f"✅ Loaded {len(all_procs)} procedures from {len(database.get('sections', []))} sections")
+    index = ProcedureIndex(database)
+    print(f"✅ Loaded {len(index.all_procedures)} procedures from {len(database.get('sections', []))} sections")
     
     # Check OpenAI API key
     api_key = os.getenv("OPENAI_API_KEY")
@@ -429,9 +393,9 @@ def main():
     mode = input("\nEnter your choice (1 or 2, or press Enter for interactive): ").strip()
     
     if mode == "2":
-        demo_mode(database)
+        demo_mode(index)
     else:
-        interactive_mode(database)
+        interactive_mode(index)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 import streamlit as st
-import json
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
 import numpy as np
@@ -8,6 +9,11 @@ from rank_bm25 import BM25Okapi
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.dataset_loader import load_json
+from rag_core.streaming import TokenStream, openai_deltas
+
 # Load environment variables
 load_dotenv()
 
@@ -41,8 +47,8 @@ st.markdown("""
 @st.cache_resource
 def load_procedure_data():
     """Load the JSON procedure database"""
-    with open('procedure_1_app\data.json', 'r') as f:
-        return json.load(f)
+    data, _ = load_json('procedure_1_app\data.json')
+    return data
 
 procedure_data = load_procedure_data()
 procedure = procedure_data['procedure']
@@ -190,16 +196,17 @@ def hybrid_search(query, top_k=5, bm25_weight=0.6, tfidf_weight=0.4):
 # ============================================================================
 # OPENAI GENERATION
 # ============================================================================
-def generate_response_with_rag(user_query, search_results):
+def generate_response_with_rag(user_query, search_results, stream=False):
     """
     Generate chatbot response using RAG (Retrieval Augmented Generation)
     
     Args:
         user_query: User's question
         search_results: Retrieved context from hybrid search
+        stream: Return a TokenStream that yields the response as it is generated
     
     Returns:
-        Generated response from OpenAI
+        Generated response from OpenAI (a TokenStream if stream=True)
     """
     # Build context from search results
     context_parts = []
@@ -231,6 +238,16 @@ Focus on Phase 1: Explaining what a procedure should contain."""
         {"role": "user", "content": f"Based on this procedure knowledge: {context}\n\nUser question: {user_query}"}
     ]
     
+    if stream:
+        return TokenStream(openai_deltas(
+            client,
+            on_error=lambda e: f"Error generating response: {str(e)}. Please check your OpenAI API key in .env file.",
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1500
+        ))
+    
     try:
         response = client.chat.completions.create(
             model="gpt-3.5-turbo",
@@ -315,12 +332,11 @@ with tab1:
                         st.write(f"**Type:** {result['document']['type']}")
                         st.write(result['document'].get('content', 'N/A'))
             
-            # Generate response
-            with st.spinner("✨ Generating response with OpenAI..."):
-                response = generate_response_with_rag(user_input, search_results)
-            
+            # Generate response: retrieval is done, tokens are rendered as they arrive
             st.subheader("💡 Response")
-            st.markdown(response)
+            response = generate_response_with_rag(user_input, search_results, stream=True)
+            st.write_stream(response)
+            st.caption(response.summary())
             
             # Show sources
             st.subheader("📚 Sources")
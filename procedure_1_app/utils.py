@@ -7,9 +7,13 @@ Includes:
 - Data loading helpers
 """
 
-import json
+import sys
 from pathlib import Path
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.dataset_loader import load_json
+
 
 def validate_procedure_json(filepath: str) -> tuple[bool, list]:
     """
@@ -21,16 +25,28 @@ def validate_procedure_json(filepath: str) -> tuple[bool, list]:
     Returns:
         (is_valid, error_messages)
     """
-    errors = []
-    
     try:
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        data, _ = load_json(filepath)
     except FileNotFoundError:
         return False, [f"File not found: {filepath}"]
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         return False, [f"Invalid JSON: {str(e)}"]
     
+    return validate_procedure_data(data)
+
+
+def validate_procedure_data(data: dict) -> tuple[bool, list]:
+    """
+    Validate an already parsed procedure structure
+    
+    Args:
+        data: Parsed procedure JSON
+        
+    Returns:
+        (is_valid, error_messages)
+    """
+    errors = []
+    
     # Check required top-level structure
     if 'procedure' not in data:
         errors.append("Missing 'procedure' key at root level")
@@ -87,14 +103,23 @@ def load_procedure_data(filepath: str) -> dict:
     Raises:
         ValueError: If validation fails
     """
-    is_valid, errors = validate_procedure_json(filepath)
+    # Parsed once: the same object is validated and returned
+    try:
+        data, _ = load_json(filepath)
+    except FileNotFoundError:
+        errors = [f"File not found: {filepath}"]
+        data = None
+    except ValueError as e:
+        errors = [f"Invalid JSON: {str(e)}"]
+        data = None
+    else:
+        _, errors = validate_procedure_data(data)
     
-    if not is_valid:
+    if errors:
         error_msg = "Validation errors:\n" + "\n".join(errors)
         raise ValueError(error_msg)
     
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    return data
 
 
 def get_procedure_statistics(procedure_data: dict) -> dict:
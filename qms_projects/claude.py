@@ -246,7 +246,9 @@
 # qmsApp_rag_actionable.py
 import streamlit as st
 import os
+import sys
 import json
+from pathlib import Path
 from dotenv import load_dotenv
 
 from langchain.schema import Document
@@ -254,6 +256,11 @@ from langchain.vectorstores import Chroma
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.chat_models import ChatOpenAI
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.mmr import mmr_search
+
 # ---------------------------------------------------
 # LOAD ENVIRONMENT
 # ---------------------------------------------------
@@ -340,7 +347,7 @@ if len(documents) == 0:
 # ---------------------------------------------------
 # EMBEDDINGS & VECTORSTORE
 # ---------------------------------------------------
-embedding = OpenAIEmbeddings()
+embedding = CachedEmbeddings(OpenAIEmbeddings())
 
 if os.path.exists(PERSIST_PATH):
     vectorstore = Chroma(
@@ -355,8 +362,6 @@ else:
     )
     vectorstore.persist()
 
-retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k":5, "fetch_k":20})
-
 # ---------------------------------------------------
 # LLM
 # ---------------------------------------------------
@@ -437,7 +442,8 @@ def generate_actionable_answer(query):
         return
 
     # 2️⃣ Hybrid Retrieval
-    docs = retriever.get_relevant_documents(query)
+    hits = mmr_search(vectorstore, query, k=5, fetch_k=20)
+    docs = [Document(page_content=h["text"], metadata=h["meta"]) for h in hits]
     procedures = extract_procedures_from_docs(docs)
     if len(procedures) == 0:
         st.warning("No procedures found for this query.")
@@ -1,8 +1,9 @@
 import os
 import re
+import sys
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -11,7 +12,18 @@ from langchain.chat_models import ChatOpenAI
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
 
-from rank_bm25 import BM25Okapi
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from rag_core.bm25 import BM25Index
+from rag_core.chroma_sync import sync_if_changed
+from rag_core.context_packer import PackedContext, compact_json, containment, pack_context, shingles
+from rag_core.dataset_loader import LoadStats, load_json
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.fusion import hybrid_retrieve
+from rag_core.intent import IntentClassifier, rule_intent, training_key
+from rag_core.mmr import mmr_search
+from rag_core.query_pipeline import run_query_pipeline
+from rag_core.streaming import TokenStream, chat_model_deltas
 
 # ---------------------------
 # Load .env
@@ -33,34 +45,45 @@ BASE_DIR = Path(__file__).parent
 DEFAULT_JSON = str(BASE_DIR / "data.json")
 DEFAULT_PERSIST = str(BASE_DIR / "chroma_qms")
 DEFAULT_COLLECTION = "iso13485_procedures"
+INTENT_MODEL = str(BASE_DIR / "intent_model.npz")
+INTENT_LOG = str(BASE_DIR / "intent_log.jsonl")
+# Only LLM-labelled queries: what the model trains on, kept apart from the full decision log
+INTENT_TRAINING = str(BASE_DIR / "intent_training.jsonl")
 
 CLAUSE_REGEX = r"\b([4-7]\.\d+(?:\.\d+)*)\b"
 FALLBACK_RESPONSE = "This procedure is not available in the current ISO 13485 clause dataset."
+# Prompt tokens available to retrieved context in the report prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Shown in each block header (or the block text), so dropped from the sections JSON
+HEADER_KEYS = ("procedure_id", "procedure_name", "clause_references", "clause_reference", "retrieval_text")
 
 # ---------------------------
 # Dataset loader (expects {"entries":[...]} but also supports list/single object)
 # ---------------------------
-def load_procedure_dataset(path: str) -> List[Dict[str, Any]]:
+def load_procedure_dataset(path: str) -> Tuple[List[Dict[str, Any]], LoadStats]:
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"Dataset JSON not found at: {p.resolve()}")
 
-    with p.open("r", encoding="utf-8") as f:
-        j = json.load(f)
+    # Read once, parsed with orjson when installed; stats hold size and load time
+    j, stats = load_json(p)
 
     # Root list
     if isinstance(j, list) and len(j) > 0:
-        return j
+        stats.entries = len(j)
+        return j, stats
 
     # Root dict
     if isinstance(j, dict):
         for key in ("entries", "procedures", "data"):
             if key in j and isinstance(j[key], list) and len(j[key]) > 0:
-                return j[key]
+                stats.entries = len(j[key])
+                return j[key], stats
 
         # Single procedure object -> wrap
         if "procedure_name" in j and ("sections" in j or "retrieval_text" in j):
-            return [j]
+            stats.entries = 1
+            return [j], stats
 
     raise ValueError(
         "JSON structure not recognized.\n"
@@ -106,52 +129,44 @@ def entries_to_texts_and_meta(entries: List[Dict[str, Any]]) -> Tuple[List[str],
 
     return texts, metas
 
-# ---------------------------
-# BM25
-# ---------------------------
-class SimpleBM25:
-    def __init__(self, texts: List[str], metas: List[Dict[str, Any]]):
-        self.docs = texts
-        self.metas = metas
-        tokenized = [self._tokenize(t) for t in texts]
-        self.bm25 = BM25Okapi(tokenized)
-
-    def _tokenize(self, t: str):
-        return [w.lower() for w in re.findall(r"\w+", t)]
-
-    def query(self, q: str, k: int = 6):
-        tokens = self._tokenize(q)
-        scores = self.bm25.get_scores(tokens)
-        top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        out = []
-        for i in top_idx:
-            out.append({"text": self.docs[i], "meta": self.metas[i], "score": float(scores[i])})
-        return out
+
+def dataset_mtime(path: str) -> int:
+    p = Path(path)
+    return p.stat().st_mtime_ns if p.exists() else 0
+
+
+@st.cache_resource(max_entries=2)
+def dataset_texts(path: str, mtime: int) -> Tuple[List[str], List[Dict[str, Any]], LoadStats]:
+    # Keyed on the file's mtime: reruns reuse the parsed dataset, an edited file is reloaded
+    entries, stats = load_procedure_dataset(path)
+    texts, metas = entries_to_texts_and_meta(entries)
+    return texts, metas, stats
+
+
+@st.cache_resource(max_entries=2)
+def bm25_index(index_dir: str, path: str, mtime: int, _texts, _metas) -> BM25Index:
+    # Synced against the dataset once per version, not on every widget interaction
+    return BM25Index.load_or_build(index_dir, [m["procedure_id"] for m in _metas], _texts, _metas)
 
 # ---------------------------
 # Chroma load/build
 # ---------------------------
-def build_or_load_chroma(texts, metas, persist_dir, collection, embeddings) -> Chroma:
+@st.cache_resource
+def load_chroma(persist_dir: str, collection: str, _embeddings) -> Chroma:
+    # Opened once per collection; reruns reuse the same store
     Path(persist_dir).mkdir(parents=True, exist_ok=True)
-    try:
-        db = Chroma(
-            persist_directory=persist_dir,
-            collection_name=collection,
-            embedding_function=embeddings,
-        )
-        if db._collection.count() == 0:
-            raise Exception("Empty collection")
-        return db
-    except Exception:
-        db = Chroma.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metas,
-            persist_directory=persist_dir,
-            collection_name=collection,
-        )
-        db.persist()
-        return db
+    return Chroma(
+        persist_directory=persist_dir,
+        collection_name=collection,
+        embedding_function=_embeddings,
+    )
+
+def build_or_load_chroma(texts, metas, persist_dir, collection, embeddings, force: bool = False):
+    db = load_chroma(persist_dir, collection, embeddings)
+    # Embed only new/changed entries (content-hash IDs), and only when the dataset
+    # differs from the last synced version (or when forced)
+    changes = sync_if_changed(db, texts, metas, force=force)
+    return db, changes
 
 # ---------------------------
 # LLM helpers
@@ -176,25 +191,29 @@ def detect_intent(llm: ChatOpenAI, q: str) -> str:
         return "GENERAL_QMS_QUESTION"
     return label
 
-def build_context(cands: List[Dict[str, Any]], max_docs: int = 6) -> str:
-    blocks = []
-    for i, c in enumerate(cands[:max_docs], 1):
-        m = c["meta"]
-        blocks.append(
-            f"[DOC {i}]\n"
-            f"procedure_id: {m.get('procedure_id')}\n"
-            f"procedure_name: {m.get('procedure_name')}\n"
-            f"clause_references: {m.get('clause_references')}\n"
-            f"sections_json: {m.get('raw_sections')}\n"
-            f"text: {c['text'][:3000]}\n"
-        )
-    return "\n\n".join(blocks)
-
-def generate_report(llm: ChatOpenAI, user_q: str, cands: List[Dict[str, Any]]) -> str:
-    if not cands:
-        return FALLBACK_RESPONSE
-
-    context = build_context(cands)
+def render_candidate(c: Dict[str, Any]) -> str:
+    m = c["meta"]
+    sections = compact_json(m.get("raw_sections") or "{}", drop_keys=HEADER_KEYS)
+    lines = [
+        f"procedure_id: {m.get('procedure_id')}",
+        f"procedure_name: {m.get('procedure_name')}",
+        f"clause_references: {m.get('clause_references')}",
+    ]
+    if sections:
+        lines.append(f"sections_json: {sections}")
+    # retrieval_text is usually derived from the sections; keep it only when it adds content
+    if not sections or containment(shingles(c["text"]), shingles(sections)) < 0.8:
+        lines.append(f"text: {c['text']}")
+    return "\n".join(lines)
+
+def build_context(cands: List[Dict[str, Any]], budget: int = CONTEXT_TOKEN_BUDGET, model: Optional[str] = None) -> PackedContext:
+    # Candidates arrive in rank order (fused score, clause matches boosted first) and are packed
+    # whole until the token budget is used up, instead of being cut at a character limit
+    return pack_context([render_candidate(c) for c in cands], budget=budget, model=model)
+
+def generate_report(llm: ChatOpenAI, user_q: str, context: PackedContext, stream: bool = False) -> Union[str, TokenStream]:
+    if not context.included:
+        return TokenStream([FALLBACK_RESPONSE]) if stream else FALLBACK_RESPONSE
 
     prompt = f"""
 You are an ISO 13485 QMS compliance assistant specialized in Clauses 4, 5, 6, and 7.
@@ -227,10 +246,12 @@ User question:
 {user_q}
 
 Context:
-{context}
+{context.text}
 
 Write the report now.
 """
+    if stream:
+        return TokenStream(chat_model_deltas(llm, prompt))
     resp = llm(prompt)
     return getattr(resp, "content", str(resp)).strip()
 
@@ -253,67 +274,48 @@ with st.sidebar:
 # ---------------------------
 st.write("📌 Dataset absolute path:", str(Path(dataset_path).resolve()))
 
+mtime = dataset_mtime(dataset_path)
 try:
-    entries = load_procedure_dataset(dataset_path)
+    texts, metas, load_stats = dataset_texts(dataset_path, mtime)
 except Exception as e:
     st.error(f"Failed to load dataset: {e}")
     st.stop()
+st.caption(load_stats.summary())
 
-texts, metas = entries_to_texts_and_meta(entries)
-bm25 = SimpleBM25(texts, metas)
+# BM25 side is persisted next to the Chroma collection; only changed entries are re-tokenized
+bm25 = bm25_index(str(Path(persist_dir) / f"bm25_{collection}"), dataset_path, mtime, texts, metas)
 
-embeddings = OpenAIEmbeddings()
-db = build_or_load_chroma(texts, metas, persist_dir, collection, embeddings)
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+with st.spinner("Checking Chroma..."):
+    db, changes = build_or_load_chroma(texts, metas, persist_dir, collection, embeddings, force=rebuild_db)
 
-if rebuild_db:
-    with st.spinner("Rebuilding Chroma..."):
-        db = Chroma.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metas,
-            persist_directory=persist_dir,
-            collection_name=collection,
-        )
-        db.persist()
-    st.success("✅ Chroma rebuilt.")
+if changes is not None:
+    st.success(f"✅ Chroma synced: {changes['added']} embedded, {changes['removed']} removed, {changes['unchanged']} unchanged.")
 
 llm = ChatOpenAI(model=model_name, temperature=temperature)
 
+@st.cache_resource(max_entries=1)
+def intent_classifier(training_version: str) -> IntentClassifier:
+    # Keyed on the training file's size and mtime (a stat, not a parse): a new
+    # LLM-labelled query retrains the model on the next run instead of at the
+    # next process restart
+    return IntentClassifier.load_or_train(INTENT_MODEL, INTENT_TRAINING, log_path=INTENT_LOG)
+
 # ---------------------------
 # Hybrid search
 # ---------------------------
 def hybrid_search(query: str, top_k: int = 8) -> List[Dict[str, Any]]:
-    # BM25
-    bm_hits = bm25.query(query, k=top_k * 2)
-    max_b = max((h["score"] for h in bm_hits), default=1.0)
-
-    # Vector MMR
-    retriever = db.as_retriever(
-        search_type="mmr",
-        search_kwargs={"k": top_k, "fetch_k": max(20, top_k * 4), "lambda_mult": 0.6},
+    # BM25 and vector MMR (real cosine relevance) run concurrently, fused by reciprocal rank;
+    # "sources" on each hit holds the per-retriever rank and score
+    return hybrid_retrieve(
+        {
+            "bm25": lambda: bm25.search(query, k=top_k * 2),
+            "vector": lambda: mmr_search(db, query, k=top_k, fetch_k=max(12, top_k * 2), lambda_mult=0.6),
+        },
+        method="rrf",
+        weights={"bm25": 0.45, "vector": 0.55},
+        top_k=top_k,
     )
-    vec_docs = retriever.get_relevant_documents(query)
-
-    combined = {}
-
-    for h in bm_hits:
-        pid = h["meta"]["procedure_id"]
-        combined.setdefault(pid, {"meta": h["meta"], "text": h["text"], "bm25": 0.0, "vec": 0.0})
-        combined[pid]["bm25"] = (h["score"] / max_b) if max_b else 0.0
-
-    for d in vec_docs:
-        m = d.metadata
-        pid = m.get("procedure_id") or m.get("procedure_name")
-        combined.setdefault(pid, {"meta": m, "text": d.page_content, "bm25": 0.0, "vec": 0.0})
-        combined[pid]["vec"] = max(combined[pid]["vec"], 0.6)  # MMR retriever doesn't return score
-
-    out = []
-    for pid, v in combined.items():
-        score = 0.45 * v["bm25"] + 0.55 * v["vec"]
-        out.append({"meta": v["meta"], "text": v["text"], "score": score})
-
-    out.sort(key=lambda x: x["score"], reverse=True)
-    return out[:top_k]
 
 # ---------------------------
 # Main UI
@@ -322,15 +324,34 @@ q = st.text_area("Ask about a procedure or clause (e.g., 'Procedure for Control
 run = st.button("🔎 Run RAG")
 
 if run and q.strip():
-    with st.spinner("Query rewrite + intent detection..."):
-        rewritten = rewrite_query(llm, q)
-        intent = detect_intent(llm, q)
-        clauses = re.findall(CLAUSE_REGEX, q)
-
-    st.write({"intent": intent, "rewritten": rewritten, "clauses": clauses})
+    clauses = re.findall(CLAUSE_REGEX, q)
+    classifier = intent_classifier(training_key(INTENT_TRAINING))
+    intent_source = {}
+
+    def classify(text: str) -> str:
+        # Rules and the local model first; the LLM only for ambiguous queries
+        label, intent_source["source"] = classifier.classify(text, fallback=lambda t: detect_intent(llm, t))
+        return label
+
+    # A bare clause lookup ("4.2.4") is retrieved as typed, without an LLM rewrite
+    clause_only = rule_intent(q) == "CLAUSE_LOOKUP"
+    # Rewrite, intent detection and retrieval on the raw query start together;
+    # the raw-query hits are reused or merged once the rewrite arrives
+    with st.spinner("Query rewrite + intent detection + hybrid retrieval (BM25 + MMR)..."):
+        pipeline = run_query_pipeline(
+            q,
+            rewrite=(lambda text: text) if clause_only else (lambda text: rewrite_query(llm, text)),
+            detect_intent=classify,
+            retrieve=lambda text: hybrid_search(text, top_k=8),
+            top_k=8,
+        )
+    rewritten, intent, hits = pipeline["rewritten"], pipeline["intent"], pipeline["hits"]
 
-    with st.spinner("Hybrid retrieval (BM25 + MMR)..."):
-        hits = hybrid_search(rewritten, top_k=8)
+    st.write({"intent": intent, "intent_source": intent_source.get("source"), "rewritten": rewritten, "clauses": clauses})
+    st.caption(
+        f"speculative retrieval: {pipeline['speculative']} · "
+        + " · ".join(f"{step} {secs:.2f}s" for step, secs in pipeline["timings"].items())
+    )
 
     if clauses:
         clause = clauses[0]
@@ -341,11 +362,17 @@ if run and q.strip():
     st.markdown("### 📚 Retrieved candidates")
     for i, h in enumerate(hits, 1):
         with st.expander(f"{i}. {h['meta'].get('procedure_name')} (score={h['score']:.3f})"):
+            st.caption(" · ".join(
+                [f"{name}: rank {src['rank']}, score {src['score']:.3f}" for name, src in h["sources"].items()]
+                + [f"{query} query: rank {src['rank']}" for query, src in h.get("origin", {}).items()]
+            ))
             st.json(h["meta"])
             st.write(h["text"][:2000] + ("..." if len(h["text"]) > 2000 else ""))
 
-    with st.spinner("Generating structured report..."):
-        report = generate_report(llm, q, hits[:6])
-
+    # Long reports are rendered token by token instead of after the full completion
     st.markdown("### ✅ Procedure Package Report")
-    st.markdown(report)
\ No newline at end of file
+    context = build_context(hits, model=model_name)
+    st.caption(context.summary(total=len(hits)))
+    report = generate_report(llm, q, context, stream=True)
+    st.write_stream(report)
+    st.caption(report.summary())
\ No newline at end of file
@@ -229,6 +229,8 @@
 
 # procedeur_clean_text.py
 import os
+import sys
+from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_community.vectorstores import Chroma
@@ -237,6 +239,10 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.embedding_cache import CachedEmbeddings
+
 # -------------------------
 # 1️⃣ Load .env API keys
 # -------------------------
@@ -259,7 +265,7 @@ st.success("✅ API keys loaded successfully.")
 # 2️⃣ Load existing Chroma vector store
 # -------------------------
 persist_directory = os.path.join(os.path.dirname(__file__), "chroma_db")
-embeddings = OpenAIEmbeddings()
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
 
 if not os.path.exists(persist_directory):
     st.error(f"Vector store folder not found at {persist_directory}")
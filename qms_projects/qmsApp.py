@@ -1,6 +1,8 @@
 # qmsApp.py
 import streamlit as st
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
@@ -8,6 +10,12 @@ from langchain.chat_models import ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate
 
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag_core.answer_cache import AnswerCache
+from rag_core.chroma_sync import collection_version
+from rag_core.embedding_cache import CachedEmbeddings
+
 # --------------------------
 # 1. Load environment variables
 # --------------------------
@@ -22,9 +30,9 @@ if not OPENAI_API_KEY:
 # 2. Initialize embeddings
 # --------------------------
 # Use the same embeddings as when the vector store was created
-embeddings_model = OpenAIEmbeddings(
+embeddings_model = CachedEmbeddings(OpenAIEmbeddings(
     openai_api_key=OPENAI_API_KEY
-)  # default model -> text-embedding-3-small (1536-dim)
+))  # default model -> text-embedding-3-small (1536-dim)
 
 # --------------------------
 # 3. Load Chroma vector store
@@ -87,6 +95,10 @@ document_chain = create_stuff_documents_chain(llm, prompt)
 # Create the RAG chain
 rag_chain = create_retrieval_chain(retriever, document_chain)
 
+@st.cache_resource
+def answer_cache():
+    return AnswerCache(embeddings=embeddings_model)
+
 # --------------------------
 # 6. Streamlit UI
 # --------------------------
@@ -95,12 +107,18 @@ st.title("QMS ISO 13485 RAG QA Chatbot")
 user_question = st.text_input("Ask a question about ISO 13485 QMS:")
 
 if user_question:
-    with st.spinner("Retrieving answer..."):
-        result = rag_chain.invoke({"input": user_question})
-        answer = result.get("answer", "No answer found.")
+    # Repeated or paraphrased questions are answered from .answer_cache/ without running the chain;
+    # keyed by the collection's content version, so re-indexed documents never serve old answers.
+    # On a miss the answer is streamed as it is generated.
+    stream, hit = answer_cache().stream(rag_chain, user_question, namespace=collection_version(vectorstore))
 
     st.subheader("Answer:")
-    st.write(answer)
+    st.write_stream(stream)
+    if not stream.text:
+        st.write("No answer found.")
+    if hit is None:
+        st.caption(stream.summary())
+    st.caption(answer_cache().summary())
 
     # Optional: show retrieved context
     # if st.checkbox("Show retrieved context"):
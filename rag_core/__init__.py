@@ -0,0 +1,48 @@
+"""
+Shared retrieval building blocks for the ISO 13485 RAG apps
+
+The Streamlit apps in this repo live in separate folders and are started with
+`streamlit run <folder>/<app>.py`, so each one puts the repository root on
+sys.path before importing from this package.
+
+Modules:
+- ann_index: Flat / HNSW / IVF-Flat / IVF-PQ index modes with sample training,
+  nprobe/efSearch tuning and a recall-vs-latency report
+- answer_cache: SQLite answer cache (exact + embedding-similarity lookup, TTL,
+  LRU, index-version namespaces) in front of retrieval chains
+- bm25: NumPy/SciPy BM25 engine with vectorized top-k, batch queries and an
+  on-disk index that syncs incrementally with the dataset
+- chroma_sync: content-hash IDs and incremental embed/delete for Chroma collections,
+  skipped when the synced version stamp matches the dataset
+- context_packer: tiktoken-budgeted greedy context packing with duplicate
+  skipping and compact JSON
+- dataset_loader: single-pass JSON loading (orjson when available) with load
+  stats, and ijson streaming of entries
+- embedding_cache: memmap + SQLite LRU cache wrapping any LangChain embeddings
+- embedding_pipeline: token-budgeted concurrent embedding with 429 backoff,
+  streamed into FAISS or Chroma
+- faiss_store: per-document FAISS indexes on disk, memory-mapped on load, with a
+  SQLite docstore
+- fusion: concurrent hybrid retrieval with RRF / min-max / z-score fusion and
+  per-source score breakdowns
+- index_cache: content-hash document keys and a cross-session LRU of built indexes
+- intent: rule + TF-IDF/logistic intent classifier trained from hand-labelled
+  and LLM-labelled queries, escalating only ambiguous queries to the LLM
+- mmr: vectorized maximal marginal relevance over one fetched Chroma candidate
+  matrix, keeping relevance scores
+- pdf_ingest: lazy page-by-page PDF parsing, repeated header/footer removal,
+  cleaning and chunk windows
+- pdf_parallel: PyMuPDF page-range extraction on a process pool, for single
+  uploads or whole directories of PDFs
+- procedure_model: __slots__ procedure objects parsed once, with renderings
+  memoized per (procedure_id, dataset version)
+- quantized_index: compact first-stage FAISS search (fp16 / int8 codes or
+  Matryoshka prefixes) with exact rescoring from memory-mapped float32 vectors
+- query_pipeline: concurrent query rewrite, intent detection and speculative
+  retrieval, merged or discarded when the rewrite arrives
+- section_units: one retrieval unit per procedure section with ID-only
+  metadata, and a SQLite store of the full procedures
+- streaming: token streaming from OpenAI / LangChain sources with
+  time-to-first-token and tokens/sec
+- text_cleaning: precompiled, configurable single-pass cleaner for extracted text
+"""
@@ -0,0 +1,289 @@
+"""
+Approximate-nearest-neighbour index modes for the FAISS stores
+
+The streaming build (embedding_pipeline.stream_into_faiss) always produces an
+exact flat index, since IVF and PQ indexes need training before vectors can be
+added. `to_ann` re-indexes such a store into one of:
+- flat: exact search, 4*d bytes per vector
+- hnsw: graph search, no training, fastest queries, ~(4*d + 8*M) bytes per vector
+- ivf_flat: inverted lists over k-means cells, exact vectors, probes `nprobe` cells
+- ivf_pq: inverted lists + product quantization, ~m bytes per vector
+
+Training uses a random sample of the vectors. `recall_report` compares any
+set of modes with the flat baseline (recall@k, latency, size), and
+`python -m rag_core.ann_index <index_dir>` runs it on an index saved by
+faiss_store, next to the saved index exactly as it is served (a two-stage
+store through its RescoringIndex). `--quantization` and `--matryoshka-dims`
+add quantized_index.quantization_report: recall of fp16/int8 storage and of
+Matryoshka prefix search before and after exact rescoring.
+"""
+
+import math
+import time
+from typing import Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+INDEX_KINDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+MIN_POINTS_PER_CENTROID = 39  # below this faiss k-means warns and cells are poorly placed
+
+
+def choose_kind(n_vectors: int) -> str:
+    """Index mode for a collection size: exact while cheap, graph search up to ~1M, then IVF-PQ"""
+    if n_vectors < 20_000:
+        return "flat"
+    if n_vectors < 1_000_000:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def default_nlist(n_vectors: int) -> int:
+    """About 4*sqrt(N) IVF cells, capped so every cell gets enough training points"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def default_pq_m(dim: int) -> int:
+    """Largest number of PQ sub-quantizers <= dim/16 that divides dim (96 for 1536-d)"""
+    for m in range(max(1, dim // 16), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def index_spec(kind: str, n_vectors: int, dim: int, nlist: Optional[int] = None,
+               pq_m: Optional[int] = None, hnsw_m: int = 32, encoding: str = "Flat") -> str:
+    """
+    faiss.index_factory description string for an index mode
+
+    `encoding` is the vector storage of the flat, hnsw and ivf_flat modes:
+    "Flat" (float32), "SQfp16" or "SQ8" (see quantized_index).
+    """
+    if kind == "flat":
+        return encoding
+    if kind == "hnsw":
+        return f"HNSW{hnsw_m},{encoding}"
+    if kind == "ivf_flat":
+        return f"IVF{nlist or default_nlist(n_vectors)},{encoding}"
+    if kind == "ivf_pq":
+        return f"IVF{nlist or default_nlist(n_vectors)},PQ{pq_m or default_pq_m(dim)}x8"
+    raise ValueError(f"Unknown index kind {kind!r}; expected one of {INDEX_KINDS}")
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Tune query-time accuracy/speed: IVF cells probed, HNSW candidate list size"""
+    if nprobe is not None:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+    if ef_search is not None:
+        hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+        if hnsw is not None:
+            hnsw.efSearch = ef_search
+
+
+def enable_reconstruct(index: faiss.Index) -> faiss.Index:
+    """
+    Give an IVF index a direct map so reconstruct / reconstruct_n work (no-op for other layouts)
+
+    LangChain's max_marginal_relevance_search, stored_vectors and reindexing all
+    reconstruct vectors by row. The map is saved with the index; loaders call this
+    again for indexes written without one.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index
+
+
+def build_index(
+    vectors: np.ndarray,
+    kind: str = "flat",
+    metric: int = faiss.METRIC_L2,
+    sample_size: int = 100_000,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    **spec_kwargs,
+) -> faiss.Index:
+    """
+    Build, train (on a random sample) and fill a FAISS index
+
+    Args:
+        vectors: float32 matrix, one row per vector, in docstore position order
+        kind: One of INDEX_KINDS
+        metric: faiss.METRIC_L2 or faiss.METRIC_INNER_PRODUCT
+        sample_size: Training sample for IVF centroids / PQ codebooks
+        nprobe: IVF cells probed per query (default: nlist / 16, at least 8)
+        ef_search: HNSW candidate list size per query (default: 64)
+        **spec_kwargs: nlist, pq_m, hnsw_m, encoding (see index_spec)
+
+    Returns:
+        Index holding every vector, with row i == vectors[i]
+
+    Raises:
+        ValueError: If the kind is unknown or IVF-PQ gets fewer than 256 vectors
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    if kind == "ivf_pq" and n < 256:
+        raise ValueError("ivf_pq needs at least 256 vectors to train 8-bit PQ codebooks")
+
+    index = faiss.index_factory(dim, index_spec(kind, n, dim, **spec_kwargs), metric)
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = vectors if n <= sample_size else vectors[rng.choice(n, sample_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    enable_reconstruct(index)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    set_search_params(
+        index,
+        nprobe=nprobe or (max(8, ivf.nlist // 16) if ivf is not None else None),
+        ef_search=ef_search or 64,
+    )
+    return index
+
+
+def faiss_metric(vectorstore: FAISS) -> int:
+    return faiss.METRIC_INNER_PRODUCT if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT else faiss.METRIC_L2
+
+
+def stored_vectors(vectorstore: FAISS) -> np.ndarray:
+    """All vectors of a LangChain FAISS store, in index row order"""
+    index = vectorstore.index
+    full = getattr(index, "full", None)  # two-stage quantized_index stores keep the exact vectors
+    if full is not None:
+        return np.array(full, dtype=np.float32)
+    return enable_reconstruct(index).reconstruct_n(0, index.ntotal)
+
+
+def to_ann(vectorstore: FAISS, kind: str = "auto", **build_kwargs) -> FAISS:
+    """
+    Re-index a LangChain FAISS store into another index mode
+
+    Row positions are preserved, so the docstore and index_to_docstore_id are reused as-is.
+    kind="auto" picks the mode with choose_kind.
+    """
+    n = vectorstore.index.ntotal
+    if kind == "auto":
+        kind = choose_kind(n)
+    if kind == "flat" and isinstance(faiss.downcast_index(vectorstore.index), faiss.IndexFlat):
+        return vectorstore
+    index = build_index(stored_vectors(vectorstore), kind=kind, metric=faiss_metric(vectorstore), **build_kwargs)
+    return FAISS(
+        vectorstore.embeddings,
+        index,
+        vectorstore.docstore,
+        vectorstore.index_to_docstore_id,
+        normalize_L2=vectorstore._normalize_L2,
+        distance_strategy=vectorstore.distance_strategy,
+    )
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size of an index, a close proxy for its resident memory (both stages of a two-stage index)"""
+    coarse = getattr(index, "coarse", None)
+    if coarse is not None:
+        return index_bytes(coarse) + int(index.full.nbytes)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def search_recall(index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, float]:
+    """Recall@k against exact neighbour ids and search latency of an already built index"""
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return {"recall": hits / (k * len(queries)), "ms_per_query": 1000 * elapsed / len(queries)}
+
+
+def recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    kinds: Sequence[str] = INDEX_KINDS,
+    k: int = 10,
+    metric: int = faiss.METRIC_L2,
+    built: Optional[Dict[str, object]] = None,
+    **build_kwargs,
+) -> List[Dict[str, float]]:
+    """
+    Recall@k and latency of each index mode against exact flat search
+
+    Args:
+        vectors: Indexed vectors
+        queries: Query vectors
+        kinds: Modes to compare (IVF-PQ is skipped below 256 vectors)
+        k: Neighbours per query
+        metric: faiss.METRIC_L2 or faiss.METRIC_INNER_PRODUCT
+        built: Already built indexes over the same vectors, reported first under their name
+        **build_kwargs: Passed to build_index (nprobe, ef_search, nlist, ...)
+
+    Returns:
+        One row per mode: kind, recall, ms_per_query, bytes_per_vector, build_s
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlat(vectors.shape[1], metric)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for name, index in (built or {}).items():
+        rows.append({"kind": name, **search_recall(index, queries, truth, k),
+                     "bytes_per_vector": index_bytes(index) / len(vectors), "build_s": 0.0})
+    for kind in kinds:
+        if kind == "ivf_pq" and len(vectors) < 256:
+            continue
+        start = time.perf_counter()
+        index = build_index(vectors, kind=kind, metric=metric, **build_kwargs)
+        build_s = time.perf_counter() - start
+        rows.append({"kind": kind, **search_recall(index, queries, truth, k),
+                     "bytes_per_vector": index_bytes(index) / len(vectors), "build_s": build_s})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index modes on a saved index")
+    parser.add_argument("index_dir", help="Directory written by rag_core.faiss_store.save_faiss")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors (plus noise) used as queries")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--quantization", action="store_true",
+                        help="Also report fp16/sq8 recall with and without exact rescoring")
+    parser.add_argument("--matryoshka-dims", type=int, nargs="*", default=[],
+                        help="Add Matryoshka prefix lengths (e.g. 256 512) to the quantization report")
+    args = parser.parse_args()
+
+    from rag_core.faiss_store import load_index
+    from rag_core.quantized_index import quantization_report
+
+    # The index as the apps serve it: a two-stage store is searched through its RescoringIndex
+    saved = load_index(args.index_dir, mmap=False)
+    data = saved.full if hasattr(saved, "full") else saved.reconstruct_n(0, saved.ntotal)
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    picked = data[rng.choice(len(data), min(args.queries, len(data)), replace=False)]
+    queries = picked + rng.normal(0, picked.std() * 0.1, picked.shape).astype(np.float32)
+
+    print(f"{saved.ntotal} vectors, {saved.d} dims, k={args.k}")
+    print(f"{'kind':<10}{'recall':>8}{'ms/query':>10}{'bytes/vec':>11}{'build s':>9}")
+    for row in recall_report(data, queries, k=args.k, metric=saved.metric_type, built={"saved": saved},
+                             nprobe=args.nprobe, ef_search=args.ef_search):
+        print(f"{row['kind']:<10}{row['recall']:>8.3f}{row['ms_per_query']:>10.3f}"
+              f"{row['bytes_per_vector']:>11.0f}{row['build_s']:>9.2f}")
+
+    if args.quantization or args.matryoshka_dims:
+        modes = ("fp16", "sq8") if args.quantization else ()
+        print()
+        print(f"{'mode':<16}{'first stage':>12}{'rescored':>10}{'bytes/vec':>11}")
+        for row in quantization_report(data, queries, modes=modes, k=args.k, metric=saved.metric_type,
+                                       matryoshka_dims=args.matryoshka_dims):
+            print(f"{row['mode']:<16}{row['recall_quantized']:>12.3f}{row['recall_rescored']:>10.3f}"
+                  f"{row['bytes_per_vector']:>11.0f}")
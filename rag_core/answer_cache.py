@@ -0,0 +1,238 @@
+"""
+Answer cache in front of a retrieval chain
+
+A question is looked up in two steps:
+- exact: the normalized question text (case, whitespace and trailing
+  punctuation folded) within the same namespace
+- semantic: cosine similarity of the question embedding against the cached
+  questions of the namespace that cite the same numbers (clauses, sections),
+  accepted above a threshold; "clause 7.5.1" and "clause 7.5.2" embed almost
+  identically but must never share an answer
+The namespace is the version of the index the answers came from (a document
+key, or chroma_sync.collection_version of a Chroma store), so re-indexed
+content never serves stale answers. Entries live in SQLite with a TTL and LRU eviction;
+question embeddings are stored as float32 blobs and kept in memory as one
+matrix per namespace, reloaded only when another writer changed the table.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_core.embedding_cache import normalize_text
+from rag_core.streaming import TokenStream, chain_deltas
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / ".answer_cache" / "answers.sqlite"
+NUMBER = re.compile(r"\d+(?:\.\d+)*")
+
+
+def question_key(question: str) -> str:
+    """Exact-match key: NFC, collapsed whitespace, casefolded, trailing punctuation dropped"""
+    return normalize_text(question).casefold().rstrip(" ?.!")
+
+
+def question_numbers(question: str) -> str:
+    """Sorted clause / section numbers cited by a question ("7.5.1,7.5.2"); semantic hits must cite the same ones"""
+    return ",".join(sorted(set(NUMBER.findall(question))))
+
+
+class AnswerCache:
+    """
+    SQLite answer cache with exact and embedding-similarity lookup
+
+    Args:
+        embeddings: Embeddings for semantic lookup (ideally the retriever's CachedEmbeddings,
+            so the question is embedded once for both); None = exact match only
+        path: SQLite file
+        threshold: Minimum cosine similarity for a semantic hit
+        ttl_seconds: Entries older than this are never served
+        max_entries: LRU capacity across all namespaces
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        path: Path = DEFAULT_CACHE_PATH,
+        threshold: float = 0.95,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._lock = threading.RLock()
+        self._matrices: Dict[Tuple[str, str], Tuple[int, np.ndarray, np.ndarray]] = {}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, key TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL, embedding BLOB, latency REAL NOT NULL, created REAL NOT NULL, "
+            "last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, UNIQUE(namespace, key))"
+        )
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(answers)")}
+        if "numbers" not in columns:
+            # Rows cached before number matching keep NULL and are only served on exact matches
+            self._db.execute("ALTER TABLE answers ADD COLUMN numbers TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+        self._db.commit()
+
+    def _generation(self) -> int:
+        return self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _bump_generation(self) -> None:
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+
+    def _matrix(self, namespace: str, numbers: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(row ids, normalized question embeddings) of a namespace citing `numbers`, reloaded when the table changed"""
+        generation = self._generation()
+        cached = self._matrices.get((namespace, numbers))
+        if cached and cached[0] == generation:
+            return cached[1], cached[2]
+        rows = self._db.execute(
+            "SELECT id, embedding FROM answers "
+            "WHERE namespace = ? AND numbers = ? AND embedding IS NOT NULL AND created >= ?",
+            (namespace, numbers, time.time() - self.ttl_seconds),
+        ).fetchall()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        if rows:
+            matrix = np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        self._matrices[(namespace, numbers)] = (generation, ids, matrix)
+        return ids, matrix
+
+    def lookup(self, question: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached answer for a question, or None
+
+        Returns:
+            {"answer", "match" ("exact" or "semantic"), "similarity", "question" (the cached one),
+            "saved_seconds"} on a hit
+        """
+        now = time.time()
+        with self._lock:
+            self.stats["lookups"] += 1
+            row = self._db.execute(
+                "SELECT id, question, answer, latency FROM answers WHERE namespace = ? AND key = ? AND created >= ?",
+                (namespace, question_key(question), now - self.ttl_seconds),
+            ).fetchone()
+            if row is None and self.embeddings is not None:
+                ids, matrix = self._matrix(namespace, question_numbers(question))
+            else:
+                ids, matrix = [], None
+        match, similarity = "exact", 1.0
+
+        if row is None and len(ids):
+            # Embedded outside the lock: on a miss this is the retriever's own query embedding
+            query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            sims = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                with self._lock:
+                    row = self._db.execute(
+                        "SELECT id, question, answer, latency FROM answers WHERE id = ?", (int(ids[best]),)
+                    ).fetchone()
+                match, similarity = "semantic", float(sims[best])
+
+        with self._lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            entry_id, cached_question, answer, latency = row
+            self._db.execute("UPDATE answers SET last_used = ?, hits = hits + 1 WHERE id = ?", (now, entry_id))
+            self._db.commit()
+            saved = max(latency - (time.time() - now), 0.0)
+            self.stats[f"{match}_hits"] += 1
+            self.stats["saved_seconds"] += saved
+        return {
+            "answer": answer,
+            "match": match,
+            "similarity": similarity,
+            "question": cached_question,
+            "saved_seconds": saved,
+        }
+
+    def put(self, question: str, namespace: str, answer: str, latency: float) -> None:
+        """Store an answer and the time it took to produce; expired and least-recently-used entries are evicted"""
+        embedding = None
+        if self.embeddings is not None:
+            embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32).tobytes()
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(namespace, key, question, answer, embedding, latency, created, last_used, numbers) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, question_key(question), question, answer, embedding, latency, now, now,
+                 question_numbers(question)),
+            )
+            self._db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,))
+            self._db.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._bump_generation()
+            self._db.commit()
+
+    def invoke(self, chain: Any, question: str, namespace: str, input_key: str = "input") -> Dict[str, Any]:
+        """
+        Answer through the cache: chain.invoke({input_key: question}) runs only on a miss
+
+        Returns:
+            The chain response (a cached hit has "answer", an empty "context" and no documents),
+            with "cache" set to the lookup result or None on a miss
+        """
+        hit = self.lookup(question, namespace)
+        if hit is not None:
+            return {input_key: question, "answer": hit["answer"], "context": [], "cache": hit}
+
+        start = time.perf_counter()
+        response = chain.invoke({input_key: question})
+        self.put(question, namespace, response["answer"], time.perf_counter() - start)
+        return {**response, "cache": None}
+
+    def stream(
+        self, chain: Any, question: str, namespace: str, input_key: str = "input"
+    ) -> Tuple[TokenStream, Optional[Dict[str, Any]]]:
+        """
+        Streaming variant of invoke: the chain's answer is streamed on a miss and cached once complete
+
+        Returns:
+            (answer stream, lookup result or None on a miss); a hit streams the cached answer in one piece
+        """
+        hit = self.lookup(question, namespace)
+        if hit is not None:
+            return TokenStream([hit["answer"]]), hit
+        stream = TokenStream(
+            chain_deltas(chain, {input_key: question}),
+            on_done=lambda done: self.put(question, namespace, done.text, done.elapsed),
+        )
+        return stream, None
+
+    def hit_rate(self) -> float:
+        """Share of lookups served from the cache"""
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return hits / self.stats["lookups"] if self.stats["lookups"] else 0.0
+
+    def summary(self) -> str:
+        """One-line hit rate / latency saved report"""
+        return (
+            f"answer cache: {self.hit_rate():.0%} hit rate over {self.stats['lookups']} questions "
+            f"({self.stats['exact_hits']} exact, {self.stats['semantic_hits']} semantic), "
+            f"{self.stats['saved_seconds']:.1f}s saved"
+        )
@@ -0,0 +1,326 @@
+"""
+BM25 engine shared by the hybrid retrievers
+
+Scores are kept as NumPy arrays: the corpus is stored once as a sparse
+document x term weight matrix, so a query (or a batch of queries) is a single
+sparse mat-vec product and top-k selection uses argpartition instead of a full
+Python sort. Scoring follows rank_bm25.BM25Okapi (same idf floor), so rankings
+match the previous SimpleBM25 wrappers.
+
+The index can be persisted next to a Chroma collection (term counts, document
+frequencies, doc lengths and a content hash per entry) and synced against the
+current dataset, re-tokenizing only added or changed entries.
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"\w+")
+INDEX_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, identical to the old SimpleBM25 tokenizer"""
+    return [w.lower() for w in TOKEN_PATTERN.findall(text)]
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of an entry's retrieval text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def unique_ids(ids: Sequence[str]) -> List[str]:
+    """Make entry ids unique by suffixing repeats with '#n'"""
+    seen: Dict[str, int] = {}
+    out = []
+    for entry_id in ids:
+        n = seen.get(entry_id, 0)
+        seen[entry_id] = n + 1
+        out.append(entry_id if n == 0 else f"{entry_id}#{n}")
+    return out
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores, highest first
+
+    Args:
+        scores: 1-D score array
+        k: Number of indices to return
+
+    Returns:
+        Integer array of length min(k, len(scores))
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    # Stable sort on the small candidate set keeps ties in corpus order
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class BM25Index:
+    """BM25Okapi over a text corpus with parallel metadata"""
+
+    def __init__(
+        self,
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        ids: Optional[Sequence[str]] = None,
+    ):
+        self.texts, self.metas = texts, metas
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.ids = unique_ids(ids) if ids is not None else [str(i) for i in range(len(texts))]
+        self.hashes = [content_hash(t) for t in texts]
+        self.vocab: Dict[str, int] = {}
+        self.tf = self._count_terms(texts)
+        self._compute_stats()
+        self._compute_weights()
+
+    def _count_terms(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Tokenize texts into a document x term count matrix, growing the vocabulary"""
+        rows, cols, counts = [], [], []
+        for row, text in enumerate(texts):
+            tf: Dict[int, int] = {}
+            for tok in tokenize(text):
+                col = self.vocab.setdefault(tok, len(self.vocab))
+                tf[col] = tf.get(col, 0) + 1
+            rows.extend([row] * len(tf))
+            cols.extend(tf.keys())
+            counts.extend(tf.values())
+
+        return sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (rows, cols)),
+            shape=(len(texts), len(self.vocab)),
+        )
+
+    def _compute_stats(self) -> None:
+        """Document lengths and per-term document frequencies from the count matrix"""
+        self.doc_len = np.asarray(self.tf.sum(axis=1)).ravel()
+        self.doc_freq = np.bincount(self.tf.indices, minlength=self.tf.shape[1])
+
+    def _compute_weights(self) -> None:
+        """Fold idf and length normalization into one sparse weight matrix"""
+        n_docs = self.tf.shape[0]
+        avgdl = self.doc_len.mean() if n_docs else 0.0
+
+        idf = np.log((n_docs - self.doc_freq + 0.5) / (self.doc_freq + 0.5))
+        if idf.size:
+            idf[idf < 0] = self.epsilon * idf.mean()
+        self.idf = idf.astype(np.float32)
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / avgdl) if avgdl else np.full(n_docs, self.k1)
+        weights = self.tf.copy()
+        tf_vals = weights.data
+        row_norm = np.repeat(norm, np.diff(weights.indptr)).astype(np.float32)
+        weights.data = self.idf[weights.indices] * tf_vals * (self.k1 + 1) / (tf_vals + row_norm)
+        self.weights = weights
+
+    def _query_matrix(self, queries: Sequence[str]) -> sparse.csc_matrix:
+        """Term x query count matrix; out-of-vocabulary tokens are dropped"""
+        rows, cols = [], []
+        for col, q in enumerate(queries):
+            for tok in tokenize(q):
+                term = self.vocab.get(tok)
+                if term is not None:
+                    rows.append(term)
+                    cols.append(col)
+        data = np.ones(len(rows), dtype=np.float32)
+        # Duplicate (term, query) pairs are summed, so repeated query tokens count twice like BM25Okapi
+        return sparse.csc_matrix((data, (rows, cols)), shape=(len(self.vocab), len(queries)))
+
+    def get_scores(self, q: str) -> np.ndarray:
+        """BM25 score of every document for one query"""
+        return self.get_batch_scores([q])[:, 0]
+
+    def get_batch_scores(self, queries: Sequence[str]) -> np.ndarray:
+        """Documents x queries score matrix computed in one sparse product"""
+        if not queries:
+            return np.zeros((self.weights.shape[0], 0), dtype=np.float32)
+        return np.asarray((self.weights @ self._query_matrix(queries)).todense())
+
+    def _hits(self, scores: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        return [
+            {"text": self.texts[i], "meta": self.metas[i], "score": float(scores[i])}
+            for i in top_k_indices(scores, k)
+        ]
+
+    def search(self, q: str, k: int = 6) -> List[Dict[str, Any]]:
+        """Top-k hits for one query as {"text", "meta", "score"} dicts"""
+        return self._hits(self.get_scores(q), k)
+
+    def search_batch(self, queries: Sequence[str], k: int = 6) -> List[List[Dict[str, Any]]]:
+        """Top-k hits for each query, scored in a single pass over the corpus"""
+        scores = self.get_batch_scores(queries)
+        return [self._hits(scores[:, j], k) for j in range(scores.shape[1])]
+
+    # ---------- persistence ----------
+
+    def save(self, index_dir: str) -> None:
+        """Write term counts, stats and entry hashes to `index_dir` (atomic per file)"""
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        terms = [""] * len(self.vocab)
+        for term, col in self.vocab.items():
+            terms[col] = term
+
+        tmp = path / "index.tmp.npz"
+        np.savez(
+            tmp,
+            data=self.tf.data,
+            indices=self.tf.indices,
+            indptr=self.tf.indptr,
+            shape=np.asarray(self.tf.shape),
+            doc_len=self.doc_len,
+            doc_freq=self.doc_freq,
+        )
+        os.replace(tmp, path / "index.npz")
+
+        manifest = {
+            "version": INDEX_FORMAT_VERSION,
+            "params": {"k1": self.k1, "b": self.b, "epsilon": self.epsilon},
+            "ids": self.ids,
+            "hashes": self.hashes,
+            "vocab": terms,
+        }
+        tmp = path / "manifest.tmp.json"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path / "manifest.json")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        """
+        Load a saved index without re-tokenizing anything
+
+        Texts and metadata are not stored; call sync() to attach them.
+
+        Raises:
+            FileNotFoundError: If no index has been saved in `index_dir`
+            ValueError: If the saved index uses an unknown format version
+        """
+        path = Path(index_dir)
+        manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+        if manifest.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version: {manifest.get('version')}")
+
+        with np.load(path / "index.npz") as arrays:
+            tf = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(arrays["shape"]),
+            )
+            doc_len, doc_freq = arrays["doc_len"], arrays["doc_freq"]
+
+        index = cls.__new__(cls)
+        index.k1 = manifest["params"]["k1"]
+        index.b = manifest["params"]["b"]
+        index.epsilon = manifest["params"]["epsilon"]
+        index.ids, index.hashes = manifest["ids"], manifest["hashes"]
+        index.vocab = {term: col for col, term in enumerate(manifest["vocab"])}
+        index.texts, index.metas = [None] * len(index.ids), [{} for _ in index.ids]
+        index.tf = tf
+        index.doc_len, index.doc_freq = doc_len, doc_freq
+        index._compute_weights()
+        return index
+
+    def sync(self, ids: Sequence[str], texts: List[str], metas: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Bring the index in line with the current dataset
+
+        Unchanged entries keep their stored term counts; only added or changed
+        entries are tokenized, removed ones are dropped. Rows end up in the
+        order of `ids`.
+
+        Args:
+            ids: Stable entry ids (e.g. procedure_id), parallel to texts
+            texts: Current retrieval texts
+            metas: Current metadata dicts
+
+        Returns:
+            Counts of {"added", "changed", "removed", "unchanged"} entries
+        """
+        ids = unique_ids(ids)
+        hashes = [content_hash(t) for t in texts]
+        old_rows = {entry_id: row for row, entry_id in enumerate(self.ids)}
+
+        kept_pos, kept_rows, fresh_pos = [], [], []
+        added = changed = 0
+        for pos, (entry_id, h) in enumerate(zip(ids, hashes)):
+            row = old_rows.get(entry_id)
+            if row is not None and self.hashes[row] == h:
+                kept_pos.append(pos)
+                kept_rows.append(row)
+            else:
+                fresh_pos.append(pos)
+                if row is None:
+                    added += 1
+                else:
+                    changed += 1
+        removed = len(set(old_rows) - set(ids))
+
+        if fresh_pos or removed or kept_rows != list(range(len(self.ids))):
+            fresh_tf = self._count_terms([texts[pos] for pos in fresh_pos])
+            kept_tf = self.tf[kept_rows]
+            kept_tf.resize(kept_tf.shape[0], len(self.vocab))
+            stacked = sparse.vstack([kept_tf, fresh_tf], format="csr")
+            order = np.argsort(np.asarray(kept_pos + fresh_pos, dtype=np.int64), kind="stable")
+            self.tf = stacked[order]
+            self._drop_unused_terms()
+            self._compute_stats()
+            self._compute_weights()
+
+        self.ids, self.hashes = ids, hashes
+        self.texts, self.metas = texts, metas
+        return {"added": added, "changed": changed, "removed": removed, "unchanged": len(kept_pos)}
+
+    def _drop_unused_terms(self) -> None:
+        """Remove vocabulary terms no document uses any more, so idf stats stay exact"""
+        live = np.bincount(self.tf.indices, minlength=self.tf.shape[1]) > 0
+        if live.all():
+            return
+        remap = np.cumsum(live) - 1
+        self.tf = sparse.csr_matrix(
+            (self.tf.data, remap[self.tf.indices], self.tf.indptr),
+            shape=(self.tf.shape[0], int(live.sum())),
+        )
+        self.vocab = {term: int(remap[col]) for term, col in self.vocab.items() if live[col]}
+
+    @classmethod
+    def load_or_build(
+        cls,
+        index_dir: str,
+        ids: Sequence[str],
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+    ) -> "BM25Index":
+        """
+        Load the persisted index from `index_dir` and apply dataset changes
+
+        Falls back to a full build when nothing is saved yet or the saved
+        index is unreadable; the result is written back only if it changed.
+        """
+        try:
+            index = cls.load(index_dir)
+        except (OSError, ValueError, KeyError):
+            index = cls(texts, metas, ids=ids)
+            index.save(index_dir)
+            return index
+
+        previous_ids = index.ids
+        changes = index.sync(ids, texts, metas)
+        if changes["added"] or changes["changed"] or changes["removed"] or index.ids != previous_ids:
+            index.save(index_dir)
+        return index
@@ -0,0 +1,151 @@
+"""
+Incremental sync between a procedure dataset and a persisted Chroma collection
+
+Every entry gets a stable ID hashed from procedure_id + retrieval_text +
+metadata. Syncing diffs those IDs against the ones already stored, embeds and
+adds only new or changed entries, and deletes the ones that disappeared, so an
+unchanged dataset costs zero embedding calls.
+
+After a sync, the dataset version (a hash over the entry IDs) is written to a
+small stamp file next to the collection. sync_if_changed compares it with the
+version of the current dataset and skips the sync, including the fetch of
+every stored ID, when nothing changed. collection_version is the same hash
+computed from the IDs actually stored (fetched without embeddings or
+documents), so a collection rebuilt outside sync_chroma still gets a new
+version; it refreshes the stamp when the two disagree.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain.vectorstores import Chroma
+
+
+def entry_hash(text: str, meta: Dict[str, Any]) -> str:
+    """Stable content hash of one entry, used as its Chroma ID"""
+    payload = json.dumps(
+        {"procedure_id": meta.get("procedure_id"), "text": text, "meta": meta},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stored_ids(db: Chroma) -> List[str]:
+    """IDs currently in the collection (no embeddings or documents fetched)"""
+    return db._collection.get(include=[])["ids"]
+
+
+def ids_version(collection_name: str, ids: Iterable[str]) -> str:
+    """Version of a set of entry IDs in a collection (order-independent)"""
+    digest = hashlib.sha256(collection_name.encode("utf-8"))
+    for entry_id in sorted(set(ids)):
+        digest.update(b"\0" + entry_id.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def dataset_version(db: Chroma, texts: List[str], metas: List[Dict[str, Any]]) -> str:
+    """Version the collection will have once it is synced with these entries"""
+    return ids_version(db._collection.name, (entry_hash(t, m) for t, m in zip(texts, metas)))
+
+
+def stamp_path(db: Chroma) -> Optional[Path]:
+    """Sync stamp file next to the collection (None for in-memory stores)"""
+    persist_dir = getattr(db, "_persist_directory", None)
+    return Path(persist_dir) / f"{db._collection.name}.sync.json" if persist_dir else None
+
+
+def read_stamp(db: Chroma) -> Optional[Dict[str, Any]]:
+    """Last written {"version", "count"} stamp of the collection, or None"""
+    path = stamp_path(db)
+    if path is None or not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(db: Chroma, version: str, count: int) -> None:
+    path = stamp_path(db)
+    if path is not None:
+        path.write_text(json.dumps({"version": version, "count": count}), encoding="utf-8")
+
+
+def collection_version(db: Chroma) -> str:
+    """
+    Version of a Chroma collection: hash of its name and the IDs it stores
+
+    Always computed from the stored IDs, so a collection rebuilt elsewhere (the
+    notebooks, 2-vectoredb) with the same number of chunks but different
+    content gets a new version. A stale stamp is rewritten, so the next
+    sync_if_changed sees the edit too.
+    """
+    version = ids_version(db._collection.name, stored_ids(db))
+    stamp = read_stamp(db)
+    if stamp is None or stamp.get("version") != version:
+        write_stamp(db, version, db._collection.count())
+    return version
+
+
+def sync_chroma(db: Chroma, texts: List[str], metas: List[Dict[str, Any]], batch_size: int = 256) -> Dict[str, int]:
+    """
+    Embed and add new or changed entries, delete removed ones
+
+    Args:
+        db: Chroma store opened on the persisted collection
+        texts: Current retrieval texts
+        metas: Current metadata dicts, parallel to texts
+        batch_size: Entries per add_texts call
+
+    Returns:
+        Counts of {"added", "removed", "unchanged"} entries
+    """
+    existing = set(stored_ids(db))
+
+    pending: Dict[str, int] = {}
+    for i, (text, meta) in enumerate(zip(texts, metas)):
+        pending.setdefault(entry_hash(text, meta), i)
+    new_ids = [h for h in pending if h not in existing]
+    stale_ids = [h for h in existing if h not in pending]
+
+    for start in range(0, len(new_ids), batch_size):
+        batch = new_ids[start:start + batch_size]
+        db.add_texts(
+            texts=[texts[pending[h]] for h in batch],
+            metadatas=[metas[pending[h]] for h in batch],
+            ids=batch,
+        )
+    if stale_ids:
+        db.delete(ids=stale_ids)
+    if new_ids or stale_ids:
+        db.persist()
+    write_stamp(db, ids_version(db._collection.name, pending), len(pending))
+
+    return {"added": len(new_ids), "removed": len(stale_ids), "unchanged": len(pending) - len(new_ids)}
+
+
+def sync_if_changed(
+    db: Chroma,
+    texts: List[str],
+    metas: List[Dict[str, Any]],
+    force: bool = False,
+) -> Optional[Dict[str, int]]:
+    """
+    sync_chroma, unless the stamp shows the collection already holds exactly these entries
+
+    Args:
+        db: Chroma store opened on the persisted collection
+        texts: Current retrieval texts
+        metas: Current metadata dicts, parallel to texts
+        force: Sync even if the stamp matches (e.g. after the collection was edited elsewhere)
+
+    Returns:
+        sync_chroma counts, or None if the sync was skipped
+    """
+    stamp = read_stamp(db)
+    if not force and stamp is not None and stamp.get("version") == dataset_version(db, texts, metas):
+        return None
+    return sync_chroma(db, texts, metas)
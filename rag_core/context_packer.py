@@ -0,0 +1,182 @@
+"""
+Token-budgeted prompt context packing
+
+Retrieved blocks are packed into a fixed prompt-token budget (counted with
+the chat model's tiktoken encoding) greedily by score, instead of cutting
+each block at a character limit. Blocks whose text is mostly contained in an
+already packed block are skipped as duplicates, and the last block that does
+not fit is cut at a token boundary when enough budget is left. JSON payloads
+are compacted first: empty values and keys already shown elsewhere in the
+block are dropped and the JSON is serialized without whitespace.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Set
+
+import tiktoken
+
+DEFAULT_ENCODING = "o200k_base"  # tokenizer of gpt-4o / gpt-4o-mini
+WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=8)
+def encoding_for(model: Optional[str] = None) -> tiktoken.Encoding:
+    """tiktoken encoding of a chat model (DEFAULT_ENCODING if unknown)"""
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Prompt tokens of a text for the given chat model"""
+    return len(encoding_for(model).encode_ordinary(text))
+
+
+def prune_json(value: Any, drop_keys: Iterable[str] = ()) -> Any:
+    """
+    Copy of a JSON value without empty values and without the given keys (at any depth)
+
+    Args:
+        value: Parsed JSON (dict / list / scalar)
+        drop_keys: Keys that are redundant in the prompt, e.g. already in the block header
+
+    Returns:
+        Pruned value; None if nothing is left
+    """
+    drop = set(drop_keys)
+
+    def prune(v: Any) -> Any:
+        if isinstance(v, dict):
+            out = {k: prune(x) for k, x in v.items() if k not in drop}
+            return {k: x for k, x in out.items() if x is not None} or None
+        if isinstance(v, list):
+            out = [x for x in (prune(x) for x in v) if x is not None]
+            return out or None
+        if isinstance(v, str):
+            return v.strip() or None
+        return v
+
+    return prune(value)
+
+
+def compact_json(value: Any, drop_keys: Iterable[str] = ()) -> str:
+    """Pruned JSON without whitespace between tokens ('' if nothing is left)"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return value.strip()
+    pruned = prune_json(value, drop_keys)
+    return "" if pruned is None else json.dumps(pruned, ensure_ascii=False, separators=(",", ":"))
+
+
+def shingles(text: str, n: int = 5) -> Set[int]:
+    """Hashed word n-grams of a text, for overlap detection"""
+    words = [w.lower() for w in WORD.findall(text)]
+    if len(words) < n:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + n])) for i in range(len(words) - n + 1)}
+
+
+def containment(a: Set[int], b: Set[int]) -> float:
+    """Share of a's shingles that also occur in b"""
+    return len(a & b) / len(a) if a else 1.0
+
+
+@dataclass
+class PackedContext:
+    """Packed prompt context and what went into it"""
+
+    text: str
+    tokens: int
+    budget: int
+    included: List[int] = field(default_factory=list)
+    truncated: Optional[int] = None
+    duplicates: List[int] = field(default_factory=list)
+    over_budget: List[int] = field(default_factory=list)
+
+    def summary(self, total: Optional[int] = None) -> str:
+        """One-line usage report, e.g. 'context: 2,950/3,000 tokens from 5 of 8 blocks (1 duplicate)'"""
+        total = total if total is not None else len(self.included) + len(self.duplicates) + len(self.over_budget)
+        notes = []
+        if self.truncated is not None:
+            notes.append("last one truncated")
+        if self.duplicates:
+            notes.append(f"{len(self.duplicates)} duplicate")
+        extra = f" ({', '.join(notes)})" if notes else ""
+        return f"context: {self.tokens:,}/{self.budget:,} tokens from {len(self.included)} of {total} blocks{extra}"
+
+
+def pack_context(
+    blocks: Sequence[str],
+    scores: Optional[Sequence[float]] = None,
+    budget: int = 3000,
+    model: Optional[str] = None,
+    label: str = "[DOC {n}]\n",
+    separator: str = "\n\n",
+    dedupe_threshold: float = 0.8,
+    min_truncated_tokens: int = 64,
+    dedupe_text: Optional[Callable[[int], str]] = None,
+) -> PackedContext:
+    """
+    Greedily pack blocks into a token budget, best score first
+
+    Args:
+        blocks: Rendered blocks (without label)
+        scores: Score per block (fused retrieval score); None keeps the given order
+        budget: Maximum prompt tokens for the whole context
+        model: Chat model name, used to pick the tokenizer
+        label: Prefix of each packed block, formatted with its 1-based position n
+        separator: Text between blocks
+        dedupe_threshold: Skip a block when this share of its word 5-grams is already packed
+        min_truncated_tokens: Smallest remaining budget worth filling with a truncated block
+        dedupe_text: Block index -> text compared for duplicates (default: the block itself)
+
+    Returns:
+        PackedContext (included holds block indices in packed order)
+    """
+    encoding = encoding_for(model)
+    order = list(range(len(blocks)))
+    if scores is not None:
+        order.sort(key=lambda i: scores[i], reverse=True)
+
+    sep_tokens = len(encoding.encode_ordinary(separator))
+    packed = PackedContext(text="", tokens=0, budget=budget)
+    parts: List[str] = []
+    seen: Set[int] = set()
+
+    for i in order:
+        grams = shingles(dedupe_text(i) if dedupe_text else blocks[i])
+        if parts and containment(grams, seen) >= dedupe_threshold:
+            packed.duplicates.append(i)
+            continue
+
+        prefix = label.format(n=len(parts) + 1)
+        piece = prefix + blocks[i]
+        cost = len(encoding.encode_ordinary(piece)) + (sep_tokens if parts else 0)
+        remaining = budget - packed.tokens
+
+        if cost > remaining:
+            room = remaining - (sep_tokens if parts else 0) - len(encoding.encode_ordinary(prefix))
+            if packed.truncated is not None or room < min_truncated_tokens:
+                packed.over_budget.append(i)
+                continue
+            # Cut at a token boundary so the block still fits exactly
+            piece = prefix + encoding.decode(encoding.encode_ordinary(blocks[i])[:room])
+            cost = len(encoding.encode_ordinary(piece)) + (sep_tokens if parts else 0)
+            if cost > remaining:
+                packed.over_budget.append(i)
+                continue
+            packed.truncated = i
+
+        parts.append(piece)
+        packed.included.append(i)
+        packed.tokens += cost
+        seen |= grams
+
+    packed.text = separator.join(parts)
+    return packed
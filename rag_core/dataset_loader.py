@@ -0,0 +1,125 @@
+"""
+Single-pass JSON dataset loading with an optional streaming mode
+
+load_json reads the file once as bytes and parses it with orjson when it is
+installed (falling back to the standard json module), recording file size,
+parser and load time. iter_json_entries streams the items of a root list or
+of {"entries": [...]} with ijson, one entry at a time, so a large procedure
+library never holds the raw text and the full parse tree at the same time.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # optional: faster parser
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional: only needed for streaming
+    ijson = None
+
+PathLike = Union[str, Path]
+# Files at least this large are streamed by loaders that support it
+STREAM_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class LoadStats:
+    """How a dataset file was loaded"""
+
+    path: str
+    size_bytes: int
+    parser: str = ""
+    seconds: float = 0.0
+    entries: Optional[int] = None
+
+    def summary(self) -> str:
+        """One-line report, e.g. 'data.json: 12.4 MB parsed with orjson in 0.08s (350 entries)'"""
+        count = f" ({self.entries} entries)" if self.entries is not None else ""
+        return (
+            f"{Path(self.path).name}: {self.size_bytes / 1e6:.1f} MB parsed with {self.parser} "
+            f"in {self.seconds:.2f}s{count}"
+        )
+
+
+def parse_json(data: bytes) -> Any:
+    """Parse JSON bytes with orjson if available, else the standard library"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def load_json(path: PathLike) -> Tuple[Any, LoadStats]:
+    """
+    Read and parse a JSON file in one pass
+
+    Args:
+        path: JSON file
+
+    Returns:
+        (parsed value, load stats)
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file is not valid JSON (json.JSONDecodeError and orjson.JSONDecodeError both are)
+    """
+    start = time.perf_counter()
+    data = Path(path).read_bytes()
+    value = parse_json(data)
+    stats = LoadStats(
+        path=str(path),
+        size_bytes=len(data),
+        parser="orjson" if orjson is not None else "json",
+        seconds=time.perf_counter() - start,
+    )
+    return value, stats
+
+
+def can_stream() -> bool:
+    """True if ijson is installed"""
+    return ijson is not None
+
+
+def iter_json_entries(
+    path: PathLike,
+    key: str = "entries",
+    stats: Optional[LoadStats] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the items of a root list, or of a root object's `key` list, one at a time
+
+    Args:
+        path: JSON file
+        key: List field of a root object
+        stats: Filled in once the stream is exhausted (entry count; time includes the consumer's work)
+
+    Yields:
+        Entries in file order
+
+    Raises:
+        ImportError: If ijson is not installed
+    """
+    if ijson is None:
+        raise ImportError("Streaming dataset loading requires ijson (pip install ijson)")
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        prefix = "item" if first == b"[" else f"{key}.item"
+
+        count = 0
+        for entry in ijson.items(f, prefix, use_float=True):
+            count += 1
+            yield entry
+
+    if stats is not None:
+        stats.parser = f"ijson ({ijson.backend})"
+        stats.entries = count
+        stats.seconds = time.perf_counter() - start
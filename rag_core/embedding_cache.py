@@ -0,0 +1,245 @@
+"""
+Disk-backed embedding cache that wraps any LangChain embeddings object
+
+Vectors live in a float32 memory-mapped file, one row per cached text; a
+SQLite table maps (model, normalized text hash) keys to rows and tracks last
+use for LRU eviction. Document and query embeddings are cached separately, so
+repeated questions and re-uploaded documents skip the embedding round-trip.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[1] / ".embedding_cache"
+WHITESPACE = re.compile(r"\s+")
+SQLITE_MAX_VARS = 500
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC and collapsed whitespace, so cosmetic differences share a key"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def model_namespace(embeddings: Embeddings) -> str:
+    """Model identifier of a LangChain embeddings object (plus output dimensions if set)"""
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+    dims = getattr(embeddings, "dimensions", None)
+    return f"{name}-{dims}" if dims else str(name)
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped float32 vectors with a SQLite key index and LRU eviction
+
+    Rows are allocated inside a SQLite write transaction from the shared
+    next_row counter, so several stores (threads, reruns or processes) on the
+    same directory never hand out the same row. Use EmbeddingStore.shared to
+    reuse one open store per directory within a process.
+    """
+
+    _registry: Dict[Path, "EmbeddingStore"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path: Path, max_entries: int = 200_000):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        # Autocommit; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(
+            str(self.path / "index.sqlite"), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        self.dim: Optional[int] = self._meta("dim")
+        self._vectors: Optional[np.memmap] = None
+        if self.dim:
+            self._open_vectors(max(self._meta("capacity", 0), self._meta("next_row", 0)))
+
+    @classmethod
+    def shared(cls, path: Path, max_entries: int = 200_000) -> "EmbeddingStore":
+        """The process-wide store for a directory, opened on first use"""
+        key = Path(path).resolve()
+        with cls._registry_lock:
+            store = cls._registry.get(key)
+            if store is None:
+                store = cls._registry[key] = cls(key, max_entries=max_entries)
+            return store
+
+    def _meta(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _open_vectors(self, capacity: int) -> None:
+        """(Re)map the vector file with room for `capacity` rows, growing it if needed"""
+        capacity = max(capacity, 1024)
+        file = self.path / "vectors.f32"
+        needed = capacity * self.dim * 4
+        with open(file, "ab") as f:
+            if f.tell() < needed:
+                f.truncate(needed)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_rows(self, rows: int) -> None:
+        """Map at least `rows` rows, following growth by other stores on the same directory"""
+        if self._vectors is None or rows > self._vectors.shape[0]:
+            capacity = self._vectors.shape[0] if self._vectors is not None else 0
+            while capacity < rows:
+                capacity = max(capacity * 2, 1024)
+            self._open_vectors(max(capacity, self._meta("capacity", 0)))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def get(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for whichever keys are present; marks them as recently used"""
+        if not keys:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            if self.dim is None:
+                # Another store on this directory may have written the first vectors
+                self.dim = self._meta("dim")
+                if self.dim is None:
+                    return {}
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), SQLITE_MAX_VARS):
+                chunk = unique[start:start + SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT key, row FROM vectors WHERE key IN ({marks})", chunk).fetchall()
+                if rows:
+                    self._ensure_rows(max(r for _, r in rows) + 1)
+                for key, row in rows:
+                    found[key] = np.array(self._vectors[row])
+            if found:
+                # One transaction for the whole touch; in autocommit mode each UPDATE would commit
+                now = time.time()
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany("UPDATE vectors SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+        return found
+
+    def put(self, items: Dict[str, np.ndarray]) -> None:
+        """Store vectors under their keys, evicting least-recently-used entries past max_entries"""
+        if not items:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self.dim = self._meta("dim")
+                if self.dim is None:
+                    self.dim = len(next(iter(items.values())))
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+
+                # Read under the write lock: no other store can allocate until we commit
+                next_row = self._meta("next_row", 0)
+                now = time.time()
+                placed = []
+                for key, vector in items.items():
+                    existing = self._db.execute("SELECT row FROM vectors WHERE key = ?", (key,)).fetchone()
+                    if existing:
+                        row = existing[0]
+                    else:
+                        free = self._db.execute("SELECT row FROM free_rows LIMIT 1").fetchone()
+                        if free:
+                            row = free[0]
+                            self._db.execute("DELETE FROM free_rows WHERE row = ?", (row,))
+                        else:
+                            row = next_row
+                            next_row += 1
+                    placed.append((key, row, vector))
+
+                self._ensure_rows(next_row)
+                for key, row, vector in placed:
+                    self._vectors[row] = vector
+                # Vectors reach the file before their keys become visible to readers
+                self._vectors.flush()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)", [(k, r, now) for k, r, _ in placed]
+                )
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next_row', ?)", (next_row,))
+                capacity = max(self._vectors.shape[0], self._meta("capacity", 0))
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('capacity', ?)", (capacity,))
+                self._evict()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        overflow = len(self) - self.max_entries
+        if overflow <= 0:
+            return
+        victims = self._db.execute(
+            "SELECT key, row FROM vectors ORDER BY last_used LIMIT ?", (overflow,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM vectors WHERE key = ?", [(k,) for k, _ in victims])
+        self._db.executemany("INSERT OR IGNORE INTO free_rows VALUES (?)", [(r,) for _, r in victims])
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embeddings wrapper that serves repeated texts from the disk cache
+
+    Args:
+        underlying: Any LangChain embeddings object (e.g. OpenAIEmbeddings())
+        cache_dir: Root folder for cache stores, one sub-folder per model
+        max_entries: LRU capacity per model store
+    """
+
+    def __init__(self, underlying: Embeddings, cache_dir: Path = DEFAULT_CACHE_DIR, max_entries: int = 200_000):
+        self.underlying = underlying
+        self.namespace = model_namespace(underlying)
+        safe_name = re.sub(r"[^\w.-]", "_", self.namespace)
+        self.store = EmbeddingStore.shared(Path(cache_dir) / safe_name, max_entries=max_entries)
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{kind}:{self.namespace}:{digest}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("doc", t) for t in texts]
+        cached = self.store.get(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = {key: np.asarray(v, dtype=np.float32) for key, v in zip(missing, vectors)}
+            self.store.put(fresh)
+            cached.update(fresh)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        cached = self.store.get([key])
+        if key in cached:
+            return cached[key].tolist()
+        vector = self.underlying.embed_query(text)
+        self.store.put({key: np.asarray(vector, dtype=np.float32)})
+        return list(vector)
@@ -0,0 +1,299 @@
+"""
+Batched, concurrent embedding stage with rate-limit-aware scheduling
+
+Chunks are packed into batches under a token budget (counted with tiktoken)
+as they arrive, embedded on a bounded thread pool, and handed back as soon as
+each batch finishes so they can be streamed into a vector store while the rest
+of the document is still being parsed and embedded. Only a bounded number of
+batches is in flight at once, so a chunk generator is consumed lazily. HTTP
+429s shrink the number of in-flight requests (additive increase /
+multiplicative decrease) and are retried with exponential backoff, honouring
+Retry-After when the server sends one.
+
+Works with any LangChain embeddings object. The rate-limit tests run a small
+requests-based client against a local fake embeddings endpoint
+(tests/fake_embedding_server.py) that answers 429 past its capacity.
+"""
+
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Sized, Tuple
+
+import tiktoken
+from langchain.schema import Document
+from langchain.vectorstores import FAISS, Chroma
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_ENCODING = "cl100k_base"  # tokenizer of text-embedding-3-* and ada-002
+
+
+def count_tokens(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """Token count of each text for the given embedding model"""
+    try:
+        encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def iter_token_batches(
+    texts: Iterable[str],
+    max_tokens: int = 16_000,
+    max_items: int = 512,
+    model: Optional[str] = None,
+) -> Iterator[Tuple[List[int], List[str]]]:
+    """
+    Greedily pack texts into batches under a token and item budget, as they arrive
+
+    Args:
+        texts: Texts to embed; a generator is read `max_items` texts at a time
+        max_tokens: Token budget per request
+        max_items: Maximum number of inputs per request
+        model: Embedding model name, used to pick the tokenizer
+
+    Yields:
+        (indices, texts) per batch, in input order; an oversized text gets its own batch
+    """
+    source = iter(texts)
+    indices: List[int] = []
+    batch: List[str] = []
+    batch_tokens = 0
+    position = 0
+    while True:
+        group = list(islice(source, max_items))
+        if not group:
+            break
+        for text, n_tokens in zip(group, count_tokens(group, model)):
+            if batch and (batch_tokens + n_tokens > max_tokens or len(batch) >= max_items):
+                yield indices, batch
+                indices, batch, batch_tokens = [], [], 0
+            indices.append(position)
+            batch.append(text)
+            batch_tokens += n_tokens
+            position += 1
+    if batch:
+        yield indices, batch
+
+
+def token_batches(
+    texts: Sequence[str],
+    max_tokens: int = 16_000,
+    max_items: int = 512,
+    model: Optional[str] = None,
+) -> List[List[int]]:
+    """
+    Greedily pack text indices into batches under a token and item budget
+
+    Args:
+        texts: Texts to embed
+        max_tokens: Token budget per request
+        max_items: Maximum number of inputs per request
+        model: Embedding model name, used to pick the tokenizer
+
+    Returns:
+        List of index batches, in input order; an oversized text gets its own batch
+    """
+    return [indices for indices, _ in iter_token_batches(texts, max_tokens, max_items, model)]
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """True for OpenAI RateLimitError or any HTTP 429 response"""
+    if type(exc).__name__ == "RateLimitError":
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Retry-After header of a 429 response, if the server sent one"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrency:
+    """Limits in-flight requests; halves the limit on 429, grows it back by one per clean round"""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.limit = max_in_flight
+        self.lowest = max_in_flight  # smallest limit reached, for reporting
+        self.rate_limited = 0
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self, rate_limited: bool = False) -> None:
+        with self._cond:
+            self._active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self.lowest = min(self.lowest, self.limit)
+                self.rate_limited += 1
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self.limit < self.max_in_flight and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+def _embed_with_backoff(
+    embeddings: Embeddings,
+    texts: List[str],
+    limiter: AdaptiveConcurrency,
+    max_retries: int,
+    base_delay: float,
+) -> List[List[float]]:
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            vectors = embeddings.embed_documents(texts)
+        except Exception as exc:
+            limited = is_rate_limit_error(exc)
+            limiter.release(rate_limited=limited)
+            if not limited or attempt >= max_retries:
+                raise
+            delay = retry_after_seconds(exc) or base_delay * (2 ** attempt) * (1 + random.random())
+            time.sleep(delay)
+            attempt += 1
+            continue
+        limiter.release()
+        return vectors
+
+
+def iter_embedded_batches(
+    embeddings: Embeddings,
+    texts: Iterable[str],
+    max_workers: int = 4,
+    max_tokens: int = 16_000,
+    max_items: int = 512,
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    executor: Optional[Executor] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[Tuple[List[int], List[List[float]]]]:
+    """
+    Embed texts concurrently, yielding (indices, vectors) per finished batch
+
+    `texts` may be a generator: batches are packed as texts arrive and at most
+    `max_pending` batches (default 2 * max_workers) are submitted but not yet
+    yielded, so a document is embedded while it is still being read. Batches
+    complete in any order; `indices` are positions in `texts`. Remaining
+    batches are cancelled if one fails for a non-rate-limit reason.
+
+    Pass a `limiter` (and an `executor`) to carry the learned concurrency
+    limit and the worker threads across calls.
+    """
+    model = getattr(embeddings, "model", None)
+    limiter = limiter or AdaptiveConcurrency(max_workers)
+    max_pending = max_pending or 2 * max_workers
+    pool = executor or ThreadPoolExecutor(max_workers=max_workers)
+    in_flight: Dict[Future, List[int]] = {}
+
+    def finished(block: bool) -> List[Future]:
+        if block:
+            return list(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        return [future for future in in_flight if future.done()]
+
+    try:
+        for indices, batch in iter_token_batches(texts, max_tokens=max_tokens, max_items=max_items, model=model):
+            in_flight[pool.submit(_embed_with_backoff, embeddings, batch, limiter, max_retries, base_delay)] = indices
+            for future in finished(block=len(in_flight) >= max_pending):
+                yield in_flight.pop(future), future.result()
+        while in_flight:
+            for future in finished(block=True):
+                yield in_flight.pop(future), future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(wait=True)
+
+
+def _tracked_texts(documents: Iterable[Document], pending: Dict[int, Document]) -> Iterator[str]:
+    """Page contents of `documents`, remembering each document by position until it is embedded"""
+    for i, doc in enumerate(documents):
+        pending[i] = doc
+        yield doc.page_content
+
+
+def stream_into_faiss(
+    documents: Iterable[Document],
+    embeddings: Embeddings,
+    vectorstore: Optional[FAISS] = None,
+    **batch_kwargs,
+) -> Iterator[Tuple[FAISS, int, Optional[int]]]:
+    """
+    Build a FAISS store batch by batch (or extend `vectorstore` if given)
+
+    `documents` may be a generator (e.g. chunks of pages still being parsed);
+    it is read only as fast as batches can be put in flight.
+
+    Yields:
+        (vectorstore, embedded_so_far, total) after each batch is added; total
+        is None for a generator. The store is queryable from the first yield on.
+    """
+    total = len(documents) if isinstance(documents, Sized) else None
+    pending: Dict[int, Document] = {}
+    done = 0
+    for indices, vectors in iter_embedded_batches(embeddings, _tracked_texts(documents, pending), **batch_kwargs):
+        docs = [pending.pop(i) for i in indices]
+        pairs = [(d.page_content, v) for d, v in zip(docs, vectors)]
+        metadatas = [d.metadata for d in docs]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas)
+        else:
+            vectorstore.add_embeddings(pairs, metadatas=metadatas)
+        done += len(indices)
+        yield vectorstore, done, total
+
+
+def stream_into_chroma(
+    documents: Iterable[Document],
+    embeddings: Embeddings,
+    persist_directory: str,
+    collection_name: str = "langchain",
+    **batch_kwargs,
+) -> Iterator[Tuple[Chroma, int, Optional[int]]]:
+    """
+    Add documents to a persisted Chroma collection batch by batch
+
+    Yields:
+        (vectorstore, embedded_so_far, total) after each batch is written; total is None for a generator
+    """
+    vectorstore = Chroma(
+        persist_directory=persist_directory,
+        collection_name=collection_name,
+        embedding_function=embeddings,
+    )
+    total = len(documents) if isinstance(documents, Sized) else None
+    pending: Dict[int, Document] = {}
+    done = 0
+    for indices, vectors in iter_embedded_batches(embeddings, _tracked_texts(documents, pending), **batch_kwargs):
+        docs = [pending.pop(i) for i in indices]
+        metadatas = [d.metadata for d in docs]
+        vectorstore._collection.add(
+            ids=[str(uuid.uuid4()) for _ in indices],
+            embeddings=vectors,
+            documents=[d.page_content for d in docs],
+            metadatas=metadatas if any(metadatas) else None,
+        )
+        done += len(indices)
+        yield vectorstore, done, total
+    vectorstore.persist()
@@ -0,0 +1,203 @@
+"""
+On-disk FAISS indexes, memory-mapped on load, with a SQLite docstore
+
+Each index is a directory holding `index.faiss` (read back with faiss
+IO_FLAG_MMAP_IFC, so the vectors stay in the page cache and are shared by every
+process that opens the same file) and `docstore.sqlite` (chunk text + JSON
+metadata keyed by docstore id, with the FAISS row position) instead of
+LangChain's pickled InMemoryDocstore, which loads the whole corpus into each
+process and breaks across pydantic versions.
+
+Memory-mapped indexes are read-only: adding vectors to one aborts the process,
+so build or extend in memory and save again instead.
+
+Two-stage stores (quantized_index) save their first-stage index as index.faiss
+and the float32 rescoring vectors as vectors.f32, which is memory-mapped on load.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.embeddings import Embeddings
+
+from rag_core.ann_index import enable_reconstruct
+from rag_core.quantized_index import RescoringIndex
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parents[1] / ".faiss_indexes"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+FULL_VECTORS_FILE = "vectors.f32"
+RESCORING_FILE = "rescoring.json"
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """LangChain docstore backed by one SQLite file; rows are read on demand"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "id TEXT PRIMARY KEY, position INTEGER UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def add(self, texts: Dict[str, Document], positions: Optional[Dict[str, int]] = None) -> None:
+        positions = positions or {}
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)",
+                [
+                    (doc_id, positions.get(doc_id), doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                    for doc_id, doc in texts.items()
+                ],
+            )
+            self._db.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._db.execute("SELECT text, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM docs WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def index_to_docstore_id(self) -> Dict[int, str]:
+        """FAISS row position -> docstore id, as LangChain's FAISS wrapper expects"""
+        with self._lock:
+            rows = self._db.execute("SELECT position, id FROM docs WHERE position IS NOT NULL").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def save_faiss(vectorstore: FAISS, directory: Union[str, Path]) -> Path:
+    """
+    Write a LangChain FAISS store as index.faiss + docstore.sqlite
+
+    The files are written to a sibling temp directory that is renamed into
+    place, so readers never see a half-written index.
+
+    Returns:
+        The index directory
+    """
+    directory = Path(directory)
+    tmp = directory.with_name(f"{directory.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    index = vectorstore.index
+    if isinstance(index, RescoringIndex):
+        np.ascontiguousarray(index.full, dtype=np.float32).tofile(str(tmp / FULL_VECTORS_FILE))
+        (tmp / RESCORING_FILE).write_text(json.dumps({
+            "oversample": index.oversample, "prefix_dims": index.prefix_dims, "metric_type": index.metric_type,
+        }))
+        index = index.coarse
+    faiss.write_index(index, str(tmp / INDEX_FILE))
+    docstore = SQLiteDocstore(tmp / DOCSTORE_FILE)
+    positions = {doc_id: position for position, doc_id in vectorstore.index_to_docstore_id.items()}
+    docstore.add({doc_id: vectorstore.docstore.search(doc_id) for doc_id in positions}, positions=positions)
+    docstore.close()
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def load_index(directory: Union[str, Path], mmap: bool = True) -> Union[faiss.Index, RescoringIndex]:
+    """
+    The serving index of a directory written by save_faiss
+
+    Args:
+        directory: Index directory
+        mmap: Memory-map the vectors (read-only) instead of reading them into RAM
+
+    Returns:
+        The faiss index, or a RescoringIndex for two-stage stores
+    """
+    directory = Path(directory)
+    index = enable_reconstruct(faiss.read_index(str(directory / INDEX_FILE), MMAP_FLAGS if mmap else 0))
+    if (directory / FULL_VECTORS_FILE).exists():
+        settings = json.loads((directory / RESCORING_FILE).read_text())
+        full = np.memmap(directory / FULL_VECTORS_FILE, dtype=np.float32, mode="r").reshape(index.ntotal, -1)
+        if not mmap:
+            full = np.array(full)
+        index = RescoringIndex(index, full, oversample=settings["oversample"],
+                               prefix_dims=settings.get("prefix_dims"), metric_type=settings.get("metric_type"))
+    return index
+
+
+def load_faiss(directory: Union[str, Path], embeddings: Embeddings, mmap: bool = True) -> FAISS:
+    """
+    Open an index written by save_faiss
+
+    Args:
+        directory: Index directory
+        embeddings: Embeddings used for queries (must match the indexed model)
+        mmap: Memory-map the vectors (read-only) instead of reading them into RAM
+
+    Returns:
+        LangChain FAISS store using the SQLite docstore
+    """
+    directory = Path(directory)
+    index = load_index(directory, mmap=mmap)
+    docstore = SQLiteDocstore(directory / DOCSTORE_FILE)
+    return FAISS(embeddings, index, docstore, docstore.index_to_docstore_id())
+
+
+class FaissDiskCache:
+    """
+    One saved FAISS index per document key, evicting least recently used directories
+
+    Args:
+        root: Folder holding one sub-folder per document key
+        max_indexes: Indexes kept on disk
+    """
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_INDEX_DIR, max_indexes: int = 32):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_indexes = max_indexes
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def load(self, key: str, embeddings: Embeddings) -> Optional[FAISS]:
+        """Memory-mapped store for `key`, or None if it was never saved (or was evicted)"""
+        directory = self.path(key)
+        if not (directory / INDEX_FILE).exists():
+            return None
+        now = time.time()
+        os.utime(directory, (now, now))  # directory mtime doubles as the LRU timestamp
+        return load_faiss(directory, embeddings)
+
+    def save(self, key: str, vectorstore: FAISS) -> FAISS:
+        """Persist `vectorstore` under `key` and return it re-opened memory-mapped"""
+        save_faiss(vectorstore, self.path(key))
+        self._evict()
+        return load_faiss(self.path(key), vectorstore.embeddings)
+
+    def _evict(self) -> None:
+        directories = [d for d in self.root.iterdir() if d.is_dir() and (d / INDEX_FILE).exists()]
+        directories.sort(key=lambda d: d.stat().st_mtime, reverse=True)
+        # Unlinking is safe on POSIX even while another process still has the files mapped
+        for stale in directories[self.max_indexes:]:
+            shutil.rmtree(stale, ignore_errors=True)
@@ -0,0 +1,119 @@
+"""
+Hybrid retrieval: run several retrievers concurrently and fuse their rankings
+
+Every retriever returns hits in the shared {"text", "meta", "score"} shape
+(BM25Index.search, mmr.mmr_search). Hits from different sources are matched
+by a key (procedure_id by default) and fused with one of:
+- rrf: reciprocal rank fusion, sum of weight / (rrf_k + rank); ignores raw scales
+- minmax: weighted sum of scores scaled to [0, 1] per source
+- zscore: weighted sum of standardized scores per source
+Each fused hit carries a per-source breakdown (rank, raw and normalized score).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid")
+
+
+def procedure_key(hit: Dict[str, Any]) -> str:
+    """Default fusion key: the procedure a hit belongs to"""
+    meta = hit.get("meta") or {}
+    return meta.get("procedure_id") or meta.get("procedure_name") or hit.get("id") or hit["text"]
+
+
+def normalize_scores(scores: np.ndarray, method: str) -> np.ndarray:
+    """Per-source score normalization for minmax / zscore fusion"""
+    if not len(scores):
+        return scores
+    if method == "minmax":
+        span = scores.max() - scores.min()
+        return (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    raise ValueError(f"Unknown normalization {method!r}")
+
+
+def fuse(
+    results: Dict[str, List[Dict[str, Any]]],
+    method: str = "rrf",
+    weights: Optional[Dict[str, float]] = None,
+    top_k: int = 8,
+    rrf_k: int = 60,
+    key: Callable[[Dict[str, Any]], str] = procedure_key,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked hit lists from several sources
+
+    Args:
+        results: Source name -> hits in rank order
+        method: One of FUSION_METHODS
+        weights: Source name -> weight (default 1.0 each)
+        top_k: Fused hits to return
+        rrf_k: RRF damping constant
+        key: Identity of a hit across sources; the best-ranked hit per key and source counts
+
+    Returns:
+        Hits sorted by fused score: {"text", "meta", "score", "sources": {name: {"rank", "score", "norm"}}}
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}; expected one of {FUSION_METHODS}")
+    weights = weights or {}
+
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, hits in results.items():
+        weight = weights.get(source, 1.0)
+        seen = set()
+        ranked = []
+        for hit in hits:
+            k = key(hit)
+            if k not in seen:
+                seen.add(k)
+                ranked.append((k, hit))
+        if not ranked:
+            continue
+
+        raw = np.array([hit.get("score", 0.0) for _, hit in ranked], dtype=np.float64)
+        if method == "rrf":
+            norm = 1.0 / (rrf_k + np.arange(1, len(ranked) + 1))
+        else:
+            norm = normalize_scores(raw, method)
+
+        for rank, ((k, hit), raw_score, norm_score) in enumerate(zip(ranked, raw, norm), start=1):
+            entry = fused.setdefault(k, {"text": hit.get("text"), "meta": hit.get("meta"), "score": 0.0, "sources": {}})
+            if entry["text"] is None:
+                entry["text"] = hit.get("text")
+            entry["score"] += weight * float(norm_score)
+            entry["sources"][source] = {"rank": rank, "score": float(raw_score), "norm": float(norm_score)}
+
+    out = sorted(fused.values(), key=lambda h: h["score"], reverse=True)
+    return out[:top_k]
+
+
+def hybrid_retrieve(
+    retrievers: Dict[str, Callable[[], List[Dict[str, Any]]]],
+    method: str = "rrf",
+    weights: Optional[Dict[str, float]] = None,
+    top_k: int = 8,
+    **fuse_kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Run retrievers concurrently on a shared thread pool, then fuse their hits
+
+    Args:
+        retrievers: Source name -> zero-argument callable returning ranked hits
+        method, weights, top_k, **fuse_kwargs: See fuse
+
+    Returns:
+        Fused hits (see fuse)
+    """
+    futures = {name: _POOL.submit(run) for name, run in retrievers.items()}
+    results = {name: future.result() for name, future in futures.items()}
+    return fuse(results, method=method, weights=weights, top_k=top_k, **fuse_kwargs)
@@ -0,0 +1,84 @@
+"""
+Document-keyed cache of built RAG indexes, shared across Streamlit sessions
+
+An upload is identified by SHA-256 of its bytes plus the chunking config, so
+the same standard uploaded by any user maps to the same key and a different
+file (or a different splitter setting) never reuses a stale index. The
+registry itself is created once per server process with st.cache_resource and
+evicts whole indexes least-recently-used first.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def document_key(data: bytes, config: Dict[str, Any]) -> str:
+    """SHA-256 over the document bytes and its (sorted, JSON-encoded) processing config"""
+    digest = hashlib.sha256(data)
+    digest.update(b"\0")
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IndexRegistry:
+    """
+    Thread-safe LRU map of document key -> built index or chain
+
+    Concurrent requests for the same missing key build it once; the other
+    callers wait for that build instead of embedding the document again.
+
+    Args:
+        max_entries: Number of indexes kept before the least recently used is dropped
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get_or_build(self, key: str, build: Callable[[], Any]) -> Any:
+        """Cached value for `key`, calling `build()` at most once across threads on a miss"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            try:
+                value = build()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return value
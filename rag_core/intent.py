@@ -0,0 +1,348 @@
+"""
+Local intent classification with LLM escalation
+
+Three stages, cheapest first:
+- rules: a query that is only clause numbers ("4.2.4", "clause 7.5.1?") is a
+  CLAUSE_LOOKUP; explicit procedure phrasing ("full procedure", "sop") is a
+  PROCEDURE_REQUEST
+- model: TF-IDF (word unigrams + bigrams, clause numbers folded to one token)
+  and multinomial logistic regression in NumPy/SciPy, trained from logged
+  queries; a prediction is accepted when its probability clears a threshold
+- LLM: only queries the first two stages are unsure about
+Every decision is appended to a JSONL log. The model only ever sees queries
+the rules did not decide, so it is trained on LLM labels plus the
+hand-labelled examples in intent_examples.jsonl (counter-examples such as
+clause numbers inside a content question), not on rule labels it would only
+learn to copy. LLM-labelled queries are also appended to a separate training
+file, so training never scans the ever-growing decision log: training_key
+(file sizes and mtimes, one stat call each) tells a caching app when to
+reload, and a saved model is retrained when the fingerprint of its training
+data changes.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from rag_core.bm25 import tokenize
+
+INTENT_LABELS = ("PROCEDURE_REQUEST", "CLAUSE_LOOKUP", "GENERAL_QMS_QUESTION")
+DEFAULT_INTENT = "GENERAL_QMS_QUESTION"
+SEED_PATH = Path(__file__).with_name("intent_examples.jsonl")
+
+CLAUSE_NUMBER = re.compile(r"\b[4-7]\.\d+(?:\.\d+)*\b")
+# Query that is nothing but clause numbers and filler ("ISO 13485 clause 4.2.4 and 4.2.5?")
+CLAUSE_ONLY = re.compile(
+    r"^\s*(?:(?:iso|13485(?::2016)?|clause|clauses|section|sections|sub-?clause|§|and|or|,|&)\s*)*"
+    r"[4-7]\.\d+(?:\.\d+)*"
+    r"(?:\s*(?:,|&|and|or|to|-)?\s*[4-7]\.\d+(?:\.\d+)*)*\s*[?.!]?\s*$",
+    re.IGNORECASE,
+)
+# Phrases from wants_full in semantic_chunk/procedure_1/app.py, minus the bare
+# "process" (it also matches general questions about a process); "sop" is
+# matched as a whole word below
+PROCEDURE_TRIGGERS = (
+    "give me the procedure", "full procedure", "procedure of", "procedure for",
+    "template", "how i can do procedure", "how to do procedure", "all sections",
+)
+SOP_WORD = re.compile(r"\bsops?\b")
+
+
+def rule_intent(query: str) -> Optional[str]:
+    """Intent decided by rules alone, or None if the rules do not apply"""
+    if CLAUSE_ONLY.match(query):
+        return "CLAUSE_LOOKUP"
+    ql = query.lower()
+    if SOP_WORD.search(ql) or any(t in ql for t in PROCEDURE_TRIGGERS):
+        return "PROCEDURE_REQUEST"
+    return None
+
+
+def query_terms(query: str) -> List[str]:
+    """Unigrams and bigrams of a query, with clause numbers folded to one token"""
+    words = tokenize(CLAUSE_NUMBER.sub(" clauseref ", query))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfLogistic:
+    """TF-IDF features + multinomial logistic regression, trained by full-batch gradient descent"""
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        idf: np.ndarray,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        labels: Sequence[str],
+    ):
+        self.vocab = vocab
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.labels = list(labels)
+
+    def features(self, queries: Sequence[str]) -> sparse.csr_matrix:
+        """L2-normalized sublinear TF-IDF rows; unknown terms are ignored"""
+        rows, cols, vals = [], [], []
+        for i, q in enumerate(queries):
+            counts = Counter(self.vocab[t] for t in query_terms(q) if t in self.vocab)
+            for col, c in counts.items():
+                rows.append(i)
+                cols.append(col)
+                vals.append((1.0 + np.log(c)) * self.idf[col])
+        x = sparse.csr_matrix((vals, (rows, cols)), shape=(len(queries), len(self.vocab)), dtype=np.float64)
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        return sparse.diags(1.0 / np.where(norms == 0, 1.0, norms)) @ x
+
+    def predict_proba(self, queries: Sequence[str]) -> np.ndarray:
+        """Class probabilities, shape (len(queries), len(labels))"""
+        # Row-gather instead of building a sparse matrix: a query has a handful of
+        # terms, and this keeps single-query prediction in the tens of microseconds
+        logits = np.tile(self.bias, (len(queries), 1))
+        for i, q in enumerate(queries):
+            counts = Counter(self.vocab[t] for t in query_terms(q) if t in self.vocab)
+            if not counts:
+                continue
+            cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            vals = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * self.idf[cols]
+            logits[i] += (vals / np.linalg.norm(vals)) @ self.weights[cols]
+        return _softmax(logits)
+
+    @classmethod
+    def fit(
+        cls,
+        queries: Sequence[str],
+        labels: Sequence[str],
+        min_df: int = 1,
+        l2: float = 1e-3,
+        lr: float = 2.0,
+        epochs: int = 300,
+    ) -> "TfidfLogistic":
+        """
+        Train on labelled queries
+
+        Args:
+            queries: Query texts
+            labels: Intent label per query
+            min_df: Minimum number of queries a term must appear in
+            l2: L2 penalty on the weights
+            lr: Gradient descent step size
+            epochs: Full-batch iterations
+
+        Returns:
+            Trained model
+
+        Raises:
+            ValueError: If fewer than two distinct labels are given
+        """
+        classes = sorted(set(labels))
+        if len(classes) < 2:
+            raise ValueError("Need examples of at least two intents to train")
+
+        df = Counter(t for q in queries for t in set(query_terms(q)))
+        vocab = {t: i for i, t in enumerate(sorted(t for t, n in df.items() if n >= min_df))}
+        n = len(queries)
+        idf = np.array([np.log((1 + n) / (1 + df[t])) + 1.0 for t in vocab], dtype=np.float64)
+
+        model = cls(vocab, idf, np.zeros((len(vocab), len(classes))), np.zeros(len(classes)), classes)
+        x = model.features(queries)
+        y = np.zeros((n, len(classes)))
+        y[np.arange(n), [classes.index(label) for label in labels]] = 1.0
+
+        for _ in range(epochs):
+            grad = (_softmax(x @ model.weights + model.bias) - y) / n
+            model.weights -= lr * (x.T @ grad + l2 * model.weights)
+            model.bias -= lr * grad.sum(axis=0)
+        return model
+
+    def save(self, path: str, fingerprint: str = "") -> None:
+        """Write the model (and the fingerprint of its training data) to a single .npz file, atomically"""
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            terms=np.array(terms, dtype=str),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels, dtype=str),
+            fingerprint=np.array(fingerprint),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfLogistic":
+        """Read a model written by save"""
+        with np.load(path) as data:
+            vocab = {t: i for i, t in enumerate(data["terms"].tolist())}
+            return cls(vocab, data["idf"], data["weights"], data["bias"], data["labels"].tolist())
+
+    @staticmethod
+    def saved_fingerprint(path: str) -> str:
+        """Training-data fingerprint stored with a saved model ('' if none)"""
+        with np.load(path) as data:
+            return str(data["fingerprint"]) if "fingerprint" in data.files else ""
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = np.asarray(z) - np.max(z, axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def read_log(log_path: str, sources: Sequence[str] = ("llm",)) -> Tuple[List[str], List[str]]:
+    """Training pairs from a decision log, keeping only labels from the given sources (not the model's own)"""
+    queries, labels = [], []
+    if not Path(log_path).exists():
+        return queries, labels
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("source") in sources and row.get("label") in INTENT_LABELS:
+                queries.append(row["query"])
+                labels.append(row["label"])
+    return queries, labels
+
+
+def append_example(path: str, query: str, label: str, source: str = "llm") -> None:
+    """Append one labelled query to a JSONL file in the decision-log format"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"query": query, "label": label, "source": source}, ensure_ascii=False) + "\n")
+
+
+def training_data(training_path: str, seed_path: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """Hand-labelled seed examples followed by the LLM-labelled queries of the training file"""
+    seed_queries, seed_labels = read_log(str(seed_path or SEED_PATH), sources=("seed",))
+    queries, labels = read_log(training_path)
+    return seed_queries + queries, seed_labels + labels
+
+
+def data_fingerprint(queries: Sequence[str], labels: Sequence[str]) -> str:
+    """Hash of a set of training pairs"""
+    digest = hashlib.sha256()
+    for query, label in zip(queries, labels):
+        digest.update(f"{label}\0{query}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def training_fingerprint(training_path: str, seed_path: Optional[str] = None) -> str:
+    """Hash of the training data; changes only when a seed example or an LLM label is added"""
+    return data_fingerprint(*training_data(training_path, seed_path))
+
+
+def training_key(training_path: str, seed_path: Optional[str] = None) -> str:
+    """Cheap cache key for the training data: size and mtime of the training and seed files"""
+    parts = []
+    for path in (Path(training_path), Path(seed_path or SEED_PATH)):
+        try:
+            stat = path.stat()
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append("-")
+    return "/".join(parts)
+
+
+class IntentClassifier:
+    """Rules, then the local model, then an LLM fallback; logs every decision"""
+
+    def __init__(
+        self,
+        model: Optional[TfidfLogistic] = None,
+        threshold: float = 0.8,
+        log_path: Optional[str] = None,
+        training_path: Optional[str] = None,
+    ):
+        self.model = model
+        self.threshold = threshold
+        self.log_path = log_path
+        self.training_path = training_path
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def classify(self, query: str, fallback: Optional[Callable[[str], str]] = None) -> Tuple[str, str]:
+        """
+        Classify a query
+
+        Args:
+            query: User question
+            fallback: query -> label, called only when rules and model are unsure (e.g. the LLM detector)
+
+        Returns:
+            (label, source) with source one of "rule", "model", "llm", "default"
+        """
+        label, source = rule_intent(query), "rule"
+        if label is None and self.model is not None:
+            proba = self.model.predict_proba([query])[0]
+            best = int(np.argmax(proba))
+            if proba[best] >= self.threshold:
+                label, source = self.model.labels[best], "model"
+        if label is None:
+            if fallback is not None:
+                label, source = fallback(query), "llm"
+            else:
+                label, source = DEFAULT_INTENT, "default"
+
+        with self._lock:
+            self.stats[source] += 1
+            if self.log_path:
+                append_example(self.log_path, query, label, source)
+            if self.training_path and source == "llm":
+                append_example(self.training_path, query, label, source)
+        return label, source
+
+    def __call__(self, query: str, fallback: Optional[Callable[[str], str]] = None) -> str:
+        return self.classify(query, fallback)[0]
+
+    @classmethod
+    def load_or_train(
+        cls,
+        model_path: str,
+        training_path: str,
+        log_path: Optional[str] = None,
+        threshold: float = 0.8,
+        min_examples: int = 30,
+        seed_path: Optional[str] = None,
+    ) -> "IntentClassifier":
+        """
+        Load the saved model, retraining it first if its training data changed
+
+        Args:
+            model_path: .npz model file
+            training_path: JSONL file of LLM-labelled queries (new ones are appended to it)
+            log_path: JSONL decision log; LLM labels already in it seed a missing training file
+            threshold: Minimum model probability to skip the LLM
+            min_examples: Seed + LLM-labelled queries needed before a model is trained
+            seed_path: Hand-labelled examples (default: SEED_PATH)
+
+        Returns:
+            Classifier (rules + LLM only until there are enough examples)
+        """
+        if log_path and not Path(training_path).exists():
+            # One-time migration from logs written before the training file existed
+            Path(training_path).touch()
+            for query, label in zip(*read_log(log_path)):
+                append_example(training_path, query, label)
+
+        model_file = Path(model_path)
+        queries, labels = training_data(training_path, seed_path)
+        fingerprint = data_fingerprint(queries, labels)
+        model = None
+        if model_file.exists() and TfidfLogistic.saved_fingerprint(model_path) == fingerprint:
+            model = TfidfLogistic.load(model_path)
+        elif len(queries) >= min_examples and len(set(labels)) >= 2:
+            model = TfidfLogistic.fit(queries, labels)
+            model.save(model_path, fingerprint=fingerprint)
+        elif model_file.exists():
+            model = TfidfLogistic.load(model_path)
+        return cls(model=model, threshold=threshold, log_path=log_path, training_path=training_path)
@@ -0,0 +1,133 @@
+"""
+Maximal marginal relevance over a fetched candidate matrix
+
+The candidates (text, metadata and embedding) are fetched from Chroma in a
+single query. Selection is greedy MMR in NumPy: the candidate matrix is
+normalized once, and after each pick only the new row's similarities are
+folded into a running max-similarity vector, so selecting k of fetch_k costs
+O(k * fetch_k * d) with no Python loop over candidates. Unlike the LangChain
+MMR retriever, every result keeps its cosine relevance to the query (and its
+MMR score), so callers can fuse real scores instead of a constant.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.vectorstores import Chroma
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(
+    query: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Greedy MMR selection
+
+    Args:
+        query: Query embedding, shape (d,)
+        candidates: Candidate embeddings, shape (n, d)
+        k: Number of candidates to select
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        (selected indices in pick order, cosine relevance of every candidate,
+        MMR score of each selected candidate at the time it was picked)
+    """
+    candidates = _normalize(np.asarray(candidates, dtype=np.float32))
+    relevance = candidates @ _normalize(np.asarray(query, dtype=np.float32))
+    n = len(candidates)
+    k = min(k, n)
+    if k == 0:
+        return np.empty(0, dtype=np.int64), relevance, np.empty(0, dtype=np.float32)
+
+    selected = np.empty(k, dtype=np.int64)
+    mmr_scores = np.empty(k, dtype=np.float32)
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    for step in range(k):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected[step] = best
+        mmr_scores[step] = scores[best]
+        available[best] = False
+        np.maximum(max_sim, candidates @ candidates[best], out=max_sim)
+
+    return selected, relevance, mmr_scores
+
+
+def fetch_candidates(
+    db: Chroma,
+    query_embedding: List[float],
+    fetch_k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Top fetch_k candidates of a Chroma collection, with their embeddings, in one query
+
+    Returns:
+        Dict with ids, texts, metas (lists) and embeddings (float32 matrix)
+    """
+    result = db._collection.query(
+        query_embeddings=[query_embedding],
+        n_results=fetch_k,
+        where=where,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    embeddings = result["embeddings"][0] if result.get("embeddings") is not None else []
+    return {
+        "ids": result["ids"][0],
+        "texts": result["documents"][0],
+        "metas": [m or {} for m in result["metadatas"][0]],
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def mmr_search(
+    db: Chroma,
+    query: str,
+    k: int = 6,
+    fetch_k: int = 20,
+    lambda_mult: float = 0.5,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    MMR search over a Chroma store that keeps the scores
+
+    Args:
+        db: LangChain Chroma store (its embedding function embeds the query)
+        query: Query text
+        k: Results to return
+        fetch_k: Nearest candidates considered
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+        where: Optional Chroma metadata filter
+
+    Returns:
+        Hits in MMR order, as {"id", "text", "meta", "score" (cosine relevance), "mmr"}
+    """
+    query_embedding = db.embeddings.embed_query(query)
+    found = fetch_candidates(db, query_embedding, fetch_k, where=where)
+    if not len(found["ids"]):
+        return []
+    selected, relevance, mmr_scores = mmr_select(np.asarray(query_embedding), found["embeddings"], k, lambda_mult)
+    return [
+        {
+            "id": found["ids"][i],
+            "text": found["texts"][i],
+            "meta": found["metas"][i],
+            "score": float(relevance[i]),
+            "mmr": float(mmr),
+        }
+        for i, mmr in zip(selected, mmr_scores)
+    ]
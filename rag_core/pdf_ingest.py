@@ -0,0 +1,155 @@
+"""
+Streaming PDF ingestion
+
+Pages are read straight from the uploaded bytes (no shared temp file), cleaned
+and split one page at a time, and handed on in fixed-size windows of chunks,
+so peak memory is bounded by a window rather than by the whole document.
+
+Page furniture (running title, copyright footer, page numbers) is detected
+from hashed line frequencies while pages stream past: the first pages are held
+back as a warm-up window to learn which lines repeat, after which pages flow
+through with the counts kept up to date.
+"""
+
+import hashlib
+import io
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import TextSplitter
+from pypdf import PdfReader
+
+
+def iter_pdf_pages(data: bytes, source: str) -> Iterator[Document]:
+    """
+    Yield one Document per PDF page, lazily
+
+    Args:
+        data: Raw PDF bytes (e.g. uploaded_file.getvalue())
+        source: Value for the `source` metadata field
+
+    Yields:
+        Documents with PyPDFLoader-compatible metadata plus `total_pages`
+    """
+    reader = PdfReader(io.BytesIO(data))
+    total = len(reader.pages)
+    for i, page in enumerate(reader.pages):
+        yield Document(
+            page_content=page.extract_text() or "",
+            metadata={"source": source, "page": i, "total_pages": total},
+        )
+
+
+def iter_cleaned(pages: Iterable[Document], clean: Callable[[str], str]) -> Iterator[Document]:
+    """Apply `clean` to each page as it streams past, dropping pages left empty"""
+    for page in pages:
+        text = clean(page.page_content)
+        if text:
+            yield Document(page_content=text, metadata=page.metadata)
+
+
+EDGE_PAGE_NUMBER = re.compile(r"^(?:\d+|[ivxlc]+)\s+|\s+(?:\d+|[ivxlc]+)$")
+DIGITS = re.compile(r"\d+")
+
+
+def line_key(line: str) -> int:
+    """
+    Hash of a line with case, spacing and numbers normalized
+
+    A leading or trailing page number (arabic or roman) is dropped, so
+    "© ISO 2016 – All rights reserved 3" and "iv © ISO 2016 – All rights reserved" share a key.
+    """
+    normalized = EDGE_PAGE_NUMBER.sub("", " ".join(line.lower().split()))
+    normalized = DIGITS.sub("#", normalized)
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class RepeatedLineFilter:
+    """
+    Streaming removal of lines that repeat across a large fraction of pages
+
+    Args:
+        min_fraction: Share of pages seen so far a line must appear on to be dropped
+        warmup_pages: Pages buffered before the first page is released
+        min_chars: Shorter lines (list markers, stray glyphs) are never dropped
+    """
+
+    def __init__(self, min_fraction: float = 0.6, warmup_pages: int = 8, min_chars: int = 8):
+        self.min_fraction = min_fraction
+        self.warmup_pages = warmup_pages
+        self.min_chars = min_chars
+        self.counts: Dict[int, int] = {}
+        self.pages_seen = 0
+        self.lines_removed = 0
+
+    def _is_repeated(self, key: Optional[int]) -> bool:
+        if key is None or self.pages_seen < 2:
+            return False
+        return self.counts.get(key, 0) >= max(2, self.min_fraction * self.pages_seen)
+
+    def _strip(self, page: Document, lines: List[str], keys: List[Optional[int]]) -> Document:
+        kept = [line for line, key in zip(lines, keys) if not self._is_repeated(key)]
+        self.lines_removed += len(lines) - len(kept)
+        return Document(page_content="\n".join(kept), metadata=page.metadata)
+
+    def filter(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Yield pages with repeated header/footer lines removed, in input order
+
+        Args:
+            pages: Raw page documents (before whitespace is collapsed)
+
+        Yields:
+            Page documents without the repeated lines
+        """
+        pending: List[Tuple[Document, List[str], List[Optional[int]]]] = []
+        for page in pages:
+            lines = page.page_content.splitlines()
+            keys = [line_key(line) if len(line.strip()) >= self.min_chars else None for line in lines]
+            for key in set(keys):
+                if key is not None:
+                    self.counts[key] = self.counts.get(key, 0) + 1
+            self.pages_seen += 1
+
+            pending.append((page, lines, keys))
+            if self.pages_seen >= self.warmup_pages:
+                for item in pending:
+                    yield self._strip(*item)
+                pending = []
+        for item in pending:
+            yield self._strip(*item)
+
+
+def iter_chunk_windows(
+    pages: Iterable[Document],
+    splitter: TextSplitter,
+    window_size: int = 64,
+) -> Iterator[List[Document]]:
+    """
+    Split pages as they arrive and group the chunks into windows
+
+    Args:
+        pages: Page documents, typically a generator
+        splitter: LangChain text splitter applied page by page
+        window_size: Chunks per yielded window
+
+    Yields:
+        Lists of at most `window_size` chunk documents, in page order
+    """
+    window: List[Document] = []
+    for page in pages:
+        window.extend(splitter.split_documents([page]))
+        while len(window) >= window_size:
+            yield window[:window_size]
+            window = window[window_size:]
+    if window:
+        yield window
+
+
+def page_progress(chunk: Document) -> Optional[float]:
+    """Fraction of the source PDF consumed up to this chunk, if known"""
+    total = chunk.metadata.get("total_pages")
+    if not total:
+        return None
+    return min(1.0, (chunk.metadata.get("page", 0) + 1) / total)
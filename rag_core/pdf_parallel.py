@@ -0,0 +1,139 @@
+"""
+Multi-process PDF text extraction with PyMuPDF
+
+Each PDF is cut into page ranges (shards) that are extracted on a process
+pool, one PyMuPDF document handle per shard. Shards are consumed in submission
+order with a bounded look-ahead, so the output is the same ordered page
+Document stream as pdf_ingest.iter_pdf_pages (`source`, `page`, `total_pages`
+metadata) while parsing of later pages and files runs ahead on the other cores.
+
+PDFs passed as bytes (uploads) are written once to a temporary file and
+workers receive only its path and a page range, so inter-process traffic stays
+at a few bytes per shard instead of one copy of the file per shard.
+"""
+
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Sequence, Tuple, Union
+
+import fitz  # PyMuPDF
+from langchain.schema import Document
+
+PdfInput = Union[str, Path, bytes]
+
+
+def _open(pdf: PdfInput) -> "fitz.Document":
+    if isinstance(pdf, bytes):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(str(pdf))
+
+
+def page_count(pdf: PdfInput) -> int:
+    """Number of pages of a PDF path or byte string"""
+    with _open(pdf) as doc:
+        return doc.page_count
+
+
+def extract_page_range(pdf: PdfInput, start: int, stop: int) -> List[str]:
+    """Plain text of pages [start, stop); runs inside a worker process"""
+    with _open(pdf) as doc:
+        return [doc.load_page(i).get_text("text") for i in range(start, stop)]
+
+
+def spool_to_disk(pdfs: Sequence[PdfInput], directory: Union[str, Path]) -> List[PdfInput]:
+    """Write byte PDFs to files in `directory` (once each); paths are passed through"""
+    spooled: List[PdfInput] = []
+    for i, pdf in enumerate(pdfs):
+        if isinstance(pdf, bytes):
+            path = Path(directory) / f"{i}.pdf"
+            path.write_bytes(pdf)
+            pdf = str(path)
+        spooled.append(pdf)
+    return spooled
+
+
+def page_ranges(n_pages: int, shard_size: int) -> List[Tuple[int, int]]:
+    """Split [0, n_pages) into consecutive ranges of at most shard_size pages"""
+    return [(start, min(start + shard_size, n_pages)) for start in range(0, n_pages, shard_size)]
+
+
+def iter_pdf_pages_parallel(
+    pdfs: Sequence[PdfInput],
+    sources: Optional[Sequence[str]] = None,
+    max_workers: Optional[int] = None,
+    shard_size: int = 16,
+) -> Iterator[Document]:
+    """
+    Extract pages of one or more PDFs on a process pool, yielding them in order
+
+    Args:
+        pdfs: File paths and/or raw PDF bytes
+        sources: `source` metadata per PDF; defaults to the path (required for bytes)
+        max_workers: Worker processes (default: CPU count)
+        shard_size: Pages per worker task
+
+    Yields:
+        One Document per page, file by file and page by page
+
+    Raises:
+        ValueError: If a PDF is given as bytes without a source name
+    """
+    if sources is None:
+        if any(isinstance(pdf, bytes) for pdf in pdfs):
+            raise ValueError("sources are required when PDFs are passed as bytes")
+        sources = [str(pdf) for pdf in pdfs]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    totals = [page_count(pdf) for pdf in pdfs]
+    jobs = [
+        (file_index, start, stop)
+        for file_index, total in enumerate(totals)
+        for start, stop in page_ranges(total, shard_size)
+    ]
+
+    def to_documents(job: Tuple[int, int, int], texts: List[str]) -> Iterator[Document]:
+        file_index, start, _ = job
+        for offset, text in enumerate(texts):
+            yield Document(
+                page_content=text,
+                metadata={"source": sources[file_index], "page": start + offset, "total_pages": totals[file_index]},
+            )
+
+    # A single shard is not worth the process start-up cost
+    if len(jobs) <= 1 or max_workers == 1:
+        for job in jobs:
+            yield from to_documents(job, extract_page_range(pdfs[job[0]], job[1], job[2]))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="pdf_parallel-") as spool, \
+            ProcessPoolExecutor(max_workers=max_workers) as pool:
+        paths = spool_to_disk(pdfs, spool)
+        queue = iter(jobs)
+        pending: Deque = deque()
+
+        def submit_next() -> None:
+            job = next(queue, None)
+            if job is not None:
+                pending.append((job, pool.submit(extract_page_range, paths[job[0]], job[1], job[2])))
+
+        # Look-ahead of two shards per worker keeps every core busy while bounding memory
+        for _ in range(2 * max_workers):
+            submit_next()
+        try:
+            while pending:
+                job, future = pending.popleft()
+                texts = future.result()
+                submit_next()
+                yield from to_documents(job, texts)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def iter_pdf_directory(directory: Union[str, Path], pattern: str = "**/*.pdf", **kwargs) -> Iterator[Document]:
+    """Extract every PDF under `directory` (sorted by path) in one parallel job"""
+    paths = sorted(Path(directory).glob(pattern))
+    return iter_pdf_pages_parallel(paths, **kwargs)
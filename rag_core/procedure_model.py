@@ -0,0 +1,135 @@
+"""
+Parsed-once procedure objects with memoized renderings
+
+A Procedure is built once from a procedure_record payload: sections, template
+order and the compact sections JSON used in prompts are decoded and
+serialized a single time. ProcedureCatalog builds the objects when it is
+created (or on first use for IDs it was not given) and keeps them with any
+rendered output (e.g. the full Markdown template) keyed by
+(procedure_id, dataset version), so a repeated full-template request is a
+dictionary lookup. A new dataset version starts a fresh cache.
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class TemplateItem:
+    """One entry of a procedure's template order"""
+
+    __slots__ = ("key", "title", "section_no")
+
+    def __init__(self, key: str, title: str, section_no: Optional[str] = None):
+        self.key = key
+        self.title = title
+        self.section_no = section_no
+
+
+class Procedure:
+    """Typed, immutable-by-convention view of one procedure"""
+
+    __slots__ = (
+        "procedure_id",
+        "procedure_name",
+        "clause_references",
+        "retrieval_text",
+        "sections",
+        "template_order",
+        "sections_json",
+    )
+
+    def __init__(
+        self,
+        procedure_id: str,
+        procedure_name: str,
+        clause_references: str,
+        retrieval_text: str,
+        sections: Dict[str, Any],
+        template_order: List[TemplateItem],
+    ):
+        self.procedure_id = procedure_id
+        self.procedure_name = procedure_name
+        self.clause_references = clause_references
+        self.retrieval_text = retrieval_text
+        self.sections = sections
+        self.template_order = template_order
+        # Serialized once; every prompt reuses the same string
+        self.sections_json = json.dumps(sections, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Procedure":
+        """Build from a section_units.procedure_record payload"""
+        order = [
+            TemplateItem(item["key"], item.get("title") or item["key"], item.get("section_no"))
+            for item in record.get("template_order", [])
+            if item.get("key")
+        ]
+        return cls(
+            procedure_id=record["procedure_id"],
+            procedure_name=record.get("procedure_name", "Procedure"),
+            clause_references=record.get("clause_references", ""),
+            retrieval_text=record.get("retrieval_text", ""),
+            sections=record.get("sections", {}),
+            template_order=order,
+        )
+
+
+class ProcedureCatalog:
+    """
+    Procedures parsed once, with memoized renderings per (procedure_id, dataset version)
+
+    Args:
+        loader: procedure_id -> procedure_record payload (e.g. ProcedureStore.get), called once per ID
+        version: Dataset version; renderings are only reused within the same version
+        preload: IDs built now, at load time (e.g. ProcedureStore.ids()); others are built on first use
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[Dict[str, Any]]],
+        version: str,
+        preload: Iterable[str] = (),
+    ):
+        self.loader = loader
+        self.version = version
+        self._procedures: Dict[str, Optional[Procedure]] = {}
+        self._rendered: Dict[Tuple[str, str, str], str] = {}
+        self._lock = threading.Lock()
+        self.render_hits = 0
+        self.render_misses = 0
+        for procedure_id in preload:
+            self.get(procedure_id)
+
+    def __len__(self) -> int:
+        return len(self._procedures)
+
+    def get(self, procedure_id: str) -> Optional[Procedure]:
+        """The procedure, built from its payload the first time it is requested"""
+        if procedure_id not in self._procedures:
+            record = self.loader(procedure_id)
+            with self._lock:
+                self._procedures[procedure_id] = Procedure.from_record(record) if record else None
+        return self._procedures[procedure_id]
+
+    def rendered(self, procedure: Procedure, render: Callable[[Procedure], str]) -> str:
+        """
+        render(procedure), computed once per (procedure_id, dataset version, renderer)
+
+        Args:
+            procedure: Procedure from this catalog
+            render: Pure function of the procedure (e.g. the full-template Markdown renderer)
+
+        Returns:
+            Rendered text
+        """
+        key = (procedure.procedure_id, self.version, render.__qualname__)
+        text = self._rendered.get(key)
+        if text is not None:
+            self.render_hits += 1
+            return text
+        text = render(procedure)
+        with self._lock:
+            self._rendered[key] = text
+            self.render_misses += 1
+        return text
@@ -0,0 +1,283 @@
+"""
+Compact first-stage FAISS search with exact rescoring
+
+The first stage searches a cheap representation of every vector and the top
+`k * oversample` candidates are re-scored against the full-precision vectors,
+which faiss_store keeps in a separate memory-mapped file: only the rows of
+those candidates are ever paged in. Two kinds of first stage:
+- quantized storage: fp16 (2 bytes per dimension) or scalar int8 with
+  per-dimension min/max scaling (1 byte per dimension), 2x / 4x smaller than float32
+- Matryoshka prefixes: text-embedding-3 vectors keep most of their ranking
+  quality when cut to the first few hundred dimensions and re-normalized
+  (exactly what the API returns for `dimensions=256`), so the first stage
+  scans a 256-d cosine index built from the same embedding call. It can be
+  combined with fp16 / int8 storage.
+
+RescoringIndex duck-types the parts of faiss.Index that LangChain's FAISS
+wrapper uses for querying (search, reconstruct, ntotal, d), so these stores
+are drop-in LangChain vector stores. They are read-only.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from rag_core.ann_index import build_index, choose_kind, faiss_metric, index_bytes, stored_vectors, to_ann
+
+ENCODINGS = {"fp16": "SQfp16", "sq8": "SQ8"}
+MATRYOSHKA_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+
+
+def prefix_vectors(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """First `dims` components of each row, re-normalized to unit length (Matryoshka truncation)"""
+    # Explicit copy: a one-row slice is already contiguous and normalize_L2 works in place
+    prefix = np.array(np.asarray(vectors, dtype=np.float32)[:, :dims], order="C", copy=True)
+    faiss.normalize_L2(prefix)
+    return prefix
+
+
+class RescoringIndex:
+    """
+    Compact faiss index for candidate search + full-precision vectors for rescoring
+
+    Args:
+        coarse: First-stage index (row i == vector i)
+        full: float32 (ntotal, d) array or memmap with the original vectors
+        oversample: Candidates fetched per requested result
+        prefix_dims: If set, the first stage indexes normalized Matryoshka prefixes of this length
+        metric_type: Metric of the full vectors (defaults to the coarse index metric)
+    """
+
+    def __init__(self, coarse: faiss.Index, full: np.ndarray, oversample: int = 4,
+                 prefix_dims: Optional[int] = None, metric_type: Optional[int] = None):
+        self.coarse = coarse
+        self.full = full
+        self.oversample = oversample
+        self.prefix_dims = prefix_dims
+        self.metric_type = coarse.metric_type if metric_type is None else metric_type
+
+    @property
+    def ntotal(self) -> int:
+        return self.coarse.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.full.shape[1]
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.full[i], dtype=np.float32)
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """faiss-compatible search: (distances, ids), each (n_queries, k), -1 padded"""
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        first_stage = x if self.prefix_dims is None else prefix_vectors(x, self.prefix_dims)
+        _, candidates = self.coarse.search(first_stage, min(self.ntotal, k * self.oversample))
+
+        distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        ids = np.full((len(x), k), -1, dtype=np.int64)
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        if inner_product:
+            distances.fill(-np.inf)
+
+        for row, (query, cand) in enumerate(zip(x, candidates)):
+            cand = cand[cand >= 0]
+            if not len(cand):
+                continue
+            # Sorted row order keeps memmap reads sequential
+            cand = np.sort(cand)
+            vectors = np.asarray(self.full[cand], dtype=np.float32)
+            if inner_product:
+                scores = vectors @ query
+                order = np.argsort(-scores, kind="stable")[:k]
+            else:
+                scores = ((vectors - query) ** 2).sum(axis=1)
+                order = np.argsort(scores, kind="stable")[:k]
+            distances[row, :len(order)] = scores[order]
+            ids[row, :len(order)] = cand[order]
+        return distances, ids
+
+
+def build_quantized(
+    vectors: np.ndarray,
+    mode: str = "sq8",
+    kind: str = "flat",
+    metric: int = faiss.METRIC_L2,
+    oversample: int = 4,
+    **build_kwargs,
+) -> RescoringIndex:
+    """
+    Quantized index over `vectors` (kept as the rescoring copy)
+
+    Args:
+        vectors: float32 matrix in docstore position order
+        mode: "fp16" or "sq8"
+        kind: Candidate search layout: flat, hnsw or ivf_flat (see ann_index)
+        metric: faiss.METRIC_L2 or faiss.METRIC_INNER_PRODUCT
+        oversample: Candidates fetched per requested result
+
+    Raises:
+        ValueError: If the mode is unknown or kind is ivf_pq (already a compressed encoding)
+    """
+    if mode not in ENCODINGS:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {tuple(ENCODINGS)}")
+    if kind == "ivf_pq":
+        raise ValueError("ivf_pq is already compressed; use kind='flat', 'hnsw' or 'ivf_flat'")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    coarse = build_index(vectors, kind=kind, metric=metric, encoding=ENCODINGS[mode], **build_kwargs)
+    return RescoringIndex(coarse, vectors, oversample=oversample)
+
+
+def build_matryoshka(
+    vectors: np.ndarray,
+    dims: int = 256,
+    mode: Optional[str] = None,
+    kind: str = "flat",
+    metric: int = faiss.METRIC_L2,
+    oversample: int = 10,
+    **build_kwargs,
+) -> RescoringIndex:
+    """
+    Two-stage index: cosine search over `dims`-long prefixes, rerank on the full vectors
+
+    Args:
+        vectors: Full float32 embeddings (text-embedding-3-*) in docstore position order
+        dims: First-stage dimensions
+        mode: Optional first-stage storage: None (float32), "fp16" or "sq8"
+        kind: First-stage layout: flat, hnsw or ivf_flat (see ann_index)
+        metric: Metric of the full vectors, used for the rerank
+        oversample: Candidates fetched per requested result
+
+    Raises:
+        ValueError: If dims is not smaller than the vector dimension, or on a bad mode/kind
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not 0 < dims < vectors.shape[1]:
+        raise ValueError(f"dims must be between 1 and {vectors.shape[1] - 1}, got {dims}")
+    if mode is not None and mode not in ENCODINGS:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {tuple(ENCODINGS)}")
+    if kind == "ivf_pq":
+        raise ValueError("ivf_pq is already compressed; use kind='flat', 'hnsw' or 'ivf_flat'")
+    encoding = ENCODINGS[mode] if mode else "Flat"
+    coarse = build_index(prefix_vectors(vectors, dims), kind=kind, metric=faiss.METRIC_INNER_PRODUCT,
+                         encoding=encoding, **build_kwargs)
+    return RescoringIndex(coarse, vectors, oversample=oversample, prefix_dims=dims, metric_type=metric)
+
+
+def supports_matryoshka(embeddings: Embeddings) -> bool:
+    """True for embedding models trained so that vector prefixes are usable embeddings"""
+    underlying = getattr(embeddings, "underlying", embeddings)  # see through CachedEmbeddings
+    return getattr(underlying, "model", None) in MATRYOSHKA_MODELS
+
+
+def to_quantized(vectorstore: FAISS, mode: str = "sq8", kind: str = "flat", **kwargs) -> FAISS:
+    """
+    Re-index a LangChain FAISS store with quantized storage; the docstore is reused
+
+    kind="auto" follows ann_index.choose_kind, using ivf_flat where it would pick ivf_pq.
+    """
+    if kind == "auto":
+        kind = choose_kind(vectorstore.index.ntotal)
+        kind = "ivf_flat" if kind == "ivf_pq" else kind
+    index = build_quantized(stored_vectors(vectorstore), mode=mode, kind=kind, metric=faiss_metric(vectorstore), **kwargs)
+    return _with_index(vectorstore, index)
+
+
+def to_matryoshka(vectorstore: FAISS, dims: int = 256, mode: Optional[str] = None, kind: str = "flat", **kwargs) -> FAISS:
+    """
+    Re-index a LangChain FAISS store as a Matryoshka two-stage store; the docstore is reused
+
+    Raises:
+        ValueError: If the store's embedding model does not produce Matryoshka embeddings
+    """
+    if not supports_matryoshka(vectorstore.embeddings):
+        raise ValueError(f"Matryoshka truncation needs one of {MATRYOSHKA_MODELS}")
+    if kind == "auto":
+        kind = choose_kind(vectorstore.index.ntotal)
+        kind = "ivf_flat" if kind == "ivf_pq" else kind
+    index = build_matryoshka(stored_vectors(vectorstore), dims=dims, mode=mode, kind=kind,
+                             metric=faiss_metric(vectorstore), **kwargs)
+    return _with_index(vectorstore, index)
+
+
+def reindex(vectorstore: FAISS, kind: str = "auto", quantization: str = "", matryoshka_dims: int = 0) -> FAISS:
+    """
+    Apply the configured index layout to a freshly built flat store
+
+    Args:
+        vectorstore: Flat LangChain FAISS store
+        kind: ann_index mode (flat, hnsw, ivf_flat, ivf_pq or auto)
+        quantization: "" (float32), "fp16" or "sq8" first-stage storage
+        matryoshka_dims: If > 0, first stage on Matryoshka prefixes of this length
+    """
+    if matryoshka_dims:
+        return to_matryoshka(vectorstore, dims=matryoshka_dims, mode=quantization or None, kind=kind)
+    if quantization:
+        return to_quantized(vectorstore, mode=quantization, kind=kind)
+    return to_ann(vectorstore, kind=kind)
+
+
+def _with_index(vectorstore: FAISS, index: RescoringIndex) -> FAISS:
+    return FAISS(
+        vectorstore.embeddings,
+        index,
+        vectorstore.docstore,
+        vectorstore.index_to_docstore_id,
+        normalize_L2=vectorstore._normalize_L2,
+        distance_strategy=vectorstore.distance_strategy,
+    )
+
+
+def quantization_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    modes: Sequence[str] = tuple(ENCODINGS),
+    k: int = 10,
+    metric: int = faiss.METRIC_L2,
+    oversample: int = 4,
+    matryoshka_dims: Sequence[int] = (),
+) -> List[Dict[str, float]]:
+    """
+    Recall@k of each quantization mode with and without rescoring, against exact float32 search
+
+    Args:
+        vectors: Indexed float32 vectors
+        queries: Query vectors
+        modes: Quantized storage modes to compare
+        k: Neighbours per query
+        metric: faiss.METRIC_L2 or faiss.METRIC_INNER_PRODUCT
+        oversample: Candidates fetched per requested result
+        matryoshka_dims: Prefix lengths to add as "matryoshka-<dims>" rows (float32 first stage,
+            Matryoshka default oversample)
+
+    Returns:
+        One row per mode: mode, recall_quantized (first stage alone), recall_rescored,
+        bytes_per_vector (first-stage index only)
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlat(vectors.shape[1], metric)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    def recall(found: np.ndarray) -> float:
+        return sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / (k * len(queries))
+
+    candidates = [(mode, build_quantized(vectors, mode=mode, metric=metric, oversample=oversample)) for mode in modes]
+    candidates += [(f"matryoshka-{dims}", build_matryoshka(vectors, dims=dims, metric=metric)) for dims in matryoshka_dims]
+
+    rows = []
+    for name, index in candidates:
+        first_stage = queries if index.prefix_dims is None else prefix_vectors(queries, index.prefix_dims)
+        _, compact_only = index.coarse.search(first_stage, k)
+        _, rescored = index.search(queries, k)
+        rows.append({
+            "mode": name,
+            "recall_quantized": recall(compact_only),
+            "recall_rescored": recall(rescored),
+            "bytes_per_vector": index_bytes(index.coarse) / len(vectors),
+        })
+    return rows
@@ -0,0 +1,113 @@
+"""
+Concurrent query pipeline: rewrite, intent detection and speculative retrieval
+
+The query rewrite and intent detection are independent LLM round-trips, and
+retrieval on the raw query does not need to wait for either. All three are
+started at once; when the rewrite arrives, the speculative hits are either
+used as-is (the rewrite did not change the query), merged with a retrieval on
+the rewritten query by reciprocal rank fusion, or discarded. End-to-end
+latency approaches the slowest single step instead of the sum of all steps.
+Merged hits keep their retriever breakdown in "sources" and record which
+query found them in "origin".
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from rag_core.fusion import fuse, procedure_key
+
+Hits = List[Dict[str, Any]]
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query-pipeline")
+
+
+def same_query(a: str, b: str) -> bool:
+    """True if two queries only differ in case, spacing or trailing punctuation"""
+    def norm(s: str) -> List[str]:
+        return s.casefold().strip().rstrip("?.!").split()
+    return norm(a) == norm(b)
+
+
+def _timed(fn: Callable, *args) -> Callable[[], Any]:
+    def run():
+        start = time.perf_counter()
+        return fn(*args), time.perf_counter() - start
+    return run
+
+
+def merge_speculative(rewritten_hits: Hits, raw_hits: Hits, top_k: int = 8, raw_weight: float = 0.5) -> Hits:
+    """
+    RRF-merge rewritten-query and raw-query hits
+
+    Each merged hit keeps the per-retriever "sources" of its original hit (the
+    rewritten-query one when both queries found it) and gets "origin":
+    {"rewritten" / "raw": {"rank", "score", "norm"}} for the query or queries that found it.
+    """
+    originals: Dict[str, Dict[str, Any]] = {}
+    for hits in (rewritten_hits, raw_hits):
+        for hit in hits:
+            originals.setdefault(procedure_key(hit), hit)
+
+    merged = fuse(
+        {"rewritten": rewritten_hits, "raw": raw_hits},
+        method="rrf",
+        weights={"rewritten": 1.0, "raw": raw_weight},
+        top_k=top_k,
+    )
+    for hit in merged:
+        hit["origin"] = hit["sources"]
+        hit["sources"] = originals[procedure_key(hit)].get("sources", {})
+    return merged
+
+
+def run_query_pipeline(
+    query: str,
+    rewrite: Callable[[str], str],
+    detect_intent: Callable[[str], str],
+    retrieve: Callable[[str], Hits],
+    speculative: str = "merge",
+    top_k: int = 8,
+    raw_weight: float = 0.5,
+) -> Dict[str, Any]:
+    """
+    Run rewrite, intent detection and retrieval concurrently
+
+    Args:
+        query: User question
+        rewrite: query -> rewritten query (LLM call)
+        detect_intent: query -> intent label (LLM call)
+        retrieve: query -> ranked hits
+        speculative: What to do with raw-query hits when the rewrite differs: "merge" or "discard"
+        top_k: Hits kept after merging
+        raw_weight: RRF weight of the raw-query hits relative to the rewritten-query hits
+
+    Returns:
+        Dict with rewritten, intent, hits, speculative ("used", "merged" or "discarded")
+        and timings (seconds per step and total); merged hits also carry "origin"
+    """
+    start = time.perf_counter()
+    rewrite_future: Future = _POOL.submit(_timed(rewrite, query))
+    intent_future: Future = _POOL.submit(_timed(detect_intent, query))
+    raw_future: Future = _POOL.submit(_timed(retrieve, query))
+
+    rewritten, rewrite_s = rewrite_future.result()
+    timings = {"rewrite": rewrite_s}
+
+    if same_query(rewritten, query):
+        hits, timings["retrieval"] = raw_future.result()
+        outcome = "used"
+    else:
+        rewritten_future = _POOL.submit(_timed(retrieve, rewritten))
+        if speculative == "merge":
+            raw_hits, _ = raw_future.result()
+            rewritten_hits, timings["retrieval"] = rewritten_future.result()
+            hits = merge_speculative(rewritten_hits, raw_hits, top_k=top_k, raw_weight=raw_weight)
+            outcome = "merged"
+        else:
+            # The raw-query retrieval started with the rewrite and is left to finish; its hits are ignored
+            hits, timings["retrieval"] = rewritten_future.result()
+            outcome = "discarded"
+
+    intent, timings["intent"] = intent_future.result()
+    timings["total"] = time.perf_counter() - start
+    return {"rewritten": rewritten, "intent": intent, "hits": hits, "speculative": outcome, "timings": timings}
@@ -0,0 +1,167 @@
+"""
+Section-level retrieval units with the full procedures in a separate store
+
+Instead of one embedding per serialized procedure, every section of a
+procedure becomes its own retrieval unit (plus one overview unit with the
+name, clause references and retrieval_text). Vector and BM25 metadata hold
+only IDs: the parent procedure_id and the section_key. The full procedure
+(sections, template order, clause references) lives in a SQLite key-value
+store and is fetched only for the procedure finally chosen, so hits stay
+small and section-specific questions match the section that answers them.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+UNIT_MODES = ("section", "procedure")
+OVERVIEW_KEY = "_overview"
+
+
+def procedure_record(entry: Dict[str, Any], i: int = 0) -> Dict[str, Any]:
+    """Normalized procedure payload kept in the ProcedureStore"""
+    clause_refs = entry.get("clause_references", [])
+    if isinstance(clause_refs, str):
+        clause_refs = [clause_refs]
+    return {
+        "procedure_id": entry.get("procedure_id", f"proc_{i}"),
+        "procedure_name": entry.get("procedure_name", f"Procedure {i}"),
+        "clause_references": ",".join([c.strip() for c in clause_refs if str(c).strip()]),
+        "retrieval_text": entry.get("retrieval_text") or "",
+        "sections": entry.get("sections", {}) or {},
+        "template_order": entry.get("template_order", []) or [],
+    }
+
+
+def section_text(value: Any) -> str:
+    """Plain text of a section value (nested dicts/lists flattened to 'key: value' lines)"""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        lines = []
+        for k, v in value.items():
+            inner = section_text(v)
+            if inner:
+                lines.append(f"{k.replace('_', ' ')}: {inner}")
+        return "\n".join(lines)
+    if isinstance(value, list):
+        return "\n".join(t for t in (section_text(v) for v in value) if t)
+    return str(value).strip()
+
+
+def section_titles(record: Dict[str, Any]) -> Dict[str, str]:
+    """section_key -> display title, in template order first, then any remaining sections"""
+    titles = {item["key"]: item.get("title") or item["key"] for item in record["template_order"] if item.get("key")}
+    for key in record["sections"]:
+        titles.setdefault(key, key.replace("_", " ").title())
+    return titles
+
+
+def retrieval_units(
+    records: Sequence[Dict[str, Any]],
+    mode: str = "section",
+) -> Tuple[List[str], List[str], List[Dict[str, str]]]:
+    """
+    Retrieval units of a set of procedures
+
+    Args:
+        records: procedure_record payloads
+        mode: "section" (one unit per section key plus an overview) or "procedure" (one unit per procedure)
+
+    Returns:
+        (unit ids, texts, metadatas); metadata holds only procedure_id and section_key
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode not in UNIT_MODES:
+        raise ValueError(f"Unknown unit mode {mode!r}; expected one of {UNIT_MODES}")
+
+    ids, texts, metas = [], [], []
+    for r in records:
+        pid, name = r["procedure_id"], r["procedure_name"]
+        header = f"{name} (clauses {r['clause_references']})" if r["clause_references"] else name
+        titles = section_titles(r)
+
+        if mode == "procedure":
+            body = r["retrieval_text"] or "\n".join(
+                f"{titles[k]}: {section_text(r['sections'].get(k))}" for k in titles
+            )
+            units = [(OVERVIEW_KEY, f"{header}\n{body}")]
+        else:
+            overview = r["retrieval_text"] or "; ".join(titles.values())
+            units = [(OVERVIEW_KEY, f"{header}\n{overview}")]
+            for key, title in titles.items():
+                body = section_text(r["sections"].get(key))
+                if body:
+                    units.append((key, f"{name} - {title}\n{body}"))
+
+        for key, text in units:
+            ids.append(f"{pid}#{key}")
+            texts.append(text)
+            metas.append({"procedure_id": pid, "section_key": key})
+    return ids, texts, metas
+
+
+class ProcedureStore:
+    """SQLite key-value store of full procedure payloads, keyed by procedure_id"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS procedures (procedure_id TEXT PRIMARY KEY, hash TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM procedures").fetchone()[0]
+
+    def sync(self, records: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the store hold exactly these procedures, rewriting only changed ones
+
+        Returns:
+            Counts of {"added", "removed", "unchanged"} procedures
+        """
+        payloads = {r["procedure_id"]: json.dumps(r, ensure_ascii=False, sort_keys=True) for r in records}
+        hashes = {pid: hashlib.sha256(p.encode("utf-8")).hexdigest() for pid, p in payloads.items()}
+        with self._lock:
+            stored = dict(self._db.execute("SELECT procedure_id, hash FROM procedures").fetchall())
+            changed = [pid for pid, h in hashes.items() if stored.get(pid) != h]
+            removed = [pid for pid in stored if pid not in hashes]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO procedures VALUES (?, ?, ?)",
+                [(pid, hashes[pid], payloads[pid]) for pid in changed],
+            )
+            self._db.executemany("DELETE FROM procedures WHERE procedure_id = ?", [(pid,) for pid in removed])
+            self._db.commit()
+        return {"added": len(changed), "removed": len(removed), "unchanged": len(hashes) - len(changed)}
+
+    def get(self, procedure_id: str) -> Optional[Dict[str, Any]]:
+        """Full procedure payload, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM procedures WHERE procedure_id = ?", (procedure_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def version(self) -> str:
+        """Dataset version: hash over every stored (procedure_id, content hash) pair"""
+        with self._lock:
+            rows = self._db.execute("SELECT procedure_id, hash FROM procedures ORDER BY procedure_id").fetchall()
+        digest = hashlib.sha256()
+        for pid, h in rows:
+            digest.update(f"{pid}\0{h}\0".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def ids(self) -> List[str]:
+        """All stored procedure IDs"""
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT procedure_id FROM procedures").fetchall()]
+
+    def close(self) -> None:
+        self._db.close()
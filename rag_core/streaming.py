@@ -0,0 +1,156 @@
+"""
+Streaming answer generation with time-to-first-token and throughput
+
+Retrieval finishes first; the completion is then consumed as a stream of text
+deltas and pushed to the UI as it arrives (st.write_stream, or print_stream
+on the command line). TokenStream wraps any source of deltas and records
+time to first token, total time and tokens per second. Sources:
+- openai_deltas: OpenAI client chat.completions with stream=True
+- chat_model_deltas: a LangChain chat model's .stream()
+- chain_deltas: the "answer" field of a create_retrieval_chain .stream()
+Each streamed chunk of these sources is one completion token, so chunks are
+counted as tokens.
+"""
+
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+
+class TokenStream:
+    """
+    Iterator over text deltas that times the stream
+
+    Args:
+        deltas: Source of text pieces (consumed lazily, so the request starts on first iteration)
+        on_done: Called with this stream once it is exhausted (e.g. to cache the full text)
+    """
+
+    def __init__(self, deltas: Iterable[str], on_done: Optional[Callable[["TokenStream"], None]] = None):
+        self._deltas = deltas
+        self.on_done = on_done
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.tokens = 0
+        self._parts: List[str] = []
+
+    def __iter__(self) -> Iterator[str]:
+        self.started = time.perf_counter()
+        for delta in self._deltas:
+            if not delta:
+                continue
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.tokens += 1
+            self._parts.append(delta)
+            yield delta
+        self.finished_at = time.perf_counter()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    @property
+    def text(self) -> str:
+        """Everything streamed so far"""
+        return "".join(self._parts)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from the start of the stream to the first token"""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds from the start of the stream to its end (or now, while streaming)"""
+        return (self.finished_at or time.perf_counter()) - self.started
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Generation throughput after the first token"""
+        if self.first_token_at is None or self.tokens < 2:
+            return 0.0
+        return (self.tokens - 1) / max((self.finished_at or time.perf_counter()) - self.first_token_at, 1e-9)
+
+    def stats(self) -> Dict[str, Any]:
+        """TTFT, total time, token count and tokens/sec"""
+        return {
+            "ttft_s": self.ttft,
+            "total_s": self.elapsed,
+            "tokens": self.tokens,
+            "tokens_per_s": self.tokens_per_second,
+        }
+
+    def summary(self) -> str:
+        """One-line report, e.g. 'first token 0.42s · 318 tokens in 7.9s (42.1 tok/s)'"""
+        if self.ttft is None:
+            return f"no tokens in {self.elapsed:.1f}s"
+        return (
+            f"first token {self.ttft:.2f}s · {self.tokens} tokens in {self.elapsed:.1f}s "
+            f"({self.tokens_per_second:.1f} tok/s)"
+        )
+
+
+def openai_deltas(
+    client: Any,
+    on_error: Optional[Callable[[Exception], str]] = None,
+    **create_kwargs,
+) -> Iterator[str]:
+    """
+    Text deltas of an OpenAI chat completion
+
+    Args:
+        client: openai.OpenAI client
+        on_error: Turns an API error into a message to yield instead of raising
+        **create_kwargs: Arguments for client.chat.completions.create (model, messages, ...)
+
+    Yields:
+        Content deltas
+    """
+    try:
+        for chunk in client.chat.completions.create(stream=True, **create_kwargs):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        if on_error is None:
+            raise
+        yield on_error(e)
+
+
+def chat_model_deltas(llm: Any, messages: Any) -> Iterator[str]:
+    """Text deltas of a LangChain chat model (messages: prompt string or message list)"""
+    for chunk in llm.stream(messages):
+        content = getattr(chunk, "content", chunk)
+        if content:
+            yield content
+
+
+def chain_deltas(
+    chain: Any,
+    inputs: Dict[str, Any],
+    on_context: Optional[Callable[[List[Any]], None]] = None,
+) -> Iterator[str]:
+    """
+    Answer deltas of a create_retrieval_chain chain
+
+    Args:
+        chain: Retrieval chain (streams dict chunks with "context" then "answer" pieces)
+        inputs: Chain input, e.g. {"input": question}
+        on_context: Called with the retrieved documents as soon as retrieval finishes
+
+    Yields:
+        Answer deltas
+    """
+    for chunk in chain.stream(inputs):
+        if on_context is not None and "context" in chunk:
+            on_context(chunk["context"])
+        if chunk.get("answer"):
+            yield chunk["answer"]
+
+
+def print_stream(stream: TokenStream, file: TextIO = sys.stdout) -> str:
+    """Print deltas as they arrive (CLI) and return the full text"""
+    for delta in stream:
+        file.write(delta)
+        file.flush()
+    file.write("\n")
+    return stream.text
@@ -0,0 +1,103 @@
+"""
+Text cleaning pipeline for extracted PDF / Word text
+
+All patterns are compiled once per TextCleaner. A page is cleaned as:
+1. line pass (only if line rules are on): drops header/footer lines and, with
+   strip_edge_numbers, a bare page number on the first or last line of the page
+   (numbers elsewhere are table cells, quantities or clause numbers and stay)
+   while line breaks still exist
+2. disallowed character removal: str.translate for ASCII pages (its C fast
+   path, with a table derived from the same character class), a single
+   character-class regex otherwise
+3. one combined regex for "Page N (of M)" markers and "N/M" counters
+4. whitespace collapse with str.split / str.join
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Sequence
+
+from langchain.schema import Document
+
+
+@dataclass(frozen=True)
+class CleaningRules:
+    """Configurable cleaning rules; defaults reproduce the ISO PDF app's clean_text"""
+
+    strip_page_numbers: bool = True           # "Page 12", "Page 3 of 40"
+    strip_edge_numbers: bool = False          # a line that is only a 1-4 digit number, first or last on the page
+    strip_fractions: bool = True              # "3/46" page counters
+    allowed_punctuation: str = ".,;:()-/"     # everything else that is not a word char or space is dropped
+    drop_line_patterns: Sequence[str] = ()    # regexes for whole header/footer lines to remove
+
+
+class TextCleaner:
+    """Precompiled cleaner for one set of CleaningRules"""
+
+    def __init__(self, rules: CleaningRules = CleaningRules()):
+        self.rules = rules
+
+        self._line_re = None
+        if rules.drop_line_patterns:
+            alternatives = "|".join(f"(?:{p})" for p in rules.drop_line_patterns)
+            self._line_re = re.compile(rf"^[ \t]*(?:{alternatives})[ \t]*$", re.MULTILINE | re.IGNORECASE)
+        self._edge_number_re = None
+        if rules.strip_edge_numbers:
+            self._edge_number_re = re.compile(r"\A\s*\d{1,4}[ \t]*(?:\n|\Z)|(?:\A|\n)[ \t]*\d{1,4}\s*\Z")
+
+        self._banned_re = re.compile(rf"[^\w\s{re.escape(rules.allowed_punctuation)}]+")
+        # Same character class as _banned_re (control characters included), so both paths agree
+        banned_ascii = "".join(chr(i) for i in range(128) if self._banned_re.match(chr(i)))
+        self._delete_table = str.maketrans("", "", banned_ascii)
+
+        # Case folding spelled out in the pattern keeps the literal-prefix fast path that re.IGNORECASE loses
+        markers = []
+        if rules.strip_page_numbers:
+            markers.append(r"[Pp][Aa][Gg][Ee]\s*\d+(?:\s*[Oo][Ff]\s*\d+)?")
+        if rules.strip_fractions:
+            markers.append(r"\d+\s*/\s*\d+")
+        self._marker_re = re.compile("|".join(markers)) if markers else None
+
+    def clean(self, text: str) -> str:
+        """Clean one page of text"""
+        if self._line_re is not None:
+            text = self._line_re.sub("", text)
+        if self._edge_number_re is not None:
+            text = self._edge_number_re.sub("", text)
+        if text.isascii():
+            text = text.translate(self._delete_table)
+        else:
+            text = self._banned_re.sub("", text)
+        if self._marker_re is not None:
+            text = self._marker_re.sub("", text)
+        return " ".join(text.split())
+
+    def clean_batch(self, texts: Iterable[str]) -> List[str]:
+        """Clean a batch of pages"""
+        clean = self.clean
+        return [clean(t) for t in texts]
+
+    def clean_documents(self, documents: Iterable[Document], batch_size: int = 32) -> Iterator[Document]:
+        """
+        Clean documents lazily in batches, dropping ones left empty
+
+        Args:
+            documents: Page documents, typically a generator
+            batch_size: Pages cleaned per batch
+
+        Yields:
+            Cleaned documents with their original metadata
+        """
+        batch: List[Document] = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield from self._clean_batch_documents(batch)
+                batch = []
+        if batch:
+            yield from self._clean_batch_documents(batch)
+
+    def _clean_batch_documents(self, batch: List[Document]) -> Iterator[Document]:
+        for doc, text in zip(batch, self.clean_batch(d.page_content for d in batch)):
+            if text:
+                yield Document(page_content=text, metadata=doc.metadata)
@@ -349,9 +349,9 @@
 
 
 # app.py
-import os, re, json
+import itertools, os, sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Tuple, Union
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -359,7 +359,18 @@ from dotenv import load_dotenv
 from langchain.chat_models import ChatOpenAI
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
-from rank_bm25 import BM25Okapi
+
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from rag_core.bm25 import BM25Index
+from rag_core.chroma_sync import sync_if_changed
+from rag_core.dataset_loader import STREAM_THRESHOLD_BYTES, LoadStats, can_stream, iter_json_entries, load_json
+from rag_core.embedding_cache import CachedEmbeddings
+from rag_core.fusion import hybrid_retrieve
+from rag_core.mmr import mmr_search
+from rag_core.procedure_model import Procedure, ProcedureCatalog
+from rag_core.section_units import UNIT_MODES, ProcedureStore, procedure_record, retrieval_units
+from rag_core.streaming import TokenStream, chat_model_deltas
 
 # ✅ FIX: proper message type for invoke()
 from langchain_core.messages import HumanMessage
@@ -384,104 +395,91 @@ FALLBACK_RESPONSE = "This procedure is not available in the current ISO 13485 cl
 
 
 # ---------- Load dataset ----------
-def load_entries(path: str) -> List[Dict[str, Any]]:
+def load_entries(path: str) -> Tuple[Iterable[Dict[str, Any]], LoadStats]:
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"Dataset not found: {p.resolve()}")
-    data = json.loads(p.read_text(encoding="utf-8"))
 
+    # Large libraries are streamed entry by entry into entries_to_units, so the raw
+    # file, the full parse tree and the entry list are never in memory together;
+    # stats.entries is filled in once the stream has been consumed
+    size = p.stat().st_size
+    if size >= STREAM_THRESHOLD_BYTES and can_stream():
+        stats = LoadStats(path=str(p), size_bytes=size)
+        stream = iter_json_entries(p, stats=stats)
+        first = next(stream, None)
+        if first is not None:
+            return itertools.chain([first], stream), stats
+
+    data, stats = load_json(p)
     if isinstance(data, dict) and isinstance(data.get("entries"), list):
-        return data["entries"]
-    if isinstance(data, dict) and "procedure_name" in data and "sections" in data:
-        return [data]
-    if isinstance(data, list):
-        return data
-    raise ValueError("Unsupported JSON format. Use {'entries':[...]}")
-
-# ---------- Build retrieval text + metadata ----------
-def entries_to_texts_and_meta(entries: List[Dict[str, Any]]):
-    texts, metas = [], []
-    for i, e in enumerate(entries):
-        proc_id = e.get("procedure_id", f"proc_{i}")
-        proc_name = e.get("procedure_name", f"Procedure {i}")
-        clause_refs = e.get("clause_references", [])
-        if isinstance(clause_refs, str):
-            clause_refs = [clause_refs]
-
-        retrieval_text = e.get("retrieval_text") or (proc_name + " " + json.dumps(e.get("sections", {}), ensure_ascii=False))
-        meta = {
-            "procedure_id": proc_id,
-            "procedure_name": proc_name,
-            "clause_references": ",".join([c.strip() for c in clause_refs if str(c).strip()]),
-            "sections_json": json.dumps(e.get("sections", {}), ensure_ascii=False),
-            "template_order": json.dumps(e.get("template_order", []), ensure_ascii=False),
-        }
-        texts.append(retrieval_text)
-        metas.append(meta)
-    return texts, metas
-
-
-# ---------- BM25 ----------
-class SimpleBM25:
-    def __init__(self, texts, metas):
-        self.texts, self.metas = texts, metas
-        tok = [self._tok(t) for t in texts]
-        self.bm25 = BM25Okapi(tok)
-
-    def _tok(self, t: str):
-        return [w.lower() for w in re.findall(r"\w+", t)]
-
-    def search(self, q: str, k: int = 6):
-        scores = self.bm25.get_scores(self._tok(q))
-        idxs = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        return [{"text": self.texts[i], "meta": self.metas[i], "score": float(scores[i])} for i in idxs]
+        entries = data["entries"]
+    elif isinstance(data, dict) and "procedure_name" in data and "sections" in data:
+        entries = [data]
+    elif isinstance(data, list):
+        entries = data
+    else:
+        raise ValueError("Unsupported JSON format. Use {'entries':[...]}")
+    stats.entries = len(entries)
+    return entries, stats
+
+# ---------- Build retrieval units ----------
+def entries_to_units(entries: Iterable[Dict[str, Any]], mode: str = "section"):
+    # Vector/BM25 metadata carries only procedure_id + section_key; the full procedures
+    # are returned separately for the ProcedureStore and fetched only for the chosen one
+    records = [procedure_record(e, i) for i, e in enumerate(entries)]
+    unit_ids, texts, metas = retrieval_units(records, mode=mode)
+    return records, unit_ids, texts, metas
+
+
+def dataset_mtime(path: str) -> int:
+    p = Path(path)
+    return p.stat().st_mtime_ns if p.exists() else 0
+
+
+@st.cache_resource(max_entries=2)
+def dataset_units(path: str, mtime: int, mode: str):
+    # Keyed on the file's mtime: reruns reuse the parsed dataset and its units,
+    # an edited file is reloaded on the next run
+    entries, stats = load_entries(path)
+    records, unit_ids, texts, metas = entries_to_units(entries, mode=mode)
+    return records, unit_ids, texts, metas, stats
+
+
+@st.cache_resource(max_entries=2)
+def bm25_index(index_dir: str, path: str, mtime: int, mode: str, _unit_ids, _texts, _metas) -> BM25Index:
+    # Synced against the dataset once per version, not on every widget interaction
+    return BM25Index.load_or_build(index_dir, _unit_ids, _texts, _metas)
 
 
 # ---------- Chroma ----------
-def build_or_load_chroma(texts, metas, persist_dir, collection, embeddings):
+@st.cache_resource
+def load_chroma(persist_dir, collection, _embeddings):
+    # Opened once per collection; reruns reuse the same store
     Path(persist_dir).mkdir(parents=True, exist_ok=True)
-    try:
-        db = Chroma(persist_directory=persist_dir, collection_name=collection, embedding_function=embeddings)
-        if db._collection.count() == 0:
-            raise Exception("empty")
-        return db
-    except Exception:
-        db = Chroma.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metas,
-            persist_directory=persist_dir,
-            collection_name=collection,
-        )
-        db.persist()
-        return db
-
-
-def hybrid_search(bm25: SimpleBM25, db: Chroma, query: str, top_k: int = 6):
-    bm_hits = bm25.search(query, k=top_k * 2)
-    max_b = max((h["score"] for h in bm_hits), default=1.0)
-
-    retriever = db.as_retriever(search_type="mmr", search_kwargs={"k": top_k, "fetch_k": max(20, top_k * 4), "lambda_mult": 0.6})
-    vec_docs = retriever.get_relevant_documents(query)
-
-    combined = {}
-    for h in bm_hits:
-        pid = h["meta"]["procedure_id"]
-        combined.setdefault(pid, {"meta": h["meta"], "bm25": 0.0, "vec": 0.0})
-        combined[pid]["bm25"] = (h["score"] / max_b) if max_b else 0.0
-
-    for d in vec_docs:
-        m = d.metadata
-        pid = m.get("procedure_id") or m.get("procedure_name")
-        combined.setdefault(pid, {"meta": m, "bm25": 0.0, "vec": 0.0})
-        combined[pid]["vec"] = 1.0  # presence boost
-
-    out = []
-    for pid, v in combined.items():
-        score = 0.45 * v["bm25"] + 0.55 * v["vec"]
-        out.append({"meta": v["meta"], "score": score})
-    out.sort(key=lambda x: x["score"], reverse=True)
-    return out[:top_k]
+    return Chroma(persist_directory=persist_dir, collection_name=collection, embedding_function=_embeddings)
+
+
+def build_or_load_chroma(texts, metas, persist_dir, collection, embeddings, force: bool = False):
+    db = load_chroma(persist_dir, collection, embeddings)
+    # Embed only new/changed entries (content-hash IDs), and only when the dataset
+    # differs from the last synced version (or when forced)
+    changes = sync_if_changed(db, texts, metas, force=force)
+    return db, changes
+
+
+def hybrid_search(bm25: BM25Index, db: Chroma, query: str, top_k: int = 6):
+    # BM25 and vector MMR run concurrently; reciprocal rank fusion keeps both rankings
+    # and each hit carries its per-source rank/score breakdown in "sources"
+    return hybrid_retrieve(
+        {
+            "bm25": lambda: bm25.search(query, k=top_k * 2),
+            "vector": lambda: mmr_search(db, query, k=top_k, fetch_k=max(12, top_k * 2), lambda_mult=0.6),
+        },
+        method="rrf",
+        weights={"bm25": 0.45, "vector": 0.55},
+        top_k=top_k,
+    )
 
 
 # ---------- Detect "full procedure" intent ----------
@@ -533,28 +531,25 @@ def render_value(v):
         return "\n".join(lines)
     return str(v)
 
-def render_full_procedure(meta: Dict[str, Any]) -> str:
-    proc_name = meta.get("procedure_name", "Procedure")
-    clause_refs = meta.get("clause_references", "")
-    sections = json.loads(meta.get("sections_json", "{}"))
-    order = json.loads(meta.get("template_order", "[]"))
-
-    md = [f"# {md_escape_title(proc_name)}", f"## Clause References\n{clause_refs or 'Not specified in dataset.'}\n"]
-    for item in order:
-        title = item.get("title")
-        key = item.get("key")
-        sec_no = item.get("section_no")
-        md.append(f"## {sec_no}. {md_escape_title(title)}" if sec_no else f"## {md_escape_title(title)}")
-        md.append(render_value(sections.get(key)))
+def render_full_procedure(proc: Procedure) -> str:
+    md = [
+        f"# {md_escape_title(proc.procedure_name)}",
+        f"## Clause References\n{proc.clause_references or 'Not specified in dataset.'}\n",
+    ]
+    for item in proc.template_order:
+        title = md_escape_title(item.title)
+        md.append(f"## {item.section_no}. {title}" if item.section_no else f"## {title}")
+        md.append(render_value(proc.sections.get(item.key)))
         md.append("")
     return "\n".join(md).strip()
 
 
 # ---------- ✅ FIXED Q&A (LangChain invoke + HumanMessage) ----------
-def answer_from_json(llm: ChatOpenAI, user_q: str, meta: Dict[str, Any]) -> str:
-    proc_name = meta.get("procedure_name", "")
-    clause_refs = meta.get("clause_references", "")
-    sections_json = meta.get("sections_json", "{}")
+def answer_from_json(llm: ChatOpenAI, user_q: str, proc: Procedure, stream: bool = False) -> Union[str, TokenStream]:
+    proc_name = proc.procedure_name
+    clause_refs = proc.clause_references
+    # serialized once when the Procedure was built
+    sections_json = proc.sections_json
 
     prompt = f"""
 You are an ISO 13485 QMS assistant.
@@ -574,6 +569,9 @@ User question:
 Return a clear answer in Markdown and mention the section name where you found it.
 """.strip()
 
+    if stream:
+        return TokenStream(chat_model_deltas(llm, [HumanMessage(content=prompt)]))
+
     # ✅ correct for current LangChain behavior
     resp = llm.invoke([HumanMessage(content=prompt)])
     return getattr(resp, "content", str(resp)).strip()
@@ -585,28 +583,57 @@ with st.sidebar:
     dataset_path = st.text_input("Dataset JSON path", value=DEFAULT_JSON)
     persist_dir = st.text_input("Chroma persist dir", value=DEFAULT_PERSIST)
     collection = st.text_input("Chroma collection", value=DEFAULT_COLLECTION)
+    unit_mode = st.selectbox(
+        "Retrieval units", UNIT_MODES, index=0,
+        help="section: one embedding per procedure section; procedure: one per procedure",
+    )
     rebuild = st.button("Rebuild Chroma DB")
 
 # ---------- Init ----------
 st.write("📌 Dataset path:", str(Path(dataset_path).resolve()))
-entries = load_entries(dataset_path)
-texts, metas = entries_to_texts_and_meta(entries)
-
-bm25 = SimpleBM25(texts, metas)
-embeddings = OpenAIEmbeddings()
-db = build_or_load_chroma(texts, metas, persist_dir, collection, embeddings)
-
-if rebuild:
-    with st.spinner("Rebuilding Chroma..."):
-        db = Chroma.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metas,
-            persist_directory=persist_dir,
-            collection_name=collection,
-        )
-        db.persist()
-    st.success("✅ Rebuilt.")
+mtime = dataset_mtime(dataset_path)
+records, unit_ids, texts, metas, load_stats = dataset_units(dataset_path, mtime, unit_mode)
+st.caption(load_stats.summary())
+# Each unit mode gets its own collection, so switching modes never re-embeds the other one
+unit_collection = collection if unit_mode == "procedure" else f"{collection}_sections"
+
+# Full procedures live next to the collection and are read only for the procedure finally chosen
+@st.cache_resource
+def procedure_store(persist_dir: str) -> ProcedureStore:
+    return ProcedureStore(str(Path(persist_dir) / "procedures.sqlite"))
+
+@st.cache_resource(max_entries=1)
+def procedure_catalog(persist_dir: str, version: str) -> ProcedureCatalog:
+    # Only the current dataset version is kept: every procedure is parsed here,
+    # at load time, and its full-template Markdown is rendered once, then served from memory
+    store = procedure_store(persist_dir)
+    return ProcedureCatalog(store.get, version, preload=store.ids())
+
+@st.cache_resource(max_entries=2)
+def procedure_version(persist_dir: str, path: str, mtime: int, _records) -> str:
+    # The store is synced (and its version hashed) once per dataset version
+    store = procedure_store(persist_dir)
+    store.sync(_records)
+    return store.version()
+
+catalog = procedure_catalog(persist_dir, procedure_version(persist_dir, dataset_path, mtime, records))
+
+# BM25 side is persisted next to the Chroma collection; only changed entries are re-tokenized
+bm25 = bm25_index(
+    str(Path(persist_dir) / f"bm25_{unit_collection}"),
+    dataset_path,
+    mtime,
+    unit_mode,
+    unit_ids,
+    texts,
+    metas,
+)
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+with st.spinner("Checking Chroma..."):
+    db, changes = build_or_load_chroma(texts, metas, persist_dir, unit_collection, embeddings, force=rebuild)
+
+if changes is not None:
+    st.success(f"✅ Synced: {changes['added']} embedded, {changes['removed']} removed, {changes['unchanged']} unchanged.")
 
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.0)
 
@@ -616,18 +643,26 @@ run = st.button("Run")
 
 if run and q.strip():
     # if only one procedure exists -> always use it (Phase 1 stable)
-    if len(metas) == 1:
-        best_meta = metas[0]
+    if len(records) == 1:
+        best_id = records[0]["procedure_id"]
     else:
+        # Section hits are fused per parent procedure_id
         hits = hybrid_search(bm25, db, q, top_k=4)
         if not hits:
             st.markdown(FALLBACK_RESPONSE)
             st.stop()
-        best_meta = hits[0]["meta"]
+        best_id = hits[0]["meta"]["procedure_id"]
+
+    best_proc = catalog.get(best_id)
+    if best_proc is None:
+        st.markdown(FALLBACK_RESPONSE)
+        st.stop()
 
     if wants_full(q):
         st.markdown("### ✅ Full Procedure Template (ALL sections)")
-        st.markdown(render_full_procedure(best_meta))
+        st.markdown(catalog.rendered(best_proc, render_full_procedure))
     else:
         st.markdown("### ✅ Answer (only from dataset)")
-        st.markdown(answer_from_json(llm, q, best_meta))
\ No newline at end of file
+        answer = answer_from_json(llm, q, best_proc, stream=True)
+        st.write_stream(answer)
+        st.caption(answer.summary())
\ No newline at end of file
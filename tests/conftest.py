@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# repo root on sys.path for the shared rag_core package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# test helpers (fake servers) importable from the test modules
+sys.path.insert(0, str(Path(__file__).resolve().parent))
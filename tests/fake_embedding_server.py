@@ -0,0 +1,124 @@
+"""
+Local stand-in for the OpenAI embeddings endpoint, for rate-limit tests
+
+POST /v1/embeddings answers in the OpenAI response format. Requests beyond
+`capacity` concurrent ones (and the first `reject_first` requests) get HTTP
+429 with a Retry-After header, like the real API under load.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import requests
+from langchain_core.embeddings import Embeddings
+
+
+def text_vector(text: str) -> List[float]:
+    """Deterministic 4-d embedding of a text"""
+    code = sum(text.encode("utf-8")) % 997
+    return [float(len(text)), float(code), float(text.count(" ")), 1.0]
+
+
+class FakeEmbeddingServer:
+    """
+    Threaded HTTP server on 127.0.0.1 with a concurrency capacity
+
+    Args:
+        capacity: Concurrent requests served; the rest get 429
+        latency: Seconds each served request takes
+        reject_first: Requests answered with 429 before any are served
+        retry_after: Retry-After header value (seconds) of a 429
+    """
+
+    def __init__(self, capacity: int = 2, latency: float = 0.02, reject_first: int = 0, retry_after: float = 0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.reject_first = reject_first
+        self.retry_after = retry_after
+        self.served = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self.reject_first > 0 or self.in_flight >= self.capacity:
+                self.reject_first = max(0, self.reject_first - 1)
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, status: int, body: dict, headers: dict = None) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self) -> None:
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if not server._admit():
+                    self._reply(429, {"error": {"type": "rate_limit_exceeded"}},
+                                {"Retry-After": str(server.retry_after)})
+                    return
+                try:
+                    time.sleep(server.latency)
+                    data = [
+                        {"object": "embedding", "index": i, "embedding": text_vector(text)}
+                        for i, text in enumerate(request["input"])
+                    ]
+                    self._reply(200, {"object": "list", "data": data, "model": request.get("model")})
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                        server.served += 1
+
+        return Handler
+
+
+class HTTPEmbeddings(Embeddings):
+    """Minimal OpenAI-compatible embeddings client; raises requests.HTTPError (with .response) on 429"""
+
+    def __init__(self, base_url: str, model: str = "text-embedding-3-small"):
+        self.base_url = base_url
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        response = requests.post(f"{self.base_url}/embeddings", json={"model": self.model, "input": texts}, timeout=10)
+        response.raise_for_status()
+        return [item["embedding"] for item in sorted(response.json()["data"], key=lambda d: d["index"])]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
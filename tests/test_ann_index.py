@@ -0,0 +1,176 @@
+import faiss
+import numpy as np
+import pytest
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from rag_core.ann_index import build_index, stored_vectors, to_ann
+from rag_core.faiss_store import load_faiss, load_index, save_faiss
+from rag_core.quantized_index import (
+    RescoringIndex,
+    build_matryoshka,
+    build_quantized,
+    quantization_report,
+    reindex,
+    to_quantized,
+)
+
+
+class HashEmbeddings(Embeddings):
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % 2**32)
+        return rng.standard_normal(16).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def flat_store():
+    texts = [f"chunk {i}" for i in range(400)]
+    return FAISS.from_documents([Document(page_content=t) for t in texts], HashEmbeddings())
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "ivf_pq"])
+def test_ivf_indexes_reconstruct(kind):
+    vectors = np.random.default_rng(0).standard_normal((400, 16)).astype(np.float32)
+    index = build_index(vectors, kind=kind)
+    assert index.reconstruct_n(0, index.ntotal).shape == (400, 16)
+    if kind == "ivf_flat":
+        np.testing.assert_allclose(index.reconstruct(7), vectors[7])
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "ivf_pq"])
+def test_ivf_store_supports_mmr_reindex_and_reload(flat_store, kind, tmp_path):
+    store = to_ann(flat_store, kind=kind)
+    assert len(store.max_marginal_relevance_search("chunk 3", k=4, fetch_k=20)) == 4
+    assert stored_vectors(store).shape == (400, 16)
+    assert to_ann(store, kind="hnsw").index.ntotal == 400
+
+    loaded = load_faiss(save_faiss(store, tmp_path / "idx"), HashEmbeddings())
+    assert len(loaded.max_marginal_relevance_search("chunk 3", k=4, fetch_k=20)) == 4
+
+
+def test_load_index_returns_the_serving_rescoring_index(flat_store, tmp_path):
+    store = to_quantized(flat_store, mode="sq8", kind="ivf_flat")
+    directory = save_faiss(store, tmp_path / "idx")
+    served = load_index(directory)
+    assert isinstance(served, RescoringIndex)
+    np.testing.assert_array_equal(stored_vectors(load_faiss(directory, HashEmbeddings())), stored_vectors(flat_store))
+
+
+def exact_ids(vectors, queries, k, metric=faiss.METRIC_L2):
+    exact = faiss.IndexFlat(vectors.shape[1], metric)
+    exact.add(vectors)
+    return exact.search(queries, k)[1]
+
+
+def recall(found, truth):
+    return sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / truth.size
+
+
+@pytest.fixture(scope="module")
+def clustered():
+    rng = np.random.default_rng(1)
+    centers = rng.standard_normal((20, 64)).astype(np.float32)
+    vectors = centers[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 64)).astype(np.float32)
+    queries = vectors[rng.choice(2000, 50, replace=False)] + 0.05 * rng.standard_normal((50, 64)).astype(np.float32)
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+@pytest.mark.parametrize("mode, min_recall", [("fp16", 0.99), ("sq8", 0.95)])
+def test_quantized_rescoring_recall(clustered, mode, min_recall):
+    vectors, queries = clustered
+    index = build_quantized(vectors, mode=mode)
+    distances, ids = index.search(queries, 10)
+    assert recall(ids, exact_ids(vectors, queries, 10)) >= min_recall
+    # Rescored distances are exact float32 distances
+    expected = ((vectors[ids[0]] - queries[0]) ** 2).sum(axis=1)
+    np.testing.assert_allclose(distances[0], expected, rtol=1e-4)
+
+
+def test_quantization_report_rescoring_does_not_lose_recall(clustered):
+    vectors, queries = clustered
+    rows = {row["mode"]: row for row in quantization_report(vectors, queries, k=10)}
+    assert set(rows) == {"fp16", "sq8"}
+    for row in rows.values():
+        assert row["recall_rescored"] >= row["recall_quantized"] - 1e-9
+    assert rows["sq8"]["bytes_per_vector"] < rows["fp16"]["bytes_per_vector"]
+
+
+def test_quantized_store_round_trips_metric(tmp_path):
+    vectors = np.random.default_rng(2).standard_normal((300, 16)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    index = build_quantized(vectors, mode="fp16", metric=faiss.METRIC_INNER_PRODUCT, oversample=3)
+    store = FAISS(HashEmbeddings(), index, InMemoryDocstore({str(i): Document(page_content=str(i)) for i in range(300)}),
+                  {i: str(i) for i in range(300)})
+
+    loaded = load_index(save_faiss(store, tmp_path / "idx"))
+    assert isinstance(loaded, RescoringIndex)
+    assert loaded.metric_type == faiss.METRIC_INNER_PRODUCT and loaded.oversample == 3 and loaded.prefix_dims is None
+    np.testing.assert_array_equal(loaded.search(vectors[:5], 4)[1], index.search(vectors[:5], 4)[1])
+
+
+@pytest.mark.parametrize("kwargs", [{"mode": "int4"}, {"mode": "sq8", "kind": "ivf_pq"}])
+def test_build_quantized_rejects_bad_settings(kwargs):
+    with pytest.raises(ValueError):
+        build_quantized(np.zeros((10, 8), dtype=np.float32), **kwargs)
+
+
+def test_reindex_applies_the_configured_quantization(flat_store):
+    store = reindex(flat_store, kind="flat", quantization="sq8")
+    assert isinstance(store.index, RescoringIndex)
+    assert store.similarity_search("chunk 3", k=1)[0].page_content == "chunk 3"
+    assert isinstance(reindex(flat_store, kind="hnsw").index, faiss.Index)
+
+
+@pytest.fixture(scope="module")
+def matryoshka_like():
+    # Variance concentrated in the leading dimensions, like text-embedding-3 vectors
+    rng = np.random.default_rng(3)
+    scale = np.exp(-np.arange(128) / 32).astype(np.float32)
+    vectors = rng.standard_normal((2000, 128)).astype(np.float32) * scale
+    queries = vectors[rng.choice(2000, 50, replace=False)] + 0.05 * scale * rng.standard_normal((50, 128)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    faiss.normalize_L2(queries)
+    return vectors, queries
+
+
+@pytest.mark.parametrize("mode", [None, "sq8"])
+def test_matryoshka_rescoring_recall(matryoshka_like, mode):
+    vectors, queries = matryoshka_like
+    index = build_matryoshka(vectors, dims=32, mode=mode, metric=faiss.METRIC_INNER_PRODUCT)
+    assert index.coarse.d == 32 and index.d == 128
+    _, ids = index.search(queries, 10)
+    assert recall(ids, exact_ids(vectors, queries, 10, faiss.METRIC_INNER_PRODUCT)) >= 0.95
+
+    row = quantization_report(vectors, queries, modes=(), k=10, metric=faiss.METRIC_INNER_PRODUCT,
+                              matryoshka_dims=(32,))[0]
+    assert row["mode"] == "matryoshka-32" and row["recall_rescored"] >= row["recall_quantized"]
+
+
+def test_matryoshka_store_round_trips_prefix_dims(matryoshka_like, tmp_path):
+    vectors, queries = matryoshka_like
+    index = build_matryoshka(vectors, dims=32, metric=faiss.METRIC_INNER_PRODUCT)
+    docs = InMemoryDocstore({str(i): Document(page_content=str(i)) for i in range(len(vectors))})
+    store = FAISS(HashEmbeddings(), index, docs, {i: str(i) for i in range(len(vectors))})
+
+    loaded = load_index(save_faiss(store, tmp_path / "idx"))
+    assert loaded.prefix_dims == 32 and loaded.metric_type == faiss.METRIC_INNER_PRODUCT
+    np.testing.assert_array_equal(loaded.search(queries, 5)[1], index.search(queries, 5)[1])
+
+
+@pytest.mark.parametrize("kwargs", [{"dims": 0}, {"dims": 16}, {"dims": 8, "mode": "int4"}, {"dims": 8, "kind": "ivf_pq"}])
+def test_build_matryoshka_rejects_bad_settings(kwargs):
+    with pytest.raises(ValueError):
+        build_matryoshka(np.ones((10, 16), dtype=np.float32), **kwargs)
+
+
+def test_reindex_refuses_matryoshka_for_other_models(flat_store):
+    with pytest.raises(ValueError):
+        reindex(flat_store, kind="flat", matryoshka_dims=8)
@@ -0,0 +1,38 @@
+import hashlib
+import re
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_core.answer_cache import AnswerCache, question_numbers
+
+
+class DigitBlindEmbeddings(Embeddings):
+    """Embeds only the words, so questions differing in a clause number are identical (cosine 1.0)"""
+
+    def _vector(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def test_question_numbers():
+    assert question_numbers("Does clause 7.5.2 or 4.2 apply?") == "4.2,7.5.2"
+    assert question_numbers("What is a CAPA?") == ""
+
+
+def test_semantic_hit_requires_the_same_clause_numbers(tmp_path):
+    cache = AnswerCache(DigitBlindEmbeddings(), path=tmp_path / "answers.sqlite", threshold=0.85)
+    cache.put("What does clause 7.5.1 require?", "v1", "answer for 7.5.1", latency=1.0)
+
+    assert cache.lookup("What does clause 7.5.2 require?", "v1") is None
+    hit = cache.lookup("what does clause 7.5.1 require please", "v1")
+    assert hit["match"] == "semantic" and hit["answer"] == "answer for 7.5.1"
+    assert cache.lookup("What does clause 7.5.1 require?", "v2") is None
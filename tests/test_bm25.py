@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from rag_core.bm25 import BM25Index, tokenize
+
+CORPUS = [
+    "Control of documents: review and approve documents before issue",
+    "Control of records: retain records of conformity to requirements",
+    "Management review inputs include audit results and customer feedback",
+    "Internal audit programme: plan audits at planned intervals",
+    "Design and development planning, review, verification and validation",
+    "Purchasing process: evaluate and select suppliers",
+    "Control of nonconforming product and corrective action",
+    "Risk management throughout product realization",
+]
+QUERIES = ["control of records", "audit", "design review validation", "supplier evaluation", "unknown words"]
+
+
+def build(ids):
+    texts = [CORPUS[int(i)] for i in ids]
+    return BM25Index(texts, [{"id": i} for i in ids], ids=ids)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_rank_bm25(query):
+    index = BM25Index(CORPUS, [{} for _ in CORPUS])
+    expected = BM25Okapi([tokenize(t) for t in CORPUS]).get_scores(tokenize(query))
+    np.testing.assert_allclose(index.get_scores(query), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_batch_scores_match_single_queries():
+    index = BM25Index(CORPUS, [{} for _ in CORPUS])
+    batch = index.get_batch_scores(QUERIES)
+    for j, query in enumerate(QUERIES):
+        np.testing.assert_allclose(batch[:, j], index.get_scores(query), rtol=1e-6)
+
+
+def test_save_load_round_trip(tmp_path):
+    ids = [str(i) for i in range(len(CORPUS))]
+    index = build(ids)
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.ids == index.ids and loaded.hashes == index.hashes
+    for query in QUERIES:
+        np.testing.assert_allclose(loaded.get_scores(query), index.get_scores(query), rtol=1e-6)
+
+
+def test_sync_tokenizes_only_added_and_changed_entries(tmp_path, monkeypatch):
+    index = build(["0", "1", "2", "3", "4"])
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+
+    tokenized = []
+    count_terms = BM25Index._count_terms
+
+    def recording_count_terms(self, texts):
+        tokenized.extend(texts)
+        return count_terms(self, texts)
+
+    monkeypatch.setattr(BM25Index, "_count_terms", recording_count_terms)
+
+    # "1" removed, "2" changed, "5" and "6" added, the rest unchanged
+    ids = ["0", "2", "3", "4", "5", "6"]
+    texts = [CORPUS[0], CORPUS[7], CORPUS[3], CORPUS[4], CORPUS[5], CORPUS[6]]
+    metas = [{"id": i} for i in ids]
+    changes = loaded.sync(ids, texts, metas)
+
+    assert changes == {"added": 2, "changed": 1, "removed": 1, "unchanged": 3}
+    assert tokenized == [CORPUS[7], CORPUS[5], CORPUS[6]]
+    assert loaded.ids == ids and loaded.texts == texts
+
+    monkeypatch.undo()
+    rebuilt = BM25Index(texts, metas, ids=ids)
+    for query in QUERIES + ["risk management"]:
+        np.testing.assert_allclose(loaded.get_scores(query), rebuilt.get_scores(query), rtol=1e-5, atol=1e-6)
+    # Terms only the removed and replaced entries used are gone from the vocabulary
+    assert set(loaded.vocab) == set(rebuilt.vocab)
+
+
+def test_load_or_build_skips_the_write_when_nothing_changed(tmp_path):
+    ids = [str(i) for i in range(len(CORPUS))]
+    metas = [{"id": i} for i in ids]
+    BM25Index.load_or_build(str(tmp_path), ids, CORPUS, metas)
+    written = (tmp_path / "index.npz").stat().st_mtime_ns
+
+    index = BM25Index.load_or_build(str(tmp_path), ids, CORPUS, metas)
+    assert (tmp_path / "index.npz").stat().st_mtime_ns == written
+    assert index.search("internal audit", k=1)[0]["meta"] == {"id": "3"}
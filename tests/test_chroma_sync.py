@@ -0,0 +1,84 @@
+from rag_core.chroma_sync import collection_version, read_stamp, sync_chroma, sync_if_changed
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.get_calls = 0
+
+    def get(self, include=None):
+        self.get_calls += 1
+        return {"ids": list(self.docs)}
+
+    def count(self):
+        return len(self.docs)
+
+
+class FakeChroma:
+    """The parts of LangChain's Chroma wrapper that chroma_sync touches"""
+
+    def __init__(self, persist_dir, name="procedures"):
+        self._persist_directory = str(persist_dir)
+        self._collection = FakeCollection(name)
+        self.embedded = 0
+
+    def add_texts(self, texts, metadatas, ids):
+        self.embedded += len(texts)
+        self._collection.docs.update(zip(ids, texts))
+
+    def delete(self, ids):
+        for i in ids:
+            self._collection.docs.pop(i, None)
+
+    def persist(self):
+        pass
+
+
+TEXTS = ["control of documents", "control of records"]
+METAS = [{"procedure_id": "P-01"}, {"procedure_id": "P-02"}]
+
+
+def test_unchanged_dataset_skips_sync_and_id_fetch(tmp_path):
+    db = FakeChroma(tmp_path)
+    assert sync_if_changed(db, TEXTS, METAS) == {"added": 2, "removed": 0, "unchanged": 0}
+    assert read_stamp(db)["count"] == 2
+
+    fetches = db._collection.get_calls
+    assert sync_if_changed(db, TEXTS, METAS) is None
+    assert db._collection.get_calls == fetches
+
+    # A reopened store reads the same stamp
+    reopened = FakeChroma(tmp_path)
+    reopened._collection.docs = dict(db._collection.docs)
+    assert sync_if_changed(reopened, TEXTS, METAS) is None
+
+
+def test_changed_dataset_or_force_syncs(tmp_path):
+    db = FakeChroma(tmp_path)
+    sync_chroma(db, TEXTS, METAS)
+
+    changes = sync_if_changed(db, TEXTS[:1] + ["control of nonconforming product"], METAS)
+    assert changes == {"added": 1, "removed": 1, "unchanged": 1}
+    assert db.embedded == 3
+
+    assert sync_if_changed(db, TEXTS[:1] + ["control of nonconforming product"], METAS, force=True) == {
+        "added": 0, "removed": 0, "unchanged": 2,
+    }
+
+
+def test_collection_version_follows_rebuilds_outside_sync(tmp_path):
+    db = FakeChroma(tmp_path)
+    sync_chroma(db, TEXTS, METAS)
+    version = collection_version(db)
+    assert collection_version(db) == version == read_stamp(db)["version"]
+
+    # Rebuilt by a notebook with the same number of chunks but different content
+    db._collection.docs = {f"uuid-{i}": f"other chunk {i}" for i in range(len(db._collection.docs))}
+    rebuilt = collection_version(db)
+    assert rebuilt != version
+    assert read_stamp(db)["version"] == rebuilt
+
+    # The refreshed stamp no longer matches the dataset, so the next sync repairs the collection
+    assert sync_if_changed(db, TEXTS, METAS) is not None
+    assert collection_version(db) == version
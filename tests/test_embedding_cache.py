@@ -0,0 +1,85 @@
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_core.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+class WordEmbeddings(Embeddings):
+    """Deterministic fake: one distinct vector per text, counting calls"""
+
+    model = "fake-words"
+
+    def __init__(self):
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        rng = np.random.default_rng(abs(hash(text)) % 2**32)
+        return rng.standard_normal(8).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self._vector(text)
+
+
+def test_two_stores_on_one_directory_do_not_share_rows(tmp_path):
+    a = EmbeddingStore(tmp_path)
+    b = EmbeddingStore(tmp_path)
+    alpha = np.full(4, 1.0, dtype=np.float32)
+    beta = np.full(4, 2.0, dtype=np.float32)
+
+    a.put({"alpha": alpha})
+    b.put({"beta": beta})
+
+    fresh = EmbeddingStore(tmp_path)
+    got = fresh.get(["alpha", "beta"])
+    np.testing.assert_array_equal(got["alpha"], alpha)
+    np.testing.assert_array_equal(got["beta"], beta)
+    # Each store also sees the other's writes
+    np.testing.assert_array_equal(a.get(["beta"])["beta"], beta)
+    np.testing.assert_array_equal(b.get(["alpha"])["alpha"], alpha)
+
+
+def test_stores_follow_growth_past_initial_capacity(tmp_path):
+    a = EmbeddingStore(tmp_path)
+    a.put({"seed": np.zeros(4, dtype=np.float32)})
+    b = EmbeddingStore(tmp_path)
+
+    many = {f"k{i}": np.full(4, i, dtype=np.float32) for i in range(3000)}
+    a.put(many)
+    b.put({"late": np.full(4, -1.0, dtype=np.float32)})
+
+    got = b.get(["k2999", "late"])
+    assert got["k2999"][0] == 2999
+    assert EmbeddingStore(tmp_path).get(["late"])["late"][0] == -1.0
+
+
+def test_cached_embeddings_instances_share_one_store(tmp_path):
+    first, second = WordEmbeddings(), WordEmbeddings()
+    a = CachedEmbeddings(first, cache_dir=tmp_path)
+    b = CachedEmbeddings(second, cache_dir=tmp_path)
+    assert a.store is b.store
+
+    alpha = a.embed_documents(["alpha"])[0]
+    b.embed_documents(["beta"])
+    assert b.embed_documents(["alpha"])[0] == alpha
+    assert second.calls == 1
+
+
+def test_get_touches_all_hits_in_one_transaction(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    keys = [f"k{i}" for i in range(2000)]
+    store.put({k: np.full(4, i, dtype=np.float32) for i, k in enumerate(keys)})
+
+    statements = []
+    store._db.set_trace_callback(statements.append)
+    found = store.get(keys)
+    store._db.set_trace_callback(None)
+
+    assert len(found) == len(keys)
+    assert sum(s.startswith("COMMIT") for s in statements) == 1
@@ -0,0 +1,108 @@
+import pytest
+
+from rag_core import embedding_pipeline
+from langchain.schema import Document
+
+from rag_core.embedding_pipeline import AdaptiveConcurrency, iter_embedded_batches, stream_into_faiss, token_batches
+
+from fake_embedding_server import FakeEmbeddingServer, HTTPEmbeddings, text_vector
+
+
+@pytest.fixture(autouse=True)
+def word_token_counts(monkeypatch):
+    # Batching is not under test; count one token per word so no tokenizer download is needed
+    monkeypatch.setattr(embedding_pipeline, "count_tokens", lambda texts, model=None: [len(t.split()) for t in texts])
+
+
+def test_limiter_halves_on_429_and_recovers():
+    limiter = AdaptiveConcurrency(8)
+    for expected in (4, 2, 1, 1):
+        limiter.acquire()
+        limiter.release(rate_limited=True)
+        assert limiter.limit == expected
+
+    # One step up per `limit` clean releases
+    for _ in range(1 + 2 + 3 + 4 + 5 + 6 + 7):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8
+    assert limiter.lowest == 1
+
+
+def test_backs_off_against_a_rate_limited_server_and_keeps_vectors_in_place():
+    texts = [f"procedure chunk number {i} " + "word " * (i % 5) for i in range(48)]
+    limiter = AdaptiveConcurrency(8)
+
+    with FakeEmbeddingServer(capacity=2, reject_first=3) as server:
+        embeddings = HTTPEmbeddings(server.url)
+        results = list(iter_embedded_batches(
+            embeddings, texts, max_workers=8, max_items=2, base_delay=0.01, max_retries=20, limiter=limiter,
+        ))
+
+    assert server.rejected >= 3 and limiter.rate_limited == server.rejected
+    assert limiter.lowest <= 2
+
+    # Every batch arrives once and each vector maps back to its own text, in batch order
+    indices = [i for batch, _ in results for i in batch]
+    assert sorted(indices) == list(range(len(texts)))
+    for batch, vectors in results:
+        assert vectors == [text_vector(texts[i]) for i in batch]
+        assert batch == sorted(batch)
+
+
+def test_limit_recovers_once_the_server_has_capacity_again():
+    limiter = AdaptiveConcurrency(4)
+    texts = [f"chunk {i}" for i in range(40)]
+
+    with FakeEmbeddingServer(capacity=1, latency=0.01) as server:
+        embeddings = HTTPEmbeddings(server.url)
+        list(iter_embedded_batches(embeddings, texts[:12], max_workers=4, max_items=1,
+                                   base_delay=0.01, max_retries=50, limiter=limiter))
+        assert limiter.lowest == 1
+
+        server.capacity = 100
+        list(iter_embedded_batches(embeddings, texts, max_workers=4, max_items=1,
+                                   base_delay=0.01, max_retries=50, limiter=limiter))
+    assert limiter.limit == 4
+
+
+def test_streams_a_generator_with_bounded_batches_in_flight():
+    pulled = []
+
+    def texts():
+        for i in range(200):
+            pulled.append(i)
+            yield f"chunk {i} of a long document"
+
+    with FakeEmbeddingServer(capacity=100, latency=0.02) as server:
+        embeddings = HTTPEmbeddings(server.url)
+        stream = iter_embedded_batches(embeddings, texts(), max_workers=4, max_items=5, max_pending=4)
+        first_batch, _ = next(stream)
+        # Nothing close to the whole generator is read before the first batch comes back
+        assert len(pulled) <= (4 + 1) * 5 + 5
+        rest = list(stream)
+
+    indices = first_batch + [i for batch, _ in rest for i in batch]
+    assert sorted(indices) == list(range(200))
+    # Batches of one stream run concurrently
+    assert server.peak_in_flight > 1
+
+
+def test_iter_token_batches_match_token_batches_for_a_list():
+    texts = [f"text {i} " + "word " * (i % 7) for i in range(50)]
+    batches = token_batches(texts, max_tokens=12, max_items=4)
+    assert [i for batch in batches for i in batch] == list(range(50))
+    assert all(len(batch) <= 4 for batch in batches)
+
+
+def test_stream_into_faiss_consumes_documents_lazily():
+    documents = (Document(page_content=f"section {i} text", metadata={"page": i // 3}) for i in range(30))
+
+    with FakeEmbeddingServer(capacity=100) as server:
+        embeddings = HTTPEmbeddings(server.url)
+        results = list(stream_into_faiss(documents, embeddings, max_workers=3, max_items=4))
+
+    vectorstore, done, total = results[-1]
+    assert done == 30 and total is None
+    stored = {d.page_content: d.metadata for d in vectorstore.docstore._dict.values()}
+    assert stored["section 7 text"] == {"page": 2} and len(stored) == 30
@@ -0,0 +1,53 @@
+import json
+
+from rag_core.intent import IntentClassifier, TfidfLogistic, training_fingerprint, training_key
+
+
+def write_log(path, rows):
+    with open(path, "a", encoding="utf-8") as f:
+        for query, label, source in rows:
+            f.write(json.dumps({"query": query, "label": label, "source": source}) + "\n")
+
+
+def test_rule_labels_do_not_teach_the_model_that_clause_numbers_mean_lookup(tmp_path):
+    log = tmp_path / "intent_log.jsonl"
+    # A log dominated by rule decisions, as in production
+    write_log(log, [(f"clause 7.{i % 6 + 1}.{i % 4 + 1}", "CLAUSE_LOOKUP", "rule") for i in range(200)])
+    classifier = IntentClassifier.load_or_train(str(tmp_path / "model.npz"), str(tmp_path / "training.jsonl"), str(log))
+
+    model = classifier.model
+    proba = dict(zip(model.labels, model.predict_proba(["what is required for sterile packaging in 7.5.5"])[0]))
+    assert max(proba, key=proba.get) == "GENERAL_QMS_QUESTION"
+    assert proba["CLAUSE_LOOKUP"] < 0.5
+    assert classifier.classify("what does clause 4.2.4 say about records")[0] != "CLAUSE_LOOKUP"
+
+
+def test_only_llm_labels_reach_the_training_file(tmp_path):
+    log, training = tmp_path / "intent_log.jsonl", tmp_path / "training.jsonl"
+    write_log(log, [("how do we validate software", "GENERAL_QMS_QUESTION", "llm"), ("4.2.4", "CLAUSE_LOOKUP", "rule")])
+
+    # A missing training file is seeded once from the LLM labels already in the log
+    classifier = IntentClassifier.load_or_train(str(tmp_path / "model.npz"), str(training), str(log))
+    assert training.read_text(encoding="utf-8").count("\n") == 1
+
+    classifier.classify("7.5.1")
+    classifier.classify("what records prove supplier competence", fallback=lambda q: "GENERAL_QMS_QUESTION")
+    rows = [json.loads(line) for line in training.read_text(encoding="utf-8").splitlines()]
+    assert [r["query"] for r in rows] == ["how do we validate software", "what records prove supplier competence"]
+    assert log.read_text(encoding="utf-8").count("\n") == 4
+
+
+def test_training_key_tracks_the_training_file_not_the_log(tmp_path):
+    log, training = tmp_path / "intent_log.jsonl", tmp_path / "training.jsonl"
+    model_path = tmp_path / "model.npz"
+    IntentClassifier.load_or_train(str(model_path), str(training), str(log))
+    key, fingerprint = training_key(str(training)), training_fingerprint(str(training))
+    assert TfidfLogistic.saved_fingerprint(str(model_path)) == fingerprint
+
+    write_log(log, [("ask anything", "GENERAL_QMS_QUESTION", "model"), ("4.2.4", "CLAUSE_LOOKUP", "rule")])
+    assert training_key(str(training)) == key
+
+    write_log(training, [("how do we validate production software", "GENERAL_QMS_QUESTION", "llm")])
+    assert training_key(str(training)) != key
+    IntentClassifier.load_or_train(str(model_path), str(training), str(log))
+    assert TfidfLogistic.saved_fingerprint(str(model_path)) == training_fingerprint(str(training)) != fingerprint
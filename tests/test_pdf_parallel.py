@@ -0,0 +1,29 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from rag_core.pdf_parallel import iter_pdf_pages_parallel, spool_to_disk  # noqa: E402
+
+
+def make_pdf(n_pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(n_pages):
+        doc.new_page().insert_text((72, 72), f"page marker {i}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_byte_pdfs_are_spooled_once_and_pages_stay_in_order(tmp_path):
+    data = make_pdf(40)
+    docs = list(iter_pdf_pages_parallel([data], sources=["upload.pdf"], max_workers=2, shard_size=4))
+    assert [d.metadata["page"] for d in docs] == list(range(40))
+    assert all(f"page marker {i}" in d.page_content for i, d in enumerate(docs))
+    assert docs[0].metadata == {"source": "upload.pdf", "page": 0, "total_pages": 40}
+
+
+def test_spool_to_disk_writes_bytes_and_passes_paths_through(tmp_path):
+    data = make_pdf(1)
+    spooled = spool_to_disk([data, "already/on/disk.pdf"], tmp_path)
+    assert open(spooled[0], "rb").read() == data
+    assert spooled[1] == "already/on/disk.pdf"
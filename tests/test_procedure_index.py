@@ -0,0 +1,45 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+CLAUDE_CODE = Path(__file__).resolve().parents[1] / "claude_code"
+sys.path.insert(0, str(CLAUDE_CODE))
+
+from procedure_index import ProcedureIndex, clause_key  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def index():
+    database = json.loads((CLAUDE_CODE / "iso_13485_procedures.json").read_text(encoding="utf-8"))
+    return ProcedureIndex(database)
+
+
+def scan(index, keyword):
+    """Reference: linear substring scan over every procedure's fields"""
+    keyword = keyword.lower()
+    return [p for p, fields in zip(index.all_procedures, index._fields) if any(keyword in f for f in fields)]
+
+
+@pytest.mark.parametrize("keyword", ["record", "rec", "r", "ma", "control of", "design", "zzz", "risk management", "8"])
+def test_substring_search_matches_a_full_scan(index, keyword):
+    assert index.search_keyword(keyword) == scan(index, keyword)
+
+
+def test_term_lookup_only_checks_tokens_sharing_its_ngrams(index):
+    candidates = index._tokens_containing("audit")
+    assert candidates == {t for t in index.postings if "audit" in t}
+    assert len(candidates) < len(index.postings)
+
+
+def test_sections_follow_clause_order():
+    database = {
+        "sections": [
+            {"procedures": [{"proc_id": "a", "requirement": "10.1"}, {"proc_id": "b", "requirement": "4.10"}]},
+            {"procedures": [{"proc_id": "c", "requirement": "4.2"}, {"proc_id": "d", "requirement": "8.2.1"}]},
+        ]
+    }
+    index = ProcedureIndex(database)
+    assert index.sections() == ["4", "8", "10"]
+    assert sorted(["10", "4.10", "4.2", "4"], key=clause_key) == ["4", "4.2", "4.10", "10"]
@@ -0,0 +1,28 @@
+from rag_core.procedure_model import ProcedureCatalog
+from rag_core.section_units import ProcedureStore, procedure_record
+
+ENTRIES = [
+    {"procedure_id": "P-01", "procedure_name": "Document control", "sections": {"purpose": "Control documents"},
+     "template_order": [{"key": "purpose", "title": "Purpose"}]},
+    {"procedure_id": "P-02", "procedure_name": "Internal audit", "sections": {"scope": "All processes"}},
+]
+
+
+def test_catalog_parses_every_procedure_at_load_time(tmp_path):
+    store = ProcedureStore(str(tmp_path / "procedures.sqlite"))
+    store.sync([procedure_record(e, i) for i, e in enumerate(ENTRIES)])
+    calls = []
+
+    def loader(procedure_id):
+        calls.append(procedure_id)
+        return store.get(procedure_id)
+
+    catalog = ProcedureCatalog(loader, store.version(), preload=store.ids())
+    assert sorted(calls) == ["P-01", "P-02"] and len(catalog) == 2
+
+    procedure = catalog.get("P-01")
+    assert procedure.template_order[0].title == "Purpose"
+    assert catalog.rendered(procedure, lambda p: p.procedure_name) == "Document control"
+    assert catalog.rendered(procedure, lambda p: p.procedure_name) == "Document control"
+    assert sorted(calls) == ["P-01", "P-02"]
+    assert catalog.get("P-99") is None
@@ -0,0 +1,39 @@
+import threading
+
+from rag_core.query_pipeline import merge_speculative, run_query_pipeline
+
+
+def hit(pid, sources):
+    return {"text": pid, "meta": {"procedure_id": pid}, "score": 0.0, "sources": sources}
+
+
+BM25_VECTOR = {"bm25": {"rank": 1, "score": 3.2, "norm": 1.0}, "vector": {"rank": 2, "score": 0.8, "norm": 0.5}}
+
+
+def test_merge_keeps_retriever_sources_and_adds_origin():
+    rewritten = [hit("P-01", BM25_VECTOR), hit("P-02", {"vector": {"rank": 1, "score": 0.9, "norm": 1.0}})]
+    raw = [hit("P-03", {"bm25": {"rank": 1, "score": 2.0, "norm": 1.0}}), hit("P-01", {})]
+
+    merged = {h["meta"]["procedure_id"]: h for h in merge_speculative(rewritten, raw)}
+    assert merged["P-01"]["sources"] == BM25_VECTOR
+    assert set(merged["P-01"]["origin"]) == {"rewritten", "raw"}
+    assert set(merged["P-03"]["sources"]) == {"bm25"}
+    assert set(merged["P-03"]["origin"]) == {"raw"}
+
+
+def test_discard_lets_the_raw_retrieval_finish():
+    finished = threading.Event()
+
+    def retrieve(query):
+        if query == "raw question":
+            finished.set()
+            return [hit("RAW", {})]
+        return [hit("REWRITTEN", BM25_VECTOR)]
+
+    result = run_query_pipeline(
+        "raw question", rewrite=lambda q: "rewritten question", detect_intent=lambda q: "OTHER",
+        retrieve=retrieve, speculative="discard",
+    )
+    assert result["speculative"] == "discarded"
+    assert [h["text"] for h in result["hits"]] == ["REWRITTEN"]
+    assert finished.wait(5)
@@ -0,0 +1,49 @@
+import re
+
+import pytest
+
+from rag_core.text_cleaning import CleaningRules, TextCleaner
+
+
+def clean_text(text: str) -> str:
+    """The ISO PDF app's original cleaner"""
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"[^\w\s\.,;:()\-/]", "", text)
+    text = re.sub(r"Page\s*\d+", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\d+\s*/\s*\d+", "", text)
+    return text.strip()
+
+
+PAGES = [
+    "4.2.4 Control of records\nRecords shall be retained [see 4.2.5]!\nPage 12",
+    "Table 1 - Sampling\nLot size\n50\nSample\n8\n\n3/46",
+    "Quantity: 10 units @ 5% #tolerance $price & more*",
+    "Tab\tseparated \x00control\x07 chars\x1b and \x7f delete",
+]
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_defaults_reproduce_clean_text(page):
+    assert TextCleaner().clean(page) == " ".join(clean_text(page).split())
+
+
+def test_numbers_inside_a_page_are_kept():
+    page = "Table 2\nClause\n4\n7\nQuantity\n250\nend of table"
+    cleaned = TextCleaner(CleaningRules(strip_edge_numbers=True)).clean(page)
+    assert cleaned == "Table 2 Clause 4 7 Quantity 250 end of table"
+
+
+def test_edge_page_numbers_are_stripped_when_enabled():
+    cleaner = TextCleaner(CleaningRules(strip_edge_numbers=True))
+    assert cleaner.clean("  12\nScope of the standard\n100\nApplication\n\n13  \n") == "Scope of the standard 100 Application"
+    assert TextCleaner().clean("12\nScope\n13") == "12 Scope 13"
+
+
+@pytest.mark.parametrize("allowed", [".,;:()-/", "", "#%&"])
+def test_ascii_fast_path_matches_the_regex_path(allowed):
+    cleaner = TextCleaner(CleaningRules(allowed_punctuation=allowed))
+    ascii_text = "".join(chr(i) for i in range(128)) * 2
+    assert ascii_text.translate(cleaner._delete_table) == cleaner._banned_re.sub("", ascii_text)
+    # Through clean(): the same page with one non-ASCII char takes the regex path
+    page = "Section 4.2 \x01draft\x02 [v2] ~ok~ @home"
+    assert cleaner.clean(page) + " é" == cleaner.clean(page + " é")